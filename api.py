@@ -0,0 +1,409 @@
+# api.py
+"""
+JSON HTTP API over the app's database, for the PWA (index.html/script.js).
+
+    python api.py            # http://127.0.0.1:8502 (API_HOST / API_PORT)
+
+    GET  /api/reports?limit=50&after=<cursor>&category=&status=&start_date=&end_date=
+         newest first: {"rows", "next" (cursor for the following page), "version"}
+    GET  /api/reports/changes?since=<version>
+         {"cursor", "reset", "rows", "deleted"}: what changed after a version
+    GET  /api/incidents?bbox=min_lat,min_lng,max_lat,max_lng&limit=500   (GeoJSON)
+    GET  /api/incidents/changes?since=<version>
+    POST /api/reports        one report or a JSON array of them (an offline queue)
+         {"results": one {"client_id", "id", "created"} or {"client_id", "error"} per report}
+    GET  /api/push-subscriptions
+         {"public_key"}: the VAPID key for pushManager.subscribe(), null if Web Push is off
+    POST /api/push-subscriptions   a pushManager.subscribe() result (see push.py)
+
+A client lists the newest reports once, then only asks for changes since
+the ``version`` it got. Every GET carries an ETag and Last-Modified derived
+from the table's change log, so a revalidation (If-None-Match /
+If-Modified-Since) that finds nothing new is answered 304 without running
+the query. Bodies over GZIP_MIN_BYTES are gzipped for clients that accept
+it, and POST bodies may be gzipped too. A posted report may carry a
+``client_id``; resending it (e.g. after a lost response) does not create
+it twice (db.submit_reports). An invalid report in a batch gets an error
+result of its own; the rest of the batch is still stored. The server also serves the PWA's static
+files, so pages and API share an origin and sw.js can cache both.
+
+There is no authentication: responses never include a reporter's name or
+contact details (db.REPORT_PUBLIC_COLUMNS), push subscriptions belong to
+the app's single profile (db.DEFAULT_USER), and the server listens on
+127.0.0.1 unless API_HOST says otherwise.
+
+Submissions queue their side effects as background jobs; the server runs
+a job worker pool (jobs.py) so they are processed even when the Streamlit
+app is not running. Set API_CORS_ORIGIN to allow a front end served from
+another origin.
+"""
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import db
+import jobs
+
+log = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_FILES = {
+    "/": ("index.html", "text/html; charset=utf-8"),
+    "/index.html": ("index.html", "text/html; charset=utf-8"),
+    "/script.js": ("script.js", "text/javascript; charset=utf-8"),
+    "/sw.js": ("sw.js", "text/javascript; charset=utf-8"),
+    "/manifest.json": ("manifest.json", "application/manifest+json"),
+    "/CivicGuardian.png": ("CivicGuardian.png", "image/png"),
+}
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+MAX_CHANGES = 1000  # a longer delta tells the client to list again
+MAX_BATCH = 100  # reports per POST
+MAX_BODY_BYTES = 1024 * 1024
+GZIP_MIN_BYTES = 1024  # smaller bodies aren't worth compressing
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _dumps(payload) -> bytes:
+    return json.dumps(payload, default=_json_default, separators=(",", ":")).encode("utf-8")
+
+
+def _param(params: Dict, name: str) -> Optional[str]:
+    values = params.get(name)
+    return values[0] if values and values[0] != "" else None
+
+
+def _int_param(params: Dict, name: str, default: int, maximum: Optional[int] = None) -> int:
+    value = _param(params, name)
+    try:
+        n = default if value is None else int(value)
+    except ValueError:
+        raise ApiError(400, f"{name} must be an integer")
+    if n < 0:
+        raise ApiError(400, f"{name} must not be negative")
+    return min(n, maximum) if maximum is not None else n
+
+
+def encode_cursor(cursor: Optional[Tuple[datetime, int]]) -> Optional[str]:
+    """query_reports' (timestamp, id) keyset cursor as an opaque string."""
+    if cursor is None:
+        return None
+    ts, rid = cursor
+    return f"{ts.isoformat()},{rid}"
+
+
+def decode_cursor(value: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if not value:
+        return None
+    try:
+        ts, rid = value.rsplit(",", 1)
+        return datetime.fromisoformat(ts), int(rid)
+    except ValueError:
+        raise ApiError(400, "invalid cursor")
+
+
+def _choice_param(params: Dict, name: str, choices) -> Optional[str]:
+    value = _param(params, name)
+    if value is not None and value not in choices:
+        raise ApiError(400, f"{name} must be one of: {', '.join(choices)}")
+    return value
+
+
+def _date_param(params: Dict, name: str) -> Optional[date]:
+    value = _param(params, name)
+    try:
+        return None if value is None else date.fromisoformat(value)
+    except ValueError:
+        raise ApiError(400, f"{name} must be a date (YYYY-MM-DD)")
+
+
+def list_reports(params: Dict, version: int) -> Dict:
+    filters = {
+        "category": _choice_param(params, "category", db.REPORT_CATEGORIES),
+        "status": _choice_param(params, "status", db.REPORT_STATUSES),
+        "start_date": _date_param(params, "start_date"),
+        "end_date": _date_param(params, "end_date"),
+    }
+    rows, next_cursor = db.query_reports(
+        **filters,
+        after=decode_cursor(_param(params, "after")),
+        limit=_int_param(params, "limit", DEFAULT_LIMIT, MAX_LIMIT),
+        columns=db.REPORT_PUBLIC_COLUMNS,
+    )
+    return {"rows": rows, "next": encode_cursor(next_cursor), "version": version}
+
+
+def _changes(table: str) -> Callable[[Dict, int], Dict]:
+    def changes(params: Dict, version: int) -> Dict:
+        if _param(params, "since") is None:
+            raise ApiError(400, f"since is required (start from /api/{table})")
+        since = _int_param(params, "since", 0)
+        if since > version:
+            # the client's version is from another database (e.g. restored backup)
+            return {"cursor": version, "reset": True, "rows": [], "deleted": []}
+        return db.read_changes_since(table, since, MAX_CHANGES, columns=db.REPORT_PUBLIC_COLUMNS)
+    return changes
+
+
+def incidents_in_view(params: Dict, version: int) -> Dict:
+    value = _param(params, "bbox")
+    try:
+        bbox = tuple(float(v) for v in (value or "").split(","))
+    except ValueError:
+        bbox = ()
+    if len(bbox) != 4:
+        raise ApiError(400, "bbox=min_lat,min_lng,max_lat,max_lng is required")
+    layer = db.get_incidents_geojson(bbox, _int_param(params, "limit", MAX_LIMIT, MAX_LIMIT))
+    return {**layer, "version": version}
+
+
+def submit_reports(payload) -> Dict:
+    rows = [payload] if isinstance(payload, dict) else payload
+    if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+        raise ApiError(400, "expected a report object or an array of them")
+    if len(rows) > MAX_BATCH:
+        raise ApiError(413, f"at most {MAX_BATCH} reports per request")
+    results = db.submit_reports(rows)
+    jobs.wake()
+    return {"results": results}
+
+
+def push_key() -> Dict:
+    return {"public_key": os.getenv("VAPID_PUBLIC_KEY") or None}
+
+
+def add_push_subscription(payload) -> Dict:
+    # push services are https; anything else would have the server POST alerts to arbitrary hosts
+    endpoint = payload.get("endpoint") if isinstance(payload, dict) else None
+    if not isinstance(endpoint, str) or not endpoint.startswith("https://"):
+        raise ApiError(400, "expected a push subscription with an https endpoint")
+    keys = payload.get("keys") or {}
+    if not isinstance(keys, dict) or not all(isinstance(v, str) for v in keys.values()):
+        raise ApiError(400, "keys must be an object of strings")
+    db.add_push_subscription(db.DEFAULT_USER, {"endpoint": endpoint, "keys": keys})
+    return {"endpoint": endpoint}
+
+
+# path -> (table whose change log versions the response, handler(params, version))
+ROUTES: Dict[str, Tuple[str, Callable[[Dict, int], Dict]]] = {
+    "/api/reports": ("reports", list_reports),
+    "/api/reports/changes": ("reports", _changes("reports")),
+    "/api/incidents": ("incidents", incidents_in_view),
+    "/api/incidents/changes": ("incidents", _changes("incidents")),
+}
+# unversioned GETs, answered without a change-log lookup
+PLAIN_ROUTES: Dict[str, Callable[[], Dict]] = {
+    "/api/push-subscriptions": push_key,
+}
+# path -> handler(parsed JSON body)
+POST_ROUTES: Dict[str, Callable[[object], Dict]] = {
+    "/api/reports": submit_reports,
+    "/api/push-subscriptions": add_push_subscription,
+}
+
+
+def etag_for(table: str, version: int, target: str) -> str:
+    """Weak ETag: the table's change-log version plus the request (path and query)."""
+    digest = hashlib.sha1(target.encode("utf-8")).hexdigest()[:12]
+    return f'W/"{table}-{version}-{digest}"'
+
+
+def _opaque_tag(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # weak comparison (RFC 9110 13.1.2): W/ prefixes are ignored on both sides
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or _opaque_tag(etag) in (_opaque_tag(t) for t in tags)
+
+
+def _not_modified_since(header: Optional[str], changed_at: Optional[datetime]) -> bool:
+    if not header or changed_at is None:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return changed_at.replace(microsecond=0) <= since
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: one connection for a poll and its revalidations
+    _body_unread = False  # a POST body not (fully) read yet
+
+    def log_message(self, fmt, *args):
+        log.debug("%s %s", self.address_string(), fmt % args)
+
+    def _cors_headers(self) -> None:
+        origin = os.getenv("API_CORS_ORIGIN")
+        if origin:
+            self.send_header("Access-Control-Allow-Origin", origin)
+            self.send_header("Access-Control-Expose-Headers", "ETag, Last-Modified")
+            self.send_header("Vary", "Origin")
+
+    def _send(self, status: int, body: bytes = b"", content_type: str = "application/json", headers: Optional[Dict] = None):
+        headers = dict(headers or {})
+        if body and len(body) >= GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+        self.send_response(status)
+        if body:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Vary", "Accept-Encoding")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self._cors_headers()
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _error(self, status: int, message: str) -> None:
+        # unread body bytes would be parsed as the next request on this connection
+        headers = {"Connection": "close"} if self._body_unread else None
+        self._send(status, _dumps({"error": message}), headers=headers)
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type, Content-Encoding, If-None-Match")
+        self.send_header("Content-Length", "0")
+        self._cors_headers()
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path in STATIC_FILES:
+            self._static(*STATIC_FILES[url.path])
+            return
+        if url.path.rstrip("/") in PLAIN_ROUTES:
+            self._send(200, _dumps(PLAIN_ROUTES[url.path.rstrip("/")]()), headers={"Cache-Control": "no-cache"})
+            return
+        route = ROUTES.get(url.path.rstrip("/"))
+        if route is None:
+            self._error(404, "not found")
+            return
+        table, handler = route
+        try:
+            version, changed_at = db.change_version(table)
+            etag = etag_for(table, version, self.path)
+            headers = {"ETag": etag, "Cache-Control": "no-cache"}
+            if changed_at is not None:
+                headers["Last-Modified"] = format_datetime(changed_at.replace(microsecond=0, tzinfo=timezone.utc), usegmt=True)
+            # If-None-Match wins over If-Modified-Since when both are sent
+            inm = self.headers.get("If-None-Match")
+            if _etag_matches(inm, etag) if inm else _not_modified_since(self.headers.get("If-Modified-Since"), changed_at):
+                self._send(304, headers=headers)
+                return
+            payload = handler(parse_qs(url.query), version)
+        except ApiError as e:
+            self._error(e.status, str(e))
+            return
+        except Exception:
+            log.exception("GET %s failed", self.path)
+            self._error(500, "internal error")
+            return
+        self._send(200, _dumps(payload), headers=headers)
+
+    do_HEAD = do_GET
+
+    def do_POST(self):
+        self._body_unread = True
+        handler = POST_ROUTES.get(urlsplit(self.path).path.rstrip("/"))
+        if handler is None:
+            self._error(404, "not found")
+            return
+        try:
+            payload = handler(self._read_json())
+        except ApiError as e:
+            self._error(e.status, str(e))
+            return
+        except Exception:
+            log.exception("POST %s failed", self.path)
+            self._error(500, "internal error")
+            return
+        self._send(200, _dumps(payload))
+
+    def _read_json(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise ApiError(400, "invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise ApiError(413, "request body too large")
+        body = self.rfile.read(length)
+        self._body_unread = False
+        if self.headers.get("Content-Encoding", "").lower() == "gzip":
+            try:
+                with gzip.GzipFile(fileobj=io.BytesIO(body)) as f:
+                    body = f.read(MAX_BODY_BYTES + 1)
+            except OSError:
+                raise ApiError(400, "invalid gzip body")
+            if len(body) > MAX_BODY_BYTES:
+                raise ApiError(413, "request body too large")
+        try:
+            return json.loads(body or b"null")
+        except ValueError:
+            raise ApiError(400, "invalid JSON")
+
+    def _static(self, name: str, content_type: str) -> None:
+        path = os.path.join(ROOT, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._error(404, "not found")
+            return
+        etag = f'"{int(stat.st_mtime)}-{stat.st_size}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _etag_matches(self.headers.get("If-None-Match", ""), etag):
+            self._send(304, headers=headers)
+            return
+        with open(path, "rb") as f:
+            self._send(200, f.read(), content_type, headers)
+
+
+def serve(port: int = 8502, host: str = "127.0.0.1", workers: bool = True) -> ThreadingHTTPServer:
+    """Initialise the schema and serve the API from a daemon thread (plus the job workers)."""
+    db.init_db()
+    if workers:
+        jobs.start_workers()
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    threading.Thread(target=server.serve_forever, name="api-http", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    server = serve(int(os.getenv("API_PORT", "8502")), os.getenv("API_HOST", "127.0.0.1"))
+    host, port = server.server_address[:2]
+    print(f"CivicGuardian API on http://{host}:{port}/api/reports")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        jobs.stop_workers()
@@ -0,0 +1,162 @@
+# benchmarks/bench_async.py
+"""
+Throughput of the async db layer (db_async.py) against the sync one.
+
+    python benchmarks/bench_async.py --scale 10k --clients 16 --requests 50
+    python benchmarks/bench_async.py --scale 100k --db /tmp/bench-100k.db --out async-100k.json
+
+Each simulated client makes --requests API-style requests. A request is one
+read from a fixed mix: a report page, a filtered count, the map layer for a
+street, an unread count or a table version. The same request sequence runs
+three ways:
+
+    sync         one thread, one request after another
+    sync_threads --clients threads (like api.py's ThreadingHTTPServer)
+    async        --clients tasks on one event loop
+
+Each mode reports requests/s and p50/p95 latency. The "tables" section
+times the Debug page's three full table loads, first one after another
+(db) and then concurrently (db_async.load_tables). The database is filled
+by benchmarks/synthetic.py unless --db already holds the scale.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _latency(samples, elapsed):
+    ms = sorted(s * 1000.0 for s in samples)
+    return {
+        "requests": len(ms),
+        "req_per_s": round(len(ms) / elapsed, 1),
+        "p50_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+    }
+
+
+def request_mix(synthetic):
+    """name -> (sync callable, async callable) pairs, used round-robin."""
+    import db
+    import db_async
+
+    hot_lat, hot_lng = synthetic.HOTSPOTS[0]
+    street = (hot_lat - 0.005, hot_lng - 0.005, hot_lat + 0.005, hot_lng + 0.005)
+    return [
+        ("query_reports", lambda: db.query_reports(limit=50), lambda: db_async.query_reports(limit=50)),
+        ("count_reports", lambda: db.count_reports(category="theft"), lambda: db_async.count_reports(category="theft")),
+        ("geojson_street", lambda: db.get_incidents_geojson(street, 200), lambda: db_async.get_incidents_geojson(street, 200)),
+        ("unread_count", lambda: db.get_unread_count(db.DEFAULT_USER), lambda: db_async.get_unread_count(db.DEFAULT_USER)),
+        ("change_version", lambda: db.change_version("reports"), lambda: db_async.change_version("reports")),
+    ]
+
+
+def run_sync(mix, total):
+    samples = []
+    t0 = time.perf_counter()
+    for i in range(total):
+        s = time.perf_counter()
+        mix[i % len(mix)][1]()
+        samples.append(time.perf_counter() - s)
+    return _latency(samples, time.perf_counter() - t0)
+
+
+def run_sync_threads(mix, clients, per_client):
+    def client(c):
+        out = []
+        for i in range(per_client):
+            s = time.perf_counter()
+            mix[(c + i) % len(mix)][1]()
+            out.append(time.perf_counter() - s)
+        return out
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        samples = [s for chunk in pool.map(client, range(clients)) for s in chunk]
+    return _latency(samples, time.perf_counter() - t0)
+
+
+async def run_async(mix, clients, per_client):
+    async def client(c):
+        out = []
+        for i in range(per_client):
+            s = time.perf_counter()
+            await mix[(c + i) % len(mix)][2]()
+            out.append(time.perf_counter() - s)
+        return out
+
+    t0 = time.perf_counter()
+    chunks = await asyncio.gather(*(client(c) for c in range(clients)))
+    return _latency([s for chunk in chunks for s in chunk], time.perf_counter() - t0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=["10k", "100k", "1m"], default="10k")
+    parser.add_argument("--db", help="SQLite file to reuse/fill (default: a temporary file)")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=50, help="requests per client")
+    parser.add_argument("--out", help="write results JSON here (default: stdout)")
+    args = parser.parse_args()
+
+    out_path = os.path.abspath(args.out) if args.out else None
+    workdir = tempfile.mkdtemp(prefix="civicguardian-bench-")
+    db_path = os.path.abspath(args.db) if args.db else os.path.join(workdir, "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.chdir(workdir)  # db.py creates ./data for blobs
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import db
+    import db_async
+    import stats
+    import synthetic
+
+    db.init_db()
+    n = synthetic.SCALES[args.scale]
+    have = stats.summary_counts("reports", "all").get("*", 0)
+    if have < n:
+        if have:
+            sys.exit(f"{db_path} holds {have} reports, not the {args.scale} scale; use another --db")
+        synthetic.populate(db, n)
+
+    mix = request_mix(synthetic)
+    for _, sync_fn, async_fn in mix:  # warm caches and both pools
+        sync_fn()
+        db_async.run(async_fn())
+    total = args.clients * args.requests
+    results = {
+        "meta": {"scale": args.scale, "clients": args.clients, "requests_per_client": args.requests},
+        "sync": run_sync(mix, total),
+        "sync_threads": run_sync_threads(mix, args.clients, args.requests),
+        "async": db_async.run(run_async(mix, args.clients, args.requests)),
+    }
+
+    t0 = time.perf_counter()
+    db.get_reports(), db.get_incidents(), db.get_notifications()
+    sequential = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    db_async.run(db_async.load_tables("reports", "incidents", "notifications"))
+    concurrent = time.perf_counter() - t0
+    results["tables"] = {"sync_ms": round(sequential * 1000.0, 1), "async_ms": round(concurrent * 1000.0, 1)}
+
+    for mode in ("sync", "sync_threads", "async"):
+        r = results[mode]
+        print(f"{mode:14} {r['req_per_s']:10.1f} req/s   p50 {r['p50_ms']:8.2f} ms   p95 {r['p95_ms']:8.2f} ms", file=sys.stderr)
+    print(f"{'tables':14} sync {results['tables']['sync_ms']} ms   async {results['tables']['async_ms']} ms", file=sys.stderr)
+    text = json.dumps(results, indent=2)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
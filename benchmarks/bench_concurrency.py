@@ -0,0 +1,113 @@
+# benchmarks/bench_concurrency.py
+"""
+Throughput of concurrent readers and writers against a scratch database.
+
+    python benchmarks/bench_concurrency.py --readers 8 --writers 4 --seconds 10
+    SQLITE_JOURNAL_MODE=DELETE python benchmarks/bench_concurrency.py   # compare with rollback journal
+
+Readers page through reports with db.query_reports(); writers insert with
+db.add_report(). Engine settings come from the usual environment variables
+(see dbconfig.py), so the same script compares PRAGMA/pool configurations.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--seed-rows", type=int, default=2000, help="reports inserted before timing starts")
+    parser.add_argument("--db", help="database file (default: a temporary file)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="civicguardian-bench-")
+    db_path = args.db or os.path.join(workdir, "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.chdir(workdir)  # db.py creates ./data for blobs
+    sys.path.insert(0, ROOT)
+    import db
+
+    db.init_db()
+    for i in range(args.seed_rows):
+        db.add_report(None, None, "theft", f"seed report {i}", 9.3, 125.9, "2026-01-01", None, None)
+
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "read_errors": 0, "write_errors": 0}
+    latencies = {"reads": [], "writes": []}
+    lock = threading.Lock()
+
+    def reader():
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            try:
+                db.query_reports(category="theft", limit=50)
+                key = "reads"
+            except Exception:
+                key = "read_errors"
+            dt = time.perf_counter() - t0
+            with lock:
+                counts[key] += 1
+                if key == "reads":
+                    latencies["reads"].append(dt)
+
+    def writer(n):
+        i = 0
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            try:
+                db.add_report(None, None, "theft", f"writer {n} report {i}", 9.3, 125.9, "2026-01-01", None, None)
+                key = "writes"
+            except Exception:
+                key = "write_errors"
+            dt = time.perf_counter() - t0
+            i += 1
+            with lock:
+                counts[key] += 1
+                if key == "writes":
+                    latencies["writes"].append(dt)
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(args.writers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    def pct(values, p):
+        if not values:
+            return None
+        values = sorted(values)
+        return round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 2)
+
+    result = {
+        "settings": {k: v for k, v in db.SETTINGS.items() if k != "url"},
+        "readers": args.readers,
+        "writers": args.writers,
+        "seconds": round(elapsed, 2),
+        "reads_per_s": round(counts["reads"] / elapsed, 1),
+        "writes_per_s": round(counts["writes"] / elapsed, 1),
+        "read_errors": counts["read_errors"],
+        "write_errors": counts["write_errors"],
+        "read_p50_ms": pct(latencies["reads"], 0.5),
+        "read_p99_ms": pct(latencies["reads"], 0.99),
+        "write_p50_ms": pct(latencies["writes"], 0.5),
+        "write_p99_ms": pct(latencies["writes"], 0.99),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
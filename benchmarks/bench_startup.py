@@ -0,0 +1,96 @@
+# benchmarks/bench_startup.py
+"""
+Import cost of the app's dependencies and first-render time of each page.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --pages "📋 Reports" "📊 Admin Dashboard" --seed-rows 5000
+
+Every measurement runs in a fresh interpreter, so nothing is already in
+sys.modules. "imports" is the time to import each module on top of
+streamlit. "pages" renders the app headless (streamlit.testing AppTest)
+straight onto one page: ``first_run_s`` is the cold start (imports, schema
+init, first queries), ``rerun_s`` a following rerun, and ``heavy_modules``
+lists which of the heavy modules that page ended up loading.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "civicguardian_app.py")
+HEAVY_MODULES = ["pandas", "plotly.express", "folium", "streamlit_folium", "geocoder"]
+PAGES = ["🏠 Home", "🗺️ Map", "📋 Reports", "🔔 Notifications", "👤 Profile", "📊 Admin Dashboard", "🧪 Debug"]
+
+_IMPORT_SNIPPET = """
+import json, sys, time
+import streamlit
+t0 = time.perf_counter()
+try:
+    __import__(sys.argv[1])
+    ok = True
+except ImportError:
+    ok = False
+print(json.dumps({"seconds": time.perf_counter() - t0, "ok": ok}))
+"""
+
+_PAGE_SNIPPET = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+app, page, heavy = sys.argv[1], sys.argv[2], json.loads(sys.argv[3])
+at = AppTest.from_file(app, default_timeout=120)
+at.session_state["page"] = page
+t0 = time.perf_counter()
+at.run()
+first = time.perf_counter() - t0
+t0 = time.perf_counter()
+at.run()
+rerun = time.perf_counter() - t0
+print(json.dumps({
+    "first_run_s": round(first, 3),
+    "rerun_s": round(rerun, 3),
+    "exceptions": [e.message for e in at.exception],
+    "heavy_modules": [m for m in heavy if m in sys.modules],
+}))
+"""
+
+
+def _run(snippet, args, cwd, env):
+    out = subprocess.run(
+        [sys.executable, "-c", snippet, *args], cwd=cwd, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", nargs="+", default=PAGES)
+    parser.add_argument("--seed-rows", type=int, default=1000, help="reports/incidents inserted first")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="civicguardian-bench-")
+    env = dict(os.environ)
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    env["GEOLOCATION_PROVIDER"] = "static"  # no network lookups in the measurements
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+
+    seed = (
+        "import db; db.init_db(); n = int(__import__('sys').argv[1]); "
+        "db.bulk_add_reports({'category': 'theft', 'description': f'seed report {i}', 'latitude': 9.3 + i * 1e-4, "
+        "'longitude': 125.9, 'date': '2026-01-01'} for i in range(n)); "
+        "db.bulk_add_incidents({'lat': 9.3 + i * 1e-4, 'lng': 125.9, 'type': 'theft', 'desc': 'seed'} for i in range(n))"
+    )
+    subprocess.run([sys.executable, "-c", seed, str(args.seed_rows)], cwd=workdir, env=env, check=True)
+
+    result = {"imports": {}, "pages": {}}
+    for module in HEAVY_MODULES + ["db"]:
+        result["imports"][module] = _run(_IMPORT_SNIPPET, [module], workdir, env)
+    for page in args.pages:
+        result["pages"][page] = _run(_PAGE_SNIPPET, [APP, page, json.dumps(HEAVY_MODULES)], workdir, env)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
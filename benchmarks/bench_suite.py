@@ -0,0 +1,263 @@
+# benchmarks/bench_suite.py
+"""
+Timed db-layer scenarios and headless page renders at a given data scale.
+
+    python benchmarks/bench_suite.py --scale 10k --out bench-10k.json
+    python benchmarks/bench_suite.py --scale 100k --db /tmp/bench-100k.db --compare bench-100k-main.json
+    python benchmarks/bench_suite.py --scale 1m --db /tmp/bench-1m.db --skip get_reports pages
+
+The database is filled by benchmarks/synthetic.py the first time and
+reused while --db points at a file that already holds that scale. Each
+scenario gets one warm-up call and then runs --repeat times; results hold
+min/median/p95/max in milliseconds and the rows returned. Pages render
+headless through streamlit.testing's AppTest (first run and a rerun).
+The JSON records the git commit and settings, and --compare prints the
+median ratio against an earlier results file to spot regressions.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "civicguardian_app.py")
+PAGES = ["🏠 Home", "🗺️ Map", "📋 Reports", "🔔 Notifications", "👤 Profile", "📊 Admin Dashboard", "🧪 Debug"]
+REGRESSION_RATIO = 1.2  # --compare flags medians this much slower
+
+
+class _CountingSink(io.RawIOBase):
+    """Write-only file that just counts bytes (keeps disk speed out of export timings)."""
+
+    def __init__(self):
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.size += len(b)
+        return len(b)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _rows(result):
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        return len(result[0])
+    if isinstance(result, dict) and "features" in result:
+        return len(result["features"])
+    if isinstance(result, int):
+        return result
+    return None
+
+
+def _summary(samples, rows):
+    ms = sorted(s * 1000.0 for s in samples)
+    return {
+        "runs": len(ms),
+        "min_ms": round(ms[0], 3),
+        "median_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        "max_ms": round(ms[-1], 3),
+        "rows": rows,
+    }
+
+
+def scenarios(db, stats, synthetic):
+    """name -> zero-argument callable."""
+    import hotspots
+
+    today = datetime.utcnow().date()
+    now = hotspots.current_hour()
+    lat, lng = synthetic.CENTER
+    hot_lat, hot_lng = synthetic.HOTSPOTS[0]
+    city = (lat - 0.25, lng - 0.25, lat + 0.25, lng + 0.25)
+    street = (hot_lat - 0.005, hot_lng - 0.005, hot_lat + 0.005, hot_lng + 0.005)
+
+    def deep_page():
+        cursor, rows = None, []
+        for _ in range(20):
+            rows, cursor = db.query_reports(after=cursor, limit=50)
+            if cursor is None:
+                break
+        return rows
+
+    def folium_markers():
+        import folium
+
+        layer = db.get_incidents_geojson(street, 200)
+        m = folium.Map(location=[hot_lat, hot_lng], zoom_start=16)
+        folium.GeoJson(layer, marker=folium.CircleMarker(radius=8, fill=True)).add_to(m)
+        m.get_root().render()
+        return layer
+
+    def export(fmt):
+        def run():
+            return db.export_reports(_CountingSink(), fmt, start_date=today - timedelta(days=30), end_date=today)
+        return run
+
+    return {
+        "get_reports": db.get_reports,
+        "query_reports.first_page": lambda: db.query_reports(limit=50),
+        "query_reports.category": lambda: db.query_reports(category="theft", limit=50),
+        "query_reports.status_30d": lambda: db.query_reports(
+            status="pending", start_date=today - timedelta(days=30), end_date=today, limit=50
+        ),
+        "query_reports.bbox": lambda: db.query_reports(bbox=street, limit=50),
+        "query_reports.page_20": deep_page,
+        "search_reports": lambda: db.search_reports("flooded road", limit=50),
+        "map.clusters_city": lambda: db.get_incident_clusters(city, 11),
+        "map.geojson_street": lambda: db.get_incidents_geojson(street, 200),
+        "map.within_2km": lambda: db.get_incidents_within(hot_lat, hot_lng, 2.0),
+        "map.folium_markers": folium_markers,
+        "map.heatmap_city_30d": lambda: hotspots.heatmap_points(city, now - timedelta(days=30), now),
+        "dashboard.emerging_hotspots": hotspots.emerging_clusters,
+        "dashboard.summary": stats.dashboard_metrics,
+        "dashboard.live": stats.live_dashboard_metrics,
+        "dashboard.category_counts": lambda: stats.group_counts("reports", "category"),
+        "export.csv_30d": export("csv"),
+        "export.csv_gz_30d": export("csv.gz"),
+    }
+
+
+def render_pages(pages, repeat):
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+    for page in pages:
+        at = AppTest.from_file(APP, default_timeout=600)
+        at.session_state["page"] = page
+        t0 = time.perf_counter()
+        at.run()
+        first = time.perf_counter() - t0
+        reruns = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            at.run()
+            reruns.append(time.perf_counter() - t0)
+        results[page] = {
+            "first_run_ms": round(first * 1000.0, 3),
+            "rerun": _summary(reruns, None),
+            "exceptions": [e.message for e in at.exception],
+        }
+    return results
+
+
+def compare(current, previous_path):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+    print(f"\n{'scenario':40} {'before':>10} {'after':>10} {'ratio':>7}", file=sys.stderr)
+    pairs = [(name, r["median_ms"], current["scenarios"].get(name, {}).get("median_ms")) for name, r in previous["scenarios"].items()]
+    pairs += [
+        (f"page {name}", r["rerun"]["median_ms"], current["pages"].get(name, {}).get("rerun", {}).get("median_ms"))
+        for name, r in previous.get("pages", {}).items()
+    ]
+    for name, before, after in pairs:
+        if after is None:
+            continue
+        ratio = after / before if before else float("inf")
+        flag = "  <-- slower" if ratio > REGRESSION_RATIO else ""
+        print(f"{name:40} {before:10.2f} {after:10.2f} {ratio:7.2f}{flag}", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=["10k", "100k", "1m"], default="10k")
+    parser.add_argument("--db", help="SQLite file to reuse/fill (default: a temporary file)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--photos", type=int, default=None, help="reports with photos (default: 1 per 1000 rows)")
+    parser.add_argument("--only", nargs="*", default=None, help="run scenarios whose name contains one of these")
+    parser.add_argument("--skip", nargs="*", default=[], help="skip scenarios whose name contains one of these ('pages' skips renders)")
+    parser.add_argument("--out", help="write results JSON here (default: stdout)")
+    parser.add_argument("--compare", help="earlier results JSON to compare medians against")
+    args = parser.parse_args()
+
+    out_path = os.path.abspath(args.out) if args.out else None
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+    workdir = tempfile.mkdtemp(prefix="civicguardian-bench-")
+    db_path = os.path.abspath(args.db) if args.db else os.path.join(workdir, "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("GEOLOCATION_PROVIDER", "static")  # no network lookups in page renders
+    os.chdir(workdir)  # db.py creates ./data for blobs
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import db
+    import stats
+    import synthetic
+
+    db.init_db()
+    n = synthetic.SCALES[args.scale]
+    photos = n // 1000 if args.photos is None else args.photos
+    have = stats.summary_counts("reports", "all").get("*", 0)
+    generate_s = None
+    if have != n + photos:
+        if have:
+            sys.exit(f"{db_path} holds {have} reports, not the {args.scale} scale; use another --db")
+        t0 = time.perf_counter()
+        synthetic.populate(db, n, photos=photos)
+        generate_s = round(time.perf_counter() - t0, 1)
+
+    def wanted(name):
+        if any(s in name for s in args.skip):
+            return False
+        return args.only is None or any(s in name for s in args.only)
+
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "started": datetime.utcnow().isoformat(timespec="seconds"),
+            "scale": args.scale,
+            "reports": n + photos,
+            "incidents": n,
+            "repeat": args.repeat,
+            "generate_s": generate_s,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "settings": {k: v for k, v in db.SETTINGS.items() if k != "url"},
+        },
+        "scenarios": {},
+        "pages": {},
+    }
+    for name, fn in scenarios(db, stats, synthetic).items():
+        if not wanted(name):
+            continue
+        result = fn()  # warm-up
+        samples = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            result = fn()
+            samples.append(time.perf_counter() - t0)
+        results["scenarios"][name] = _summary(samples, _rows(result))
+        print(f"{name:40} {results['scenarios'][name]['median_ms']:10.2f} ms", file=sys.stderr)
+    if wanted("pages"):
+        results["pages"] = render_pages([p for p in PAGES if wanted(p)], args.repeat)
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    if compare_path:
+        compare(results, compare_path)
+
+
+if __name__ == "__main__":
+    main()
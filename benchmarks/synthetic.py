@@ -0,0 +1,162 @@
+# benchmarks/synthetic.py
+"""
+Deterministic synthetic reports, incidents and photos for benchmarks.
+
+    python benchmarks/synthetic.py --scale 100k --db /tmp/bench-100k.db
+    python benchmarks/synthetic.py --scale 1m --photos 2000 --db /tmp/bench-1m.db
+
+Rows are spread over a ~40 km area around the app's default location and
+over the year before today (UTC midnight, so the pages' "last 30 days"
+views always have data), with skewed category/status mixes so filters have
+realistic selectivity. The same seed always produces the same rows; only
+the absolute dates move with the day it runs.
+Generation streams through db.bulk_add_reports/bulk_add_incidents, so
+memory stays flat even at 1M rows. Set DATABASE_URL (or use --db) before
+db is imported.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+CENTER = (9.336040891463876, 125.97721784390745)  # civicguardian_app.DEFAULT_LAT/LNG
+SPREAD_DEG = 0.2
+CATEGORIES = ["theft", "vandalism", "accident", "suspicious", "hazard", "other"]
+CATEGORY_WEIGHTS = [30, 15, 20, 15, 12, 8]
+STATUSES = ["pending", "resolved"]
+STATUS_WEIGHTS = [70, 30]
+WORDS = (
+    "bike stolen parked outside market road flooded near school streetlight broken graffiti wall "
+    "collision motorcycle jeepney crossing suspicious person loitering late night fallen tree blocking "
+    "lane wallet phone taken plaza fire smoke warehouse dog loose bridge pothole deep corner"
+).split()
+END = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+
+
+_hotspot_rng = random.Random(0)
+HOTSPOTS = [
+    (CENTER[0] + _hotspot_rng.uniform(-SPREAD_DEG, SPREAD_DEG), CENTER[1] + _hotspot_rng.uniform(-SPREAD_DEG, SPREAD_DEG))
+    for _ in range(8)
+]
+
+
+def _point(rng: random.Random):
+    # clustered: most rows near a handful of hotspots, the rest uniform
+    if rng.random() < 0.7:
+        hot_lat, hot_lng = rng.choice(HOTSPOTS)
+        lat = hot_lat + rng.gauss(0, 0.005)
+        lng = hot_lng + rng.gauss(0, 0.005)
+    else:
+        lat = CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+        lng = CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+    return round(lat, 6), round(lng, 6)
+
+
+def _timestamp(rng: random.Random) -> datetime:
+    return END - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def synthetic_reports(n: int, seed: int = 1) -> Iterator[Dict]:
+    rng = random.Random(seed)
+    for i in range(n):
+        lat, lng = _point(rng)
+        ts = _timestamp(rng)
+        yield {
+            "fullname": f"Reporter {rng.randrange(5000)}",
+            "contact": f"user{rng.randrange(5000)}@example.org",
+            "category": rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0],
+            "description": _text(rng, rng.randint(6, 30)),
+            "latitude": lat,
+            "longitude": lng,
+            "date": ts.date().isoformat(),
+            "timestamp": ts,
+            "status": rng.choices(STATUSES, STATUS_WEIGHTS)[0],
+        }
+
+
+def synthetic_incidents(n: int, seed: int = 2) -> Iterator[Dict]:
+    rng = random.Random(seed)
+    for i in range(n):
+        lat, lng = _point(rng)
+        yield {
+            "lat": lat,
+            "lng": lng,
+            "type": rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0],
+            "desc": _text(rng, rng.randint(3, 12)),
+            "time": "Just now",
+            "distance": f"{rng.uniform(0, 5):.1f} miles",
+            "timestamp": _timestamp(rng),
+        }
+
+
+def synthetic_photo(seed: int, size=(1280, 960)) -> bytes:
+    """A JPEG with some structure (so compression and thumbnails do real work)."""
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:  # without Pillow: random bytes of a typical photo size
+        return random.Random(seed).randbytes(200_000)
+    rng = random.Random(seed)
+    img = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        box = [x0, y0, x0 + rng.randrange(50, 400), y0 + rng.randrange(50, 300)]
+        draw.rectangle(box, fill=tuple(rng.randrange(256) for _ in range(3)))
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=85)
+    return out.getvalue()
+
+
+def populate(db, reports: int, incidents: Optional[int] = None, photos: int = 0, seed: int = 1, progress=None) -> Dict:
+    """Fill an empty database; returns the row counts written."""
+    incidents = reports if incidents is None else incidents
+    written = {
+        "reports": db.bulk_add_reports(synthetic_reports(reports, seed), chunk_size=5000, progress=progress),
+        "incidents": db.bulk_add_incidents(synthetic_incidents(incidents, seed + 1), chunk_size=5000, progress=progress),
+    }
+    rng = random.Random(seed + 2)
+    for i, row in enumerate(synthetic_reports(photos, seed + 3)):
+        db.add_report(
+            row["fullname"], row["contact"], row["category"], row["description"],
+            row["latitude"], row["longitude"], row["date"], synthetic_photo(rng.randrange(1 << 30)), f"photo_{i}.jpg",
+        )
+    written["photos"] = photos
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=SCALES, default="10k")
+    parser.add_argument("--photos", type=int, default=None, help="reports with photos (default: 1 per 1000 rows)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", help="SQLite file to fill (default: DATABASE_URL / data/reports.db)")
+    args = parser.parse_args()
+    if args.db:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    sys.path.insert(0, ROOT)
+    import db
+
+    db.init_db()
+    n = SCALES[args.scale]
+    photos = n // 1000 if args.photos is None else args.photos
+
+    def progress(inserted, skipped):
+        print(f"\r{inserted} rows", end="", file=sys.stderr)
+
+    written = populate(db, n, photos=photos, seed=args.seed, progress=progress)
+    print(file=sys.stderr)
+    print(written)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# blobstore.py
+"""
+Content-addressed storage for report photos.
+
+Blobs are keyed by the SHA-256 of their bytes, so uploading the same photo
+twice stores it once. LocalBlobStore keeps files under data/blobs; S3BlobStore
+talks to any client exposing the boto3 put_object/get_object/head_object/
+delete_object calls (MemoryS3Client is a local stand-in for it).
+"""
+import hashlib
+import io
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+THUMBNAIL_SIZE = (320, 320)
+
+
+def sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore:
+    """Interface for photo storage backends."""
+
+    def put(self, data: bytes) -> str:
+        """Store data and return its SHA-256 key (no-op if already stored)."""
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files fanned out by key prefix: <root>/ab/cd/abcd...."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def put(self, data: bytes) -> str:
+        key = sha256_hex(data)
+        path = self._path(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write then rename so readers never see a partial file
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return key
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def delete(self, key: str) -> bool:
+        try:
+            os.remove(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+
+class S3BlobStore(BlobStore):
+    """Blobs in an S3-compatible bucket, via a boto3-style client."""
+
+    def __init__(self, client, bucket: str, prefix: str = "blobs/"):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def put(self, data: bytes) -> str:
+        key = sha256_hex(data)
+        if not self.exists(key):
+            self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+        return key
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            obj = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except KeyError:
+            return None
+        except Exception as e:
+            if _is_missing(e):
+                return None
+            raise
+        return obj["Body"].read()
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except KeyError:
+            return False
+        except Exception as e:
+            if _is_missing(e):
+                return False
+            raise
+
+    def delete(self, key: str) -> bool:
+        existed = self.exists(key)
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+        return existed
+
+
+def _is_missing(exc: Exception) -> bool:
+    # botocore ClientError carries the HTTP error code in .response
+    code = str(getattr(exc, "response", {}).get("Error", {}).get("Code", ""))
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+class MemoryS3Client:
+    """In-process stand-in for a boto3 S3 client (put/get/head/delete only)."""
+
+    def __init__(self):
+        self.objects: Dict[Tuple[str, str], bytes] = {}
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs) -> Dict:
+        with self._lock:
+            self.objects[(Bucket, Key)] = bytes(Body)
+        return {}
+
+    def get_object(self, Bucket: str, Key: str, **kwargs) -> Dict:
+        with self._lock:
+            data = self.objects[(Bucket, Key)]
+        return {"Body": io.BytesIO(data), "ContentLength": len(data)}
+
+    def head_object(self, Bucket: str, Key: str, **kwargs) -> Dict:
+        with self._lock:
+            data = self.objects[(Bucket, Key)]
+        return {"ContentLength": len(data)}
+
+    def delete_object(self, Bucket: str, Key: str, **kwargs) -> Dict:
+        with self._lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+
+def make_thumbnail(data: bytes, size: Tuple[int, int] = THUMBNAIL_SIZE) -> Optional[bytes]:
+    """Downscale an image to fit within size, as JPEG. None if it can't be decoded."""
+    try:
+        from PIL import Image  # imported here: only photo uploads need Pillow, not every start
+    except ImportError:  # thumbnails are skipped without Pillow
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.thumbnail(size)
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=80, optimize=True)
+            return out.getvalue()
+    except Exception:
+        return None
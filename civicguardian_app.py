@@ -2,17 +2,23 @@
 import os
 import io
 import base64
-from datetime import datetime, timedelta
+import time
+from datetime import date, datetime, timedelta
 from typing import Optional
 
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import folium
-from streamlit_folium import st_folium
-import geocoder
+# pandas, plotly and folium are imported by the pages that use them, not on every cold start
 
 import db  # uses data/reports.db and functions defined in db.py
+import clustering
+import export
+import geolocation
+import jobs
+import metrics
+import notifications
+import search
+import spatial
+import stats
 
 # --- Page config
 st.set_page_config(page_title="CivicGuardian", page_icon="🛡️", layout="wide")
@@ -29,57 +35,135 @@ st.markdown("""
 
 # --- Constants and categories
 DEFAULT_LAT, DEFAULT_LNG = 9.336040891463876, 125.97721784390745
-CATEGORIES = ["theft", "vandalism", "accident", "suspicious", "hazard", "other"]
+CATEGORIES = list(db.REPORT_CATEGORIES)
 incident_colors = {'theft':'red','vandalism':'orange','accident':'blue','suspicious':'green','hazard':'yellow'}
 incident_icons = {'theft':'💎','vandalism':'🎨','accident':'🚗','suspicious':'👤','hazard':'⚠️'}
-
-# --- Init DB
-DB_ENABLED = db.init_db()
+REPORT_STATUSES = list(db.REPORT_STATUSES)
+REPORTS_PAGE_SIZE = 50
+REPORTS_PAGE_SIZES = [25, 50, 100]
+SESSION_LOCATION_TTL = 600  # seconds before a session asks the geolocation service again
+CLUSTER_STYLE = "width:36px;height:36px;line-height:36px;border-radius:50%;background:rgba(229,57,53,0.8);color:white;text-align:center;font-weight:bold;"
+MAX_MAP_MARKERS = 200  # above this many incidents in view the map switches to grid clusters
+HEATMAP_WINDOWS = {"Last 24 hours": 24, "Last 7 days": 24 * 7, "Last 30 days": 24 * 30}
+
+# --- Instrumentation: time every db.* call, the map, geolocation and each page (see the Debug page)
+metrics.begin_trace()
+rerun_timer = metrics.Timer("rerun")
+
+@st.cache_resource
+def instrument():
+    metrics.instrument_module(db, "db", exclude=("grid_index", "cell_key", "summary_keys"))
+    if os.getenv("METRICS_PORT"):
+        metrics.serve(int(os.getenv("METRICS_PORT")))
+    return True
+
+instrument()
+
+# --- Init DB (schema checks and migrations once per server process, not on every rerun)
+@st.cache_resource(show_spinner=False)
+def init_database():
+    return db.init_db()
+
+DB_ENABLED = init_database()
+if not DB_ENABLED:
+    init_database.clear()  # try again on the next rerun
 if DB_ENABLED:
-    st.sidebar.success("Database: connected (SQLite)")
+    backend = {"sqlite": "SQLite", "postgresql": "PostgreSQL"}.get(db.engine.dialect.name, db.engine.dialect.name)
+    st.sidebar.success(f"Database: connected ({backend})")
 else:
     st.sidebar.info("Database: not available — using session only")
 
-# --- Load session-state from DB or defaults
-if 'incidents' not in st.session_state:
-    if DB_ENABLED:
-        try:
-            st.session_state.incidents = db.get_incidents() or []
-        except Exception:
-            st.session_state.incidents = []
-    else:
-        st.session_state.incidents = []
-
-if 'reports' not in st.session_state:
+# --- Load session-state from the DB change log (only rows changed since the last rerun) or defaults
+SINCE = {"reports": db.get_reports_since, "incidents": db.get_incidents_since, "notifications": db.get_notifications_since}
+
+def sync_session(table):
+    cursors = st.session_state.setdefault("sync_cursors", {})
+    delta = SINCE[table](cursors.get(table))
+    if delta["reset"]:
+        st.session_state[table] = delta["rows"]
+    elif delta["rows"] or delta["deleted"]:
+        by_id = {r["id"]: r for r in st.session_state[table]}
+        for rid in delta["deleted"]:
+            by_id.pop(rid, None)
+        for r in delta["rows"]:
+            by_id[r["id"]] = r
+        st.session_state[table] = sorted(by_id.values(), key=lambda r: r["id"])
+    cursors[table] = delta["cursor"]
+
+for table in ("incidents", "reports"):
     if DB_ENABLED:
         try:
-            st.session_state.reports = db.get_reports() or []
+            sync_session(table)
         except Exception:
-            st.session_state.reports = []
+            st.session_state.setdefault(table, [])
     else:
-        st.session_state.reports = []
+        st.session_state.setdefault(table, [])
+
+# --- Notifications: this user's list, kept current by the in-process broadcaster
+def current_user_id():
+    try:
+        if st.user.is_logged_in:
+            return st.user.email
+    except Exception:
+        pass
+    return db.DEFAULT_USER
+
+USER_ID = current_user_id()
+
+def receive_notifications(check_counter=True):
+    # new alerts arrive in the session's inbox; on full reruns the unread counter (a PK lookup)
+    # catches anything published by another server process, and only then is the list reloaded
+    inbox = st.session_state.get("inbox")
+    if inbox is not None and inbox.user_id != USER_ID:
+        # signed in or out since the inbox was opened: follow the new user
+        notifications.broadcaster.unsubscribe(inbox)
+        inbox = None
+    if inbox is None:
+        inbox = st.session_state.inbox = notifications.broadcaster.subscribe(USER_ID)
+        st.session_state.notifications = db.get_user_notifications(USER_ID)
+        st.session_state.unread_count = db.get_unread_count(USER_ID)
+        return []
+    events = inbox.drain()
+    known = {n.get("id") for n in st.session_state.notifications}
+    for event in events:
+        st.session_state.unread_count = event["unread_count"]
+        if event["notification"]["id"] in known:
+            continue  # a retried delivery
+        known.add(event["notification"]["id"])
+        st.session_state.notifications.insert(0, event["notification"])
+        st.toast(f"🔔 {event['notification']['title']}")
+    if check_counter and not events and db.get_unread_count(USER_ID) != st.session_state.unread_count:
+        st.session_state.notifications = db.get_user_notifications(USER_ID)
+        st.session_state.unread_count = db.get_unread_count(USER_ID)
+    return events
 
-if 'notifications' not in st.session_state:
-    if DB_ENABLED:
-        try:
-            st.session_state.notifications = db.get_notifications() or []
-        except Exception:
-            st.session_state.notifications = []
-    else:
-        st.session_state.notifications = []
+if DB_ENABLED:
+    try:
+        receive_notifications()
+    except Exception:
+        st.session_state.setdefault("notifications", [])
+else:
+    st.session_state.setdefault("notifications", [])
 
 if 'show_report_form' not in st.session_state:
     st.session_state.show_report_form = False
 
-# --- Detect user location (approx via IP)
-try:
-    g = geocoder.ip('me')
-    if g.ok and g.latlng:
-        USER_LAT, USER_LNG = g.latlng
-    else:
-        USER_LAT, USER_LNG = DEFAULT_LAT, DEFAULT_LNG
-except Exception:
-    USER_LAT, USER_LNG = DEFAULT_LAT, DEFAULT_LNG
+# --- Detect user location (approx via IP; cached per client IP and per session)
+@st.cache_resource
+def geolocation_service():
+    default = (DEFAULT_LAT, DEFAULT_LNG)
+    return geolocation.GeolocationService(geolocation.provider_from_env(default), default)
+
+def user_location():
+    cached = st.session_state.get("user_location")
+    if cached and cached[1] > time.time():
+        return cached[0]
+    with metrics.timer("geolocation.locate"):
+        latlng = geolocation_service().locate(getattr(st.context, "ip_address", None))
+    st.session_state.user_location = (latlng, time.time() + SESSION_LOCATION_TTL)
+    return latlng
+
+USER_LAT, USER_LNG = user_location()
 
 # --- Header
 st.markdown("""
@@ -91,13 +175,31 @@ st.markdown("""
 
 # --- Sidebar / Navigation
 st.sidebar.title("Navigation")
-page = st.sidebar.selectbox("Choose a page", ["🏠 Home","🗺️ Map","📋 Reports","🔔 Notifications","👤 Profile","📊 Admin Dashboard","🧪 Debug"])
 
-# Provide DB download button if file exists
-db_path = os.path.join("data", "reports.db")
-if os.path.exists(db_path):
-    with open(db_path, "rb") as f:
-        st.sidebar.download_button("Download DB", f, file_name="reports.db")
+@st.fragment(run_every=5)
+def notification_badge():
+    # reruns on its own every few seconds; reads the in-memory inbox, not the notifications table
+    if DB_ENABLED:
+        receive_notifications(check_counter=False)
+        unread = st.session_state.get("unread_count", 0)
+    else:
+        unread = sum(1 for n in st.session_state.notifications if n.get("unread"))
+    st.caption(f"🔔 {unread} unread notification{'s' if unread != 1 else ''}")
+
+with st.sidebar:
+    notification_badge()
+PAGES = ["🏠 Home","🗺️ Map","📋 Reports","🔔 Notifications","👤 Profile","📊 Admin Dashboard","🧪 Debug"]
+page = st.sidebar.selectbox("Choose a page", PAGES, key="page")
+
+# Provide DB download button; the snapshot is only taken when it is clicked
+def database_snapshot():
+    # download_button's callable must return bytes, not a file object
+    out = io.BytesIO()
+    db.backup_database(out)
+    return out.getvalue()
+
+if DB_ENABLED and db.engine.dialect.name == "sqlite":
+    st.sidebar.download_button("Download DB", database_snapshot, file_name="reports.db", mime="application/vnd.sqlite3")
 
 # --- Helper to render image bytes stored in DB
 def render_image_bytes(img_bytes: bytes, width: int = 300):
@@ -105,7 +207,202 @@ def render_image_bytes(img_bytes: bytes, width: int = 300):
         return
     st.image(img_bytes, width=width)
 
+# --- Helpers to read reports page by page instead of from the full session list
+def newest_reports(limit: int):
+    if DB_ENABLED:
+        try:
+            rows, _ = db.query_reports(limit=limit)
+            return rows
+        except Exception:
+            pass
+    return sorted(st.session_state.reports, key=lambda r: r.get("timestamp", datetime.min), reverse=True)[:limit]
+
+# --- Dashboard counts: materialized in the DB, recomputed from the session only without one
+def report_metrics():
+    if DB_ENABLED:
+        try:
+            return stats.dashboard_metrics()
+        except Exception:
+            pass
+    reps = st.session_state.reports
+    today = datetime.utcnow().date()
+    total = len(reps)
+    resolved = len([r for r in reps if r.get("status") == "resolved"])
+    return {
+        "total": total,
+        "today": len([r for r in reps if isinstance(r.get("timestamp"), datetime) and r["timestamp"].date() == today]),
+        "pending": len([r for r in reps if r.get("status") == "pending"]),
+        "resolved": resolved,
+        "response_rate": (resolved / total * 100) if total else 0.0,
+    }
+
+def incident_type_counts():
+    if DB_ENABLED:
+        try:
+            return stats.summary_counts("incidents", "type")
+        except Exception:
+            pass
+    counts = {}
+    for inc in st.session_state.incidents:
+        if inc.get("type"):
+            counts[inc["type"]] = counts.get(inc["type"], 0) + 1
+    return counts
+
+@st.cache_data(ttl=15, show_spinner=False)
+def incident_map_layer(bbox, zoom):
+    # one cached layer per (grid-snapped viewport, zoom): points when few, clusters otherwise
+    clusters = db.get_incident_clusters(bbox, zoom)
+    if sum(c["count"] for c in clusters) <= MAX_MAP_MARKERS:
+        return "points", db.get_incidents_geojson(bbox, MAX_MAP_MARKERS)
+    return "clusters", clusters
+
+@st.cache_data(ttl=15, show_spinner=False)
+def incident_heat_layer(bbox, hours, end):
+    # ``end`` is the next hour boundary, so the cache key rolls over as the window moves
+    import hotspots
+
+    return hotspots.heatmap_points(bbox, end - timedelta(hours=hours), end)
+
+@st.cache_resource
+def job_workers():
+    # one worker pool per server process; map layers are rebuilt once a derived incident lands
+    jobs.add_listener(lambda kind, payload: kind == "derive_incident" and (incident_map_layer.clear(), incident_heat_layer.clear()))
+    return jobs.start_workers()
+
+if DB_ENABLED:
+    job_workers()
+
+def session_map_layer(bbox, zoom):
+    clusters = clustering.cluster_points(st.session_state.incidents, zoom, bbox)
+    if sum(c["count"] for c in clusters) <= MAX_MAP_MARKERS:
+        inside = [i for i in st.session_state.incidents if i.get("lat") is not None and i.get("lng") is not None and clustering.in_bbox(float(i["lat"]), float(i["lng"]), bbox)]
+        return "points", clustering.to_geojson(inside)
+    return "clusters", clusters
+
+def render_incident_map(key, zoom_start, width, height, radius_km=None, heat_hours=None):
+    """
+    Draw the incident map for the last viewport the user saw, with a density
+    heatmap of the last ``heat_hours`` hours underneath when given; returns
+    (number of incidents drawn, "points" or "clusters"). Points are filtered
+    to ``radius_km``; clusters are whole grid cells, so those crossing the
+    circle count all of their incidents.
+    """
+    view = st.session_state.get(f"{key}_view") or {}
+    zoom = int(view.get("zoom") or zoom_start)
+    bbox = clustering.bbox_from_bounds(view.get("bounds")) or clustering.view_bbox(USER_LAT, USER_LNG, zoom, width, height)
+    if radius_km:
+        bbox = clustering.intersect_bbox(bbox, spatial.bbox_around(USER_LAT, USER_LNG, radius_km))
+    bbox = clustering.snap_bbox(bbox, clustering.cell_size_deg(zoom))
+    mode, layer, heat = "points", clustering.to_geojson([]), []
+    if bbox[0] < bbox[2] and bbox[1] < bbox[3]:
+        try:
+            mode, layer = incident_map_layer(bbox, zoom) if DB_ENABLED else session_map_layer(bbox, zoom)
+        except Exception:
+            mode, layer = session_map_layer(bbox, zoom)
+        if heat_hours and DB_ENABLED:
+            import hotspots
+
+            heat = incident_heat_layer(bbox, heat_hours, hotspots.current_hour())
+
+    import folium
+    from streamlit_folium import st_folium
+
+    build_timer = metrics.Timer("map.build")
+    m = folium.Map(location=[USER_LAT, USER_LNG], zoom_start=zoom_start)
+    folium.Marker([USER_LAT, USER_LNG], popup="You are here", icon=folium.Icon(color="blue")).add_to(m)
+    if radius_km:
+        folium.Circle([USER_LAT, USER_LNG], radius=radius_km * 1000, color="#3949ab", fill=False).add_to(m)
+    if heat:
+        from folium.plugins import HeatMap
+
+        # on the map itself rather than the feature group, so the plugin's script is always loaded
+        HeatMap(heat, name="Density", min_opacity=0.3, radius=25, blur=18).add_to(m)
+    fg = folium.FeatureGroup(name="Incidents")
+    if mode == "points":
+        if radius_km:
+            layer = {**layer, "features": [f for f in layer["features"] if spatial.haversine_km(USER_LAT, USER_LNG, f["geometry"]["coordinates"][1], f["geometry"]["coordinates"][0]) <= radius_km]}
+        shown = len(layer["features"])
+        if shown:
+            folium.GeoJson(
+                layer,
+                marker=folium.CircleMarker(radius=8, fill=True, fill_opacity=0.85),
+                style_function=lambda f: {"color": incident_colors.get(f["properties"]["type"], "blue"), "fillColor": incident_colors.get(f["properties"]["type"], "blue")},
+                popup=folium.GeoJsonPopup(fields=["type", "desc", "time"], labels=False),
+            ).add_to(fg)
+    else:
+        shown = sum(c["count"] for c in layer)
+        for c in layer:
+            folium.Marker([c["lat"], c["lng"]], icon=folium.DivIcon(html=f"<div style='{CLUSTER_STYLE}'>{c['count']}</div>", icon_size=(36, 36), icon_anchor=(18, 18))).add_to(fg)
+    build_timer.stop()
+    with metrics.timer("map.render"):
+        out = st_folium(m, key=key, feature_group_to_add=fg, width=width, height=height, returned_objects=["bounds", "zoom"])
+    if out and out.get("bounds"):
+        st.session_state[f"{key}_view"] = {"bounds": out["bounds"], "zoom": out.get("zoom") or zoom}
+    return shown, mode
+
+def as_day(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(str(value)[:10]).date()
+
+def filter_session_reports(category=None, start_date=None, end_date=None, query=None, status=None):
+    reps = st.session_state.reports
+    if category:
+        reps = [r for r in reps if (r.get("category") == category)]
+    if status:
+        reps = [r for r in reps if (r.get("status") == status)]
+    if query:
+        words = [w.lower() for w in search.query_words(query)]
+        reps = [r for r in reps if all(w in (r.get("description") or "").lower() for w in words)]
+    def in_date_range(r):
+        try:
+            d = as_day(r.get("date") or r.get("timestamp"))
+            return as_day(start_date) <= d <= as_day(end_date)
+        except Exception:
+            return True
+    return [r for r in reps if in_date_range(r)]
+
+def fetch_report_page(filters, query, cursor, limit):
+    # filters, search and paging run in the database; only the visible page comes back
+    # (keyset cursor for listings, row offset for ranked search and session-only reports)
+    if DB_ENABLED:
+        if query:
+            reps = db.search_reports(query, filters, limit=limit + 1, offset=cursor)
+            return reps[:limit], (cursor + limit if len(reps) > limit else None)
+        return db.query_reports(**filters, after=cursor, limit=limit)
+    reps = filter_session_reports(**filters, query=query)
+    return reps[cursor:cursor + limit], (cursor + limit if len(reps) > cursor + limit else None)
+
+def count_report_matches(filters, query):
+    if DB_ENABLED:
+        return db.count_reports(query or None, **filters)
+    return len(filter_session_reports(**filters, query=query))
+
+def export_file(filters, fmt):
+    # download_button's callable must return bytes (not a file object); rows still stream
+    # from the DB chunk by chunk into the encoded buffer rather than as one list of dicts
+    out = io.BytesIO()
+    if DB_ENABLED:
+        db.export_reports(out, fmt, **filters)
+    else:
+        export.write_rows(filter_session_reports(**filters), db.REPORT_LIST_COLUMNS, out, fmt)
+    return out.getvalue()
+
+def report_photo(rep, full: bool = False):
+    # session-only reports carry their bytes; DB reports load them on demand
+    if rep.get("photo_blob"):
+        return rep["photo_blob"]
+    if DB_ENABLED and rep.get("photo_name"):
+        try:
+            return db.get_report_photo(rep["id"]) if full else db.get_report_thumbnail(rep["id"])
+        except Exception:
+            return None
+    return None
+
 # --- Home Page
+page_timer = metrics.Timer(f"page.{page}")
 if page == "🏠 Home":
     st.header("🏠 Home Dashboard")
     left_col, right_col = st.columns([3,1])
@@ -116,8 +413,9 @@ if page == "🏠 Home":
             notif = {'title': 'Emergency Alert Sent', 'desc': 'Emergency services have been contacted. Stay safe.', 'time': 'Just now'}
             if DB_ENABLED:
                 try:
-                    db.add_notification(notif['title'], notif['desc'], notif['time'], unread=True)
-                    st.session_state.notifications = db.get_notifications() or st.session_state.notifications
+                    # the notification is written by a background job
+                    db.enqueue_job("notify", {**notif, "recipients": [USER_ID]})
+                    jobs.wake()
                 except Exception:
                     st.session_state.notifications.insert(0, {**notif, 'unread': True, 'timestamp': datetime.now()})
             else:
@@ -126,18 +424,7 @@ if page == "🏠 Home":
 
     with left_col:
         st.subheader("Live Map")
-        m = folium.Map(location=[USER_LAT, USER_LNG], zoom_start=14)
-        folium.Marker([USER_LAT, USER_LNG], popup="You are here", icon=folium.Icon(color="blue")).add_to(m)
-        for inc in st.session_state.incidents:
-            try:
-                folium.Marker(
-                    [float(inc['lat']), float(inc['lng'])],
-                    popup=f"<b>{inc['type'].title()}</b><br>{inc.get('desc','')}<br><small>{inc.get('time','')}</small>",
-                    icon=folium.Icon(color=incident_colors.get(inc['type'],'blue'))
-                ).add_to(m)
-            except Exception:
-                pass
-        st_folium(m, width=700, height=380)
+        render_incident_map("home_map", 14, 700, 380)
 
     # Report form toggle + form
     if st.button("📝 REPORT INCIDENT"):
@@ -185,7 +472,12 @@ if page == "🏠 Home":
                             photo_bytes = photo.read()
                             photo_name = photo.name
 
-                        # persist report
+                        # persist report; thumbnail, map incident and cache refresh run as background jobs
+                        report_jobs = [("refresh_cache", {"tables": ["reports"]})]
+                        if photo_bytes:
+                            report_jobs.append(("report_photo", {}))
+                        if lat_val is not None and lng_val is not None:
+                            report_jobs.append(("derive_incident", {}))
                         try:
                             report_id = db.add_report(
                                 fullname=fullname or None,
@@ -197,13 +489,10 @@ if page == "🏠 Home":
                                 date_str=str(date_input),
                                 photo_bytes=photo_bytes,
                                 photo_name=photo_name,
+                                jobs=report_jobs,
                             )
-                            # optionally also create an incident for map if coords provided
-                            if lat_val is not None and lng_val is not None:
-                                db.add_incident(lat_val, lng_val, category, description, "Just now", "0 miles")
-                            # reload session from DB
-                            st.session_state.reports = db.get_reports() or st.session_state.reports
-                            st.session_state.incidents = db.get_incidents() or st.session_state.incidents
+                            jobs.wake()
+                            sync_session("reports")  # delta read: just the new row
                             st.success("✅ Report submitted and saved.")
                         except Exception as e:
                             st.error(f"Failed to save report: {e}")
@@ -229,7 +518,7 @@ if page == "🏠 Home":
 
     # Recent reports preview
     st.subheader("📋 Recent Reports")
-    newest = sorted(st.session_state.reports, key=lambda r: r.get("timestamp", datetime.min), reverse=True)[:5]
+    newest = newest_reports(5)
     for rep in newest:
         ts = rep.get("timestamp")
         ts_str = ts.strftime("%Y-%m-%d %H:%M") if isinstance(ts, datetime) else str(ts)
@@ -244,16 +533,16 @@ elif page == "🗺️ Map":
         if st.button("🔄 Refresh"):
             st.experimental_rerun()
         radius_km = st.slider("Radius (km, filter incidents)", 1, 100, 25)
-        # simple radius filter can be applied; omitted for brevity
+        heat_hours = None
+        if DB_ENABLED and st.checkbox("🔥 Heatmap"):
+            heat_hours = HEATMAP_WINDOWS[st.selectbox("Heatmap window", list(HEATMAP_WINDOWS))]
     with right:
-        m = folium.Map(location=[USER_LAT, USER_LNG], zoom_start=13)
-        folium.Marker([USER_LAT, USER_LNG], popup="You are here", icon=folium.Icon(color="blue")).add_to(m)
-        for inc in st.session_state.incidents:
-            try:
-                folium.Marker([float(inc['lat']), float(inc['lng'])], popup=f"{inc['type'].title()}: {inc.get('desc','')}", icon=folium.Icon(color=incident_colors.get(inc['type'],'blue'))).add_to(m)
-            except Exception:
-                pass
-        st_folium(m, width=900, height=520)
+        shown, mode = render_incident_map("full_map", 13, 900, 520, radius_km=radius_km, heat_hours=heat_hours)
+    with left:
+        if mode == "points":
+            st.caption(f"{shown} incidents in view within {radius_km} km")
+        else:
+            st.caption(f"{shown} incidents in the clusters touching the {radius_km} km circle")
 
 
 # --- Reports Page (with filters and CSV export) ---
@@ -261,43 +550,76 @@ elif page == "📋 Reports":
     st.header("📋 All Reports")
     col1, col2 = st.columns([3,1])
     with col2:
-        cat_filter = st.selectbox("Filter by category", ["All"] + CATEGORIES)
-        start_date = st.date_input("Start date", value=(datetime.now() - timedelta(days=30)).date())
-        end_date = st.date_input("End date", value=datetime.now().date())
-        if st.button("Apply filters"):
-            pass
-        if st.button("Download CSV"):
-            df = pd.DataFrame(st.session_state.reports)
-            csv = df.to_csv(index=False)
-            st.download_button("Download CSV", csv, file_name="reports.csv", mime="text/csv")
-
-    reps = st.session_state.reports
-    # apply filters
-    if cat_filter != "All":
-        reps = [r for r in reps if (r.get("category") == cat_filter)]
-    def in_date_range(r):
-        try:
-            d = pd.to_datetime(r.get("date") or r.get("timestamp"))
-            return (d.date() >= pd.to_datetime(start_date).date()) and (d.date() <= pd.to_datetime(end_date).date())
-        except Exception:
-            return True
-    reps = [r for r in reps if in_date_range(r)]
-
-    if reps:
-        df = pd.DataFrame(reps)
-        if "timestamp" in df.columns:
-            try:
-                df["timestamp"] = pd.to_datetime(df["timestamp"]).dt.strftime("%Y-%m-%d %H:%M")
-            except Exception:
-                pass
-        st.dataframe(df, use_container_width=True)
-        # show images inline for first few
-        for r in reps[:5]:
-            if r.get("photo_blob"):
-                st.markdown(f"**Photo for report {r['id']} ({r.get('photo_name')})**")
-                st.image(r["photo_blob"], width=300)
-    else:
-        st.info("No reports to show for these filters.")
+        # the filters are applied together on submit instead of rerunning the query on every change
+        with st.form("report_filters"):
+            cat_filter = st.selectbox("Filter by category", ["All"] + CATEGORIES)
+            status_filter = st.selectbox("Filter by status", ["All"] + REPORT_STATUSES)
+            start_date = st.date_input("Start date", value=(datetime.now() - timedelta(days=30)).date())
+            end_date = st.date_input("End date", value=datetime.now().date())
+            query = st.text_input("🔎 Search descriptions", placeholder="e.g. flooded road").strip()
+            st.form_submit_button("Apply filters")
+        page_size = st.selectbox("Rows per page", REPORTS_PAGE_SIZES, index=REPORTS_PAGE_SIZES.index(REPORTS_PAGE_SIZE))
+        export_fmt = st.selectbox("Export format", export.available_formats())
+
+    filters = {
+        "category": None if cat_filter == "All" else cat_filter,
+        "status": None if status_filter == "All" else status_filter,
+        "start_date": start_date,
+        "end_date": end_date,
+    }
+    with col2:
+        file_name, mime = export.FORMATS[export_fmt]
+        # the file is only generated when the button is clicked
+        st.download_button("Download export", lambda: export_file(filters, export_fmt), file_name=file_name, mime=mime)
+
+    # keep the cursor that opened each visited page; the total is only recounted
+    # when the filters change or the reports sync brings in changes
+    offset_paging = bool(query) or not DB_ENABLED
+    if st.session_state.get("reports_filters") != (filters, query, page_size):
+        st.session_state.reports_filters = (filters, query, page_size)
+        st.session_state.reports_cursors = [0 if offset_paging else None]
+        st.session_state.pop("reports_total", None)
+    cursors = st.session_state.reports_cursors
+    version = (st.session_state.get("sync_cursors") or {}).get("reports", len(st.session_state.reports))
+    try:
+        reps, next_cursor = fetch_report_page(filters, query, cursors[-1], page_size)
+        if st.session_state.get("reports_total", (None, None))[0] != version or "reports_total" not in st.session_state:
+            st.session_state.reports_total = (version, count_report_matches(filters, query))
+    except Exception as e:
+        st.error(f"DB read error: {e}")
+        reps, next_cursor = filter_session_reports(**filters, query=query)[:page_size], None
+    total = st.session_state.get("reports_total", (None, None))[1]
+
+    with col1:
+        if reps:
+            first_row = (len(cursors) - 1) * page_size + 1
+            last_row = first_row + len(reps) - 1
+            st.caption(f"Reports {first_row:,}–{last_row:,} of {total:,}" if total is not None else f"Reports {first_row:,}–{last_row:,}")
+            # only list columns go to the browser (never photo bytes), one page at a time
+            grid = []
+            for r in reps:
+                row = {c: r.get(c) for c in db.REPORT_LIST_COLUMNS}
+                if isinstance(row.get("timestamp"), datetime):
+                    row["timestamp"] = row["timestamp"].strftime("%Y-%m-%d %H:%M")
+                grid.append(row)
+            st.dataframe(grid, use_container_width=True, hide_index=True)
+            prev_col, page_col, next_col = st.columns([1,2,1])
+            prev_col.button("⬅️ Back" if offset_paging else "⬅️ Newer", disabled=len(cursors) <= 1, on_click=lambda: cursors.pop())
+            pages = -(-total // page_size) if total else None
+            page_col.caption(f"Page {len(cursors)} of {pages}" if pages else f"Page {len(cursors)}")
+            next_col.button("More ➡️" if offset_paging else "Older ➡️", disabled=next_cursor is None, on_click=lambda: cursors.append(next_cursor))
+            # show thumbnails inline for first few; full-size images load on request
+            for r in reps[:5]:
+                img = report_photo(r)
+                if img:
+                    st.markdown(f"**Photo for report {r['id']} ({r.get('photo_name')})**")
+                    st.image(img, width=300)
+                    if st.toggle("Show full image", key=f"full_photo_{r['id']}"):
+                        full = report_photo(r, full=True)
+                        if full:
+                            st.image(full)
+        else:
+            st.info("No reports to show for these filters.")
 
 
 # --- Notifications Page ---
@@ -305,11 +627,10 @@ elif page == "🔔 Notifications":
     st.header("🔔 Notifications")
     if st.button("✅ Mark All Read"):
         if DB_ENABLED:
-            db.mark_all_notifications_read()
-            st.session_state.notifications = db.get_notifications() or st.session_state.notifications
-        else:
-            for n in st.session_state.notifications:
-                n["unread"] = False
+            db.mark_all_notifications_read(USER_ID)
+            st.session_state.unread_count = 0
+        for n in st.session_state.notifications:
+            n["unread"] = False
         st.experimental_rerun()
     for n in st.session_state.notifications:
         cls = "unread" if n.get("unread") else ""
@@ -320,44 +641,64 @@ elif page == "🔔 Notifications":
 elif page == "👤 Profile":
     st.header("👤 Profile")
     st.markdown("<div style='background:white;padding:1rem;border-radius:10px;'><h3>John Doe</h3><p>john.doe@example.com</p></div>", unsafe_allow_html=True)
-    st.metric("Reports submitted", len(st.session_state.reports))
-    pending = len([r for r in st.session_state.reports if r.get("status") == "pending"])
-    resolved = len([r for r in st.session_state.reports if r.get("status") == "resolved"])
-    st.metric("Pending", pending)
-    st.metric("Resolved", resolved)
+    summary = report_metrics()
+    st.metric("Reports submitted", summary["total"])
+    st.metric("Pending", summary["pending"])
+    st.metric("Resolved", summary["resolved"])
 
 
 # --- Admin Dashboard ---
 elif page == "📊 Admin Dashboard":
     st.header("📊 Admin Dashboard")
-    reports_today = len([r for r in st.session_state.reports if pd.to_datetime(r.get("timestamp", datetime.now())).date() == datetime.now().date()])
-    pending_count = len([r for r in st.session_state.reports if r.get("status") == "pending"])
-    resolved_count = len([r for r in st.session_state.reports if r.get("status") == "resolved"])
+    summary = report_metrics()
     c1, c2, c3, c4 = st.columns(4)
-    c1.metric("Reports Today", reports_today)
-    c2.metric("Response Rate", f"{(resolved_count/len(st.session_state.reports)*100) if st.session_state.reports else 0:.0f}%")
-    c3.metric("Pending", pending_count)
-    c4.metric("Resolved", resolved_count)
+    c1.metric("Reports Today", summary["today"])
+    c2.metric("Response Rate", f"{summary['response_rate']:.0f}%")
+    c3.metric("Pending", summary["pending"])
+    c4.metric("Resolved", summary["resolved"])
 
-    if st.session_state.incidents:
+    type_counts = incident_type_counts()
+    if type_counts:
         st.subheader("Incident Types")
-        df_inc = pd.DataFrame(st.session_state.incidents)
-        if "type" in df_inc.columns:
-            fig = px.pie(df_inc, names="type", title="Incidents by Type")
+        import plotly.express as px
+
+        fig = px.pie(names=list(type_counts), values=list(type_counts.values()), title="Incidents by Type")
+        st.plotly_chart(fig, use_container_width=True)
+
+    if DB_ENABLED:
+        import hotspots
+
+        st.subheader("Emerging Hotspots")
+        st.caption("Areas with far more incidents in the last 24 hours than their usual rate over the 14 days before.")
+        clusters = hotspots.emerging_clusters()
+        if clusters:
+            st.dataframe(
+                [{"Latitude": c["lat"], "Longitude": c["lng"], "Incidents (24h)": c["recent"], "Expected": c["expected"], "Score": c["score"]} for c in clusters[:20]],
+                use_container_width=True,
+                hide_index=True,
+            )
+        else:
+            st.info("No emerging hotspots right now.")
+        end = hotspots.current_hour()
+        daily = hotspots.counts_over_time(end - timedelta(days=30), end, daily=True)
+        if any(n for _, n in daily):
+            import plotly.express as px
+
+            fig = px.bar(x=[d for d, _ in daily], y=[n for _, n in daily], labels={"x": "Day", "y": "Incidents"}, title="Incidents per Day (last 30 days)")
             st.plotly_chart(fig, use_container_width=True)
 
     # Admin actions: resolve / delete
     st.subheader("Manage Reports")
-    for r in sorted(st.session_state.reports, key=lambda x: x.get("timestamp", datetime.min), reverse=True)[:50]:
+    for r in newest_reports(50):
         cols = st.columns([6,1,1])
         cols[0].write(f"#{r['id']} — {r.get('category')} — {r.get('description')[:80]}")
         if cols[1].button("Resolve", key=f"resolve_{r['id']}"):
             db.update_report_status(r['id'], "resolved")
-            st.session_state.reports = db.get_reports() or st.session_state.reports
+            sync_session("reports")
             st.experimental_rerun()
         if cols[2].button("Delete", key=f"delete_{r['id']}"):
             db.delete_report(r['id'])
-            st.session_state.reports = db.get_reports() or st.session_state.reports
+            sync_session("reports")
             st.experimental_rerun()
 
 
@@ -373,13 +714,40 @@ elif page == "🧪 Debug":
     st.subheader("Session Notifications")
     st.write(st.session_state.notifications)
     if DB_ENABLED:
-        try:
-            st.write("Reports (DB):", db.get_reports())
-            st.write("Incidents (DB):", db.get_incidents())
-            st.write("Notifications (DB):", db.get_notifications())
-        except Exception as e:
-            st.error(f"DB read error: {e}")
+        if st.button("Move inline photos to blob store"):
+            st.write("Photos moved:", db.move_inline_photos_to_store())
+        import retention
+
+        st.write("Rows past retention:", retention.pending())
+        if st.button("Archive and compact now"):
+            st.write("Retention:", retention.run())
+            sync_session("reports")
+        st.write("Background jobs:", jobs.queue_stats())
+        if st.checkbox("Dump full DB tables (runs full scans)"):
+            try:
+                st.write("Reports (DB):", db.get_reports())
+                st.write("Incidents (DB):", db.get_incidents())
+                st.write("Notifications (DB):", db.get_notifications())
+            except Exception as e:
+                st.error(f"DB read error: {e}")
+
+    st.subheader("⏱️ Performance")
+    st.caption("Previous rerun of this session, in call order")
+    profile = st.session_state.get("last_rerun_profile")
+    if profile:
+        st.dataframe(profile, use_container_width=True)
+    st.caption("All sessions and background jobs since the server started")
+    st.dataframe(metrics.snapshot(), use_container_width=True)
+    c1, c2 = st.columns(2)
+    c1.download_button("Prometheus metrics", metrics.prometheus_text, file_name="metrics.prom", mime="text/plain")
+    if c2.button("Reset metrics"):
+        metrics.reset()
+
+page_timer.stop()
 
 # --- Footer
 st.markdown("---")
 st.markdown("<div style='text-align:center;color:#666;padding:1rem;'>🛡️ CivicGuardian - Built with Streamlit</div>", unsafe_allow_html=True)
+
+rerun_timer.stop()
+st.session_state.last_rerun_profile = metrics.end_trace()
@@ -0,0 +1,100 @@
+# clustering.py
+"""
+Grid clustering for map rendering.
+
+Points are bucketed into square lat/lng cells whose size halves with each
+zoom level (CELLS_PER_TILE cells across one 256px web-map tile), so a
+viewport never holds more than a few hundred clusters whatever the number of
+incidents. db.get_incident_clusters() does the same bucketing in SQL;
+cluster_points() is the in-memory equivalent for session-only data.
+"""
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+CELLS_PER_TILE = 4
+TILE_PX = 256
+
+BBox = Tuple[float, float, float, float]  # (min_lat, min_lng, max_lat, max_lng)
+
+
+def cell_size_deg(zoom: int, cells_per_tile: int = CELLS_PER_TILE) -> float:
+    return 360.0 / ((2 ** max(0, int(zoom))) * cells_per_tile)
+
+
+def cell_of(lat: float, lng: float, cell: float) -> Tuple[int, int]:
+    # offsets keep both terms non-negative, so int() truncation == floor
+    return int((lat + 90.0) / cell), int((lng + 180.0) / cell)
+
+
+def snap_bbox(bbox: BBox, cell: float) -> BBox:
+    """Grow bbox outwards to whole grid cells (stable keys for caching)."""
+    min_lat, min_lng, max_lat, max_lng = bbox
+    return (
+        max(-90.0, math.floor((min_lat + 90.0) / cell) * cell - 90.0),
+        max(-180.0, math.floor((min_lng + 180.0) / cell) * cell - 180.0),
+        min(90.0, math.ceil((max_lat + 90.0) / cell) * cell - 90.0),
+        min(180.0, math.ceil((max_lng + 180.0) / cell) * cell - 180.0),
+    )
+
+
+def view_bbox(lat: float, lng: float, zoom: int, width_px: int, height_px: int) -> BBox:
+    """Approximate viewport for a web-mercator map centred on (lat, lng)."""
+    deg_per_px = 360.0 / (TILE_PX * 2 ** zoom)
+    half_w = width_px / 2 * deg_per_px
+    half_h = height_px / 2 * deg_per_px * max(math.cos(math.radians(lat)), 0.01)
+    return (max(-90.0, lat - half_h), max(-180.0, lng - half_w), min(90.0, lat + half_h), min(180.0, lng + half_w))
+
+
+def bbox_from_bounds(bounds: Optional[Dict]) -> Optional[BBox]:
+    """Convert the Leaflet ``bounds`` dict returned by st_folium into a bbox."""
+    try:
+        sw, ne = bounds["_southWest"], bounds["_northEast"]
+        return (max(-90.0, sw["lat"]), max(-180.0, sw["lng"]), min(90.0, ne["lat"]), min(180.0, ne["lng"]))
+    except (KeyError, TypeError):
+        return None
+
+
+def intersect_bbox(a: BBox, b: BBox) -> BBox:
+    return (max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3]))
+
+
+def in_bbox(lat: float, lng: float, bbox: BBox) -> bool:
+    return bbox[0] <= lat <= bbox[2] and bbox[1] <= lng <= bbox[3]
+
+
+def cluster_points(points: Iterable[Dict], zoom: int, bbox: Optional[BBox] = None) -> List[Dict]:
+    """Bucket dicts with ``lat``/``lng`` into grid clusters (count + centroid)."""
+    cell = cell_size_deg(zoom)
+    cells: Dict[Tuple[int, int], Dict] = {}
+    for p in points:
+        try:
+            lat, lng = float(p["lat"]), float(p["lng"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if bbox and not in_bbox(lat, lng, bbox):
+            continue
+        key = cell_of(lat, lng, cell)
+        c = cells.setdefault(key, {"cell": key, "count": 0, "lat": 0.0, "lng": 0.0})
+        c["count"] += 1
+        c["lat"] += lat
+        c["lng"] += lng
+    for c in cells.values():
+        c["lat"] /= c["count"]
+        c["lng"] /= c["count"]
+    return list(cells.values())
+
+
+def to_geojson(points: Iterable[Dict], properties: Tuple[str, ...] = ("id", "type", "desc", "time")) -> Dict:
+    """FeatureCollection of Point features for dicts with ``lat``/``lng``."""
+    features = []
+    for p in points:
+        if p.get("lat") is None or p.get("lng") is None:
+            continue
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [p["lng"], p["lat"]]},
+                "properties": {k: p.get(k) for k in properties},
+            }
+        )
+    return {"type": "FeatureCollection", "features": features}
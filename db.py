@@ -1,27 +1,61 @@
 # db.py
+import functools
+import json
 import os
-from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import BinaryIO, Callable, List, Dict, Iterable, Iterator, Optional, Sequence, Tuple
 
 from sqlalchemy import (
-    create_engine,
     Column,
     Integer,
     String,
     DateTime,
     Text,
     LargeBinary,
+    Float,
+    Date,
+    Boolean,
+    Index,
+    and_,
+    cast,
+    func,
+    insert as sa_insert,
+    literal_column,
+    or_,
+    select,
+    text,
 )
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import declarative_base, sessionmaker
 import streamlit as st
 
+import clustering
+import dbconfig
+import export
+import search
+import spatial
+from migrations import run_migrations
+from blobstore import BlobStore, LocalBlobStore, make_thumbnail
+
 # ensure data dir
 DATA_DIR = "data"
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
 DB_FILE = os.path.join(DATA_DIR, "reports.db")
-DATABASE_URL = f"sqlite:///{DB_FILE}"
+# connection/pool/PRAGMA settings come from the environment (see dbconfig.py)
+SETTINGS = dbconfig.load_settings(f"sqlite:///{DB_FILE}")
+DATABASE_URL = SETTINGS["url"]
+BLOB_DIR = os.path.join(DATA_DIR, "blobs")
 
 Base = declarative_base()
 
@@ -29,8 +63,8 @@ Base = declarative_base()
 class Incident(Base):
     __tablename__ = "incidents"
     id = Column(Integer, primary_key=True)
-    lat = Column(String, nullable=True)
-    lng = Column(String, nullable=True)
+    lat = Column(Float, nullable=True)
+    lng = Column(Float, nullable=True)
     type = Column(String, nullable=False)
     desc = Column(Text, nullable=True)
     time = Column(String, nullable=True)        # e.g., "Just now" or user-supplied date string
@@ -45,13 +79,26 @@ class Report(Base):
     contact = Column(String, nullable=True)
     category = Column(String, nullable=False)
     description = Column(Text, nullable=False)
-    latitude = Column(String, nullable=True)
-    longitude = Column(String, nullable=True)
-    date = Column(String, nullable=True)  # user-supplied date (string)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    date = Column(Date, nullable=True)  # user-supplied date
     photo_name = Column(String, nullable=True)
-    photo_blob = Column(LargeBinary, nullable=True)  # store image bytes
+    photo_blob = Column(LargeBinary, nullable=True)  # legacy inline image bytes
+    photo_sha256 = Column(String(64), nullable=True)  # blob store key of the original
+    thumb_sha256 = Column(String(64), nullable=True)  # blob store key of the thumbnail
     timestamp = Column(DateTime, default=datetime.utcnow)
     status = Column(String, default="pending")
+    client_id = Column(String(64), nullable=True)  # submitting client's id for the report (see submit_reports)
+    incident_id = Column(Integer, nullable=True)  # map incident showing this report (set by the derive_incident job)
+    duplicate_of = Column(Integer, nullable=True)  # earlier report of the same event, when dedup.py matched one
+    photo_dhash = Column(String(16), nullable=True)  # perceptual hash of the photo (dedup.photo_hash)
+
+    __table_args__ = (
+        Index("ix_reports_category_timestamp", "category", "timestamp"),
+        Index("ix_reports_status_timestamp", "status", "timestamp"),
+        Index("ux_reports_client_id", "client_id", unique=True),
+        Index("ix_reports_incident_id", "incident_id"),
+    )
 
 
 class Notification(Base):
@@ -60,19 +107,161 @@ class Notification(Base):
     title = Column(String, nullable=False)
     desc = Column(Text, nullable=True)
     time = Column(String, nullable=True)
-    unread = Column(String, default="true")
+    unread = Column(Boolean, default=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
 
+DEFAULT_USER = "local"  # recipient when nobody is signed in (the app has a single profile)
+
+
+class NotificationRecipient(Base):
+    """Per-user delivery and read state of a notification."""
+    __tablename__ = "notification_recipients"
+    user_id = Column(String, primary_key=True)
+    notification_id = Column(Integer, primary_key=True)
+    unread = Column(Boolean, nullable=False, default=True)
+    read_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_notification_recipients_user_unread", "user_id", "unread"),)
+
+
+class UnreadCount(Base):
+    """Unread notifications per user, kept current by the notification writers below."""
+    __tablename__ = "unread_counts"
+    user_id = Column(String, primary_key=True)
+    n = Column(Integer, nullable=False, default=0)
+
+
+class PushSubscription(Base):
+    """A browser Web Push subscription (endpoint + keys from pushManager.subscribe(); see push.py)."""
+    __tablename__ = "push_subscriptions"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String, nullable=False, index=True)
+    endpoint = Column(String, nullable=False, unique=True)
+    keys = Column(Text, nullable=True)  # JSON {"p256dh": ..., "auth": ...}
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ChangeLog(Base):
+    """One row per insert/update/delete; ``seq`` only ever grows (deletes are tombstones)."""
+    __tablename__ = "change_log"
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    table_name = Column(String, nullable=False)
+    row_id = Column(Integer, nullable=False)
+    op = Column(String, nullable=False)  # "upsert" or "delete"
+    changed_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_change_log_table_seq", "table_name", "seq"),
+        {"sqlite_autoincrement": True},  # never reuse a seq, even after pruning
+    )
+
+
+class SummaryCount(Base):
+    """Materialized row counts per (source table, dimension, key), kept current by the writers below."""
+    __tablename__ = "summary_counts"
+    source = Column(String, primary_key=True)  # "reports" or "incidents"
+    dimension = Column(String, primary_key=True)  # all, category, status, type, day, cell
+    key = Column(String, primary_key=True)
+    n = Column(Integer, nullable=False, default=0)
+
+
+class IncidentCellHour(Base):
+    """Incidents per fine grid cell and UTC hour, kept current by the incident writers (read by hotspots.py)."""
+    __tablename__ = "incident_cell_hours"
+    cy = Column(Integer, primary_key=True)  # clustering.cell_of() at HOTSPOT_CELL_DEG
+    cx = Column(Integer, primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    n = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (Index("ix_incident_cell_hours_hour", "hour"),)
+
+
+class Job(Base):
+    """A queued background task (see jobs.py); rows stay after completion for inspection."""
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=True)  # JSON
+    status = Column(String, nullable=False, default="queued")  # queued, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (Index("ix_jobs_status_run_after", "status", "run_after", "id"),)
+
+
 # Engine / Session
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, future=True)
+engine = dbconfig.create_db_engine(SETTINGS)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
 
+def _retry_on_lock(fn):
+    """Retry a write with jittered backoff when SQLite reports the database is locked."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        retries = SETTINGS["lock_retries"]
+        for attempt in range(retries + 1):
+            try:
+                return fn(*args, **kwargs)
+            except OperationalError as e:
+                if attempt == retries or not dbconfig.is_lock_error(e):
+                    raise
+                time.sleep(min(0.05 * 2 ** attempt, 1.0) + random.uniform(0, 0.05))
+    return wrapper
+
+# Photo storage (swap with set_blob_store(), e.g. for an S3BlobStore)
+blob_store: BlobStore = LocalBlobStore(BLOB_DIR)
+
+
+def set_blob_store(store: BlobStore) -> None:
+    global blob_store
+    blob_store = store
+
+
+_postgis = False  # set by init_db() when the PostGIS extension is available
+
+
+def _spatial_index_enabled() -> bool:
+    return engine.dialect.name == "sqlite"
+
+
+def _fts_enabled() -> bool:
+    """True when keyword search uses the FTS5 tables (SQLite; PostgreSQL uses tsvector)."""
+    return engine.dialect.name == "sqlite"
+
+
 def init_db() -> bool:
-    """Create tables if missing."""
+    """Create tables if missing and bring older databases up to date."""
     try:
         Base.metadata.create_all(bind=engine)
+        run_migrations(engine, Base.metadata)
+        if _spatial_index_enabled():
+            with engine.begin() as conn:
+                for table in spatial.INDEXED_TABLES:
+                    spatial.ensure_rtree_index(conn, table)
+        if _fts_enabled():
+            with engine.begin() as conn:
+                for table in search.FTS_TABLES:
+                    search.ensure_fts_index(conn, table)
+        if engine.dialect.name == "postgresql":
+            global _postgis
+            with engine.begin() as conn:
+                for table in search.FTS_TABLES:
+                    search.ensure_pg_fts_index(conn, table)
+                _postgis = spatial.enable_postgis(conn)
+                if _postgis:
+                    for table in spatial.INDEXED_TABLES:
+                        spatial.ensure_postgis_index(conn, table)
+        import stats  # imported here: stats builds on this module
+
+        stats.ensure_summaries()
+        if _cell_hours_missing():
+            import hotspots  # loads NumPy, so only when there is history to bin
+
+            hotspots.rebuild_cell_hours()
         return True
     except Exception as e:
         # expose a helpful message in Streamlit logs
@@ -83,9 +272,34 @@ def init_db() -> bool:
         return False
 
 
+def backup_database(out: BinaryIO) -> int:
+    """
+    Write a consistent copy of the SQLite database to the binary file ``out``
+    (online backup API, so writers are not blocked for the whole copy).
+    Returns the number of bytes written.
+    """
+    if engine.dialect.name != "sqlite":
+        raise RuntimeError("backup_database() only supports SQLite")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "backup.db")
+        raw = engine.raw_connection()
+        try:
+            target = sqlite3.connect(path)
+            try:
+                raw.driver_connection.backup(target)
+            finally:
+                target.close()
+        finally:
+            raw.close()
+        with open(path, "rb") as f:
+            shutil.copyfileobj(f, out)
+        return os.path.getsize(path)
+
+
 # -------------------------
 # Reports CRUD
 # -------------------------
+@_retry_on_lock
 def add_report(
     fullname: Optional[str],
     contact: Optional[str],
@@ -96,7 +310,20 @@ def add_report(
     date_str: Optional[str],
     photo_bytes: Optional[bytes],
     photo_name: Optional[str],
+    jobs: Sequence[Tuple[str, Dict]] = (),
 ) -> int:
+    """
+    Insert a report. ``jobs`` is a list of (kind, payload) background jobs to
+    queue in the same transaction, each payload completed with ``report_id``.
+    If one of them is "report_photo", only the original photo is stored here
+    and that job makes the thumbnail.
+    """
+    photo_sha256 = thumb_sha256 = None
+    if photo_bytes:
+        if any(kind == "report_photo" for kind, _ in jobs):
+            photo_sha256 = blob_store.put(photo_bytes)
+        else:
+            photo_sha256, thumb_sha256 = store_photo(photo_bytes)
     sess = SessionLocal()
     try:
         r = Report(
@@ -104,76 +331,517 @@ def add_report(
             contact=contact,
             category=category,
             description=description,
-            latitude=str(latitude) if latitude is not None else None,
-            longitude=str(longitude) if longitude is not None else None,
-            date=date_str,
-            photo_blob=photo_bytes,
+            latitude=latitude,
+            longitude=longitude,
+            date=_as_date(date_str),
             photo_name=photo_name,
+            photo_sha256=photo_sha256,
+            thumb_sha256=thumb_sha256,
         )
         sess.add(r)
+        sess.flush()
+        _log_change(sess, "reports", r.id)
+        _bump_summary(sess, "reports", _summary_row(r), 1)
+        for kind, payload in jobs:
+            enqueue_job(kind, {**payload, "report_id": r.id}, sess=sess)
         sess.commit()
-        sess.refresh(r)
         return r.id
     finally:
         sess.close()
 
 
-def get_reports() -> List[Dict]:
+@_retry_on_lock
+def submit_reports(rows: Sequence[Dict]) -> List[Dict]:
+    """
+    Insert a batch of client submissions (the PWA's offline queue) in one
+    transaction. Rows take the bulk-import fields plus an optional
+    ``client_id``; a client_id that is already stored is not inserted again,
+    so resending a batch whose response was lost is harmless. New reports
+    start "pending" and get the same background jobs as a form submit.
+    Returns one result per row, in order: {"client_id", "id", "created"},
+    or {"client_id", "error"} for a row that is invalid (missing fields, an
+    unknown category, an unparseable value). Invalid rows are skipped; the
+    valid rows of the batch are still stored.
+    """
+    records = []
+    for row in rows:
+        client_id = row.get("client_id")
+        client_id = str(client_id)[:64] if client_id else None
+        try:
+            record = _report_record(row)
+            if record["category"] not in REPORT_CATEGORIES:
+                raise ValueError(f"unknown category {record['category']!r}")
+        except (TypeError, ValueError) as e:
+            records.append({"client_id": client_id, "error": str(e)})
+            continue
+        record.update(status="pending", photo_name=None, client_id=client_id)
+        records.append(record)
+    client_ids = [r["client_id"] for r in records if r["client_id"] and "error" not in r]
     sess = SessionLocal()
     try:
-        rows = sess.query(Report).all()
-        out = []
-        for r in rows:
-            out.append(
-                {
-                    "id": r.id,
-                    "fullname": r.fullname,
-                    "contact": r.contact,
-                    "category": r.category,
-                    "description": r.description,
-                    "latitude": float(r.latitude) if r.latitude else None,
-                    "longitude": float(r.longitude) if r.longitude else None,
-                    "date": r.date,
-                    "photo_name": r.photo_name,
-                    "photo_blob": r.photo_blob,  # bytes (may be None)
-                    "timestamp": r.timestamp,
-                    "status": r.status,
-                }
-            )
-        return out
+        known = dict(sess.query(Report.client_id, Report.id).filter(Report.client_id.in_(client_ids))) if client_ids else {}
+        results = []
+        for record in records:
+            client_id = record["client_id"]
+            if "error" in record:
+                results.append(record)
+                continue
+            if client_id in known:
+                results.append({"client_id": client_id, "id": known[client_id], "created": False})
+                continue
+            r = Report(**record)
+            sess.add(r)
+            sess.flush()
+            _log_change(sess, "reports", r.id)
+            _bump_summary(sess, "reports", _summary_row(r), 1)
+            if r.latitude is not None and r.longitude is not None:
+                enqueue_job("derive_incident", {"report_id": r.id}, sess=sess)
+            if client_id:
+                known[client_id] = r.id
+            results.append({"client_id": client_id, "id": r.id, "created": True})
+        if any(r.get("created") for r in results):
+            enqueue_job("refresh_cache", {"tables": ["reports"]}, sess=sess)
+        sess.commit()
+        return results
+    finally:
+        sess.close()
+
+
+# Columns returned by the list/query helpers. ``photo_blob`` is deliberately
+# left out: image bytes are fetched one report at a time via get_report_photo().
+REPORT_LIST_COLUMNS = (
+    "id",
+    "fullname",
+    "contact",
+    "category",
+    "description",
+    "latitude",
+    "longitude",
+    "date",
+    "photo_name",
+    "timestamp",
+    "status",
+)
+# What anonymous clients (api.py) may see: no reporter name or contact details.
+REPORT_PUBLIC_COLUMNS = tuple(c for c in REPORT_LIST_COLUMNS if c not in ("fullname", "contact"))
+REPORT_CATEGORIES = ("theft", "vandalism", "accident", "suspicious", "hazard", "other")
+REPORT_STATUSES = ("pending", "resolved")
+
+
+def _report_row_to_dict(row, columns) -> Dict:
+    return dict(zip(columns, row))
+
+
+def _as_date(value) -> Optional[date]:
+    """Accept a date, datetime or ISO string (form input, CSV rows)."""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def get_reports(include_photo: bool = False) -> List[Dict]:
+    """Return every report. Photo bytes are only loaded when include_photo=True."""
+    columns = REPORT_LIST_COLUMNS + (("photo_blob",) if include_photo else ())
+    sess = SessionLocal()
+    try:
+        rows = sess.query(*[getattr(Report, c) for c in columns]).all()
+        return [_report_row_to_dict(r, columns) for r in rows]
     finally:
         sess.close()
 
 
+def _report_filters(
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+) -> list:
+    """Build SQL conditions shared by the report query helpers.
+
+    bbox is (min_lat, min_lng, max_lat, max_lng). Dates compare against the
+    user-supplied ``date`` column, falling back to the insert timestamp.
+    """
+    conds = []
+    if category:
+        conds.append(Report.category == category)
+    if status:
+        conds.append(Report.status == status)
+    # unparseable dates are ignored rather than compared against NULL
+    start_date, end_date = _as_date(start_date), _as_date(end_date)
+    if start_date or end_date:
+        day = func.coalesce(Report.date, func.date(Report.timestamp), type_=Date)
+        if start_date:
+            conds.append(day >= start_date)
+        if end_date:
+            conds.append(day <= end_date)
+    if bbox:
+        conds.append(_bbox_condition("reports", Report.id, Report.latitude, Report.longitude, bbox))
+    return conds
+
+
+def _bbox_condition(table: str, id_col, lat_col, lng_col, bbox: Tuple[float, float, float, float]):
+    """Restrict rows to a bbox, through the R*Tree index where available."""
+    if _spatial_index_enabled():
+        rt = spatial.rtree_table(table)
+        return id_col.in_(select(rt.c.id).where(spatial.bbox_condition(rt, bbox)))
+    if _postgis:
+        return spatial.postgis_bbox_condition(lat_col, lng_col, bbox)
+    min_lat, min_lng, max_lat, max_lng = bbox
+    return and_(lat_col >= min_lat, lat_col <= max_lat, lng_col >= min_lng, lng_col <= max_lng)
+
+
+def query_reports(
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    after: Optional[Tuple[datetime, int]] = None,
+    limit: int = 50,
+    columns: Optional[Sequence[str]] = None,
+) -> Tuple[List[Dict], Optional[Tuple[datetime, int]]]:
+    """
+    Keyset-paginated report listing, newest first.
+
+    Returns (rows, next_cursor). Pass next_cursor back as ``after`` to fetch the
+    following page; it is None once the last page has been reached. Only the
+    requested ``columns`` are selected (REPORT_LIST_COLUMNS by default, which
+    excludes photo bytes).
+    """
+    columns = tuple(columns or REPORT_LIST_COLUMNS)
+    stmt, select_cols = _query_reports_stmt(category, status, start_date, end_date, bbox, after, limit, columns)
+    with engine.connect() as conn:
+        rows = conn.execute(stmt).all()
+    return _report_page(rows, columns, select_cols, limit)
+
+
+# Statement builders shared with db_async: each public read below builds its
+# query here and only executes it, so both layers filter and order alike.
+def _query_reports_stmt(category, status, start_date, end_date, bbox, after, limit: int, columns: Tuple[str, ...]):
+    """
+    query_reports' statement and the columns it selects: ``columns`` plus
+    the (timestamp, id) keyset, one row past ``limit`` to tell whether
+    another page follows.
+    """
+    select_cols = columns + tuple(c for c in ("timestamp", "id") if c not in columns)
+    conds = _report_filters(category, status, start_date, end_date, bbox)
+    if after is not None:
+        ts, rid = after
+        conds.append(or_(Report.timestamp < ts, and_(Report.timestamp == ts, Report.id < rid)))
+    stmt = select(*[getattr(Report, c) for c in select_cols])
+    if conds:
+        stmt = stmt.where(*conds)
+    return stmt.order_by(Report.timestamp.desc(), Report.id.desc()).limit(limit + 1), select_cols
+
+
+def _report_page(rows, columns: Tuple[str, ...], select_cols: Tuple[str, ...], limit: int):
+    """(page of ``columns`` dicts, next cursor) from the rows of a _query_reports_stmt."""
+    out = [_report_row_to_dict(r, select_cols) for r in rows[:limit]]
+    next_cursor = (out[-1]["timestamp"], out[-1]["id"]) if len(rows) > limit and out else None
+    for r in out:
+        for extra in select_cols[len(columns):]:
+            r.pop(extra, None)
+    return out, next_cursor
+
+
+def iter_reports(
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    columns: Optional[Sequence[str]] = None,
+    chunk_size: int = 1000,
+) -> Iterator[Dict]:
+    """
+    Stream matching reports in id order without loading them all: rows come
+    from a server-side cursor (PostgreSQL) / incremental fetch (SQLite),
+    ``chunk_size`` at a time.
+    """
+    columns = tuple(columns or REPORT_LIST_COLUMNS)
+    stmt = select(*[getattr(Report, c) for c in columns]).order_by(Report.id)
+    conds = _report_filters(category, status, start_date, end_date, bbox)
+    if conds:
+        stmt = stmt.where(*conds)
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(stmt)
+        for row in result:
+            yield _report_row_to_dict(row, columns)
+
+
+def _text_search(model, column, query: str):
+    """
+    (join target, condition, score) for a keyword query against ``column``;
+    lower score ranks higher. None when the query has no words. SQLite uses
+    the FTS5 index, PostgreSQL the tsvector GIN index, anything else LIKE.
+    """
+    if _fts_enabled():
+        match = search.fts_match_query(query)
+        if match is None:
+            return None
+        hits = search.fts_matches(model.__tablename__, match)
+        return hits, model.id == hits.c.rowid, hits.c.score
+    if engine.dialect.name == "postgresql":
+        tsq_text = search.pg_tsquery_text(query)
+        if tsq_text is None:
+            return None
+        tsq = func.to_tsquery(literal_column("'simple'"), tsq_text)
+        vec = search.pg_tsvector(column)
+        return None, vec.op("@@")(tsq), -func.ts_rank(vec, tsq)
+    words = search.query_words(query)
+    if not words:
+        return None
+    return None, and_(*[column.ilike(f"%{w}%") for w in words]), literal_column("0")
+
+
+def search_reports(
+    query: str,
+    filters: Optional[Dict] = None,
+    limit: int = 50,
+    offset: int = 0,
+    columns: Optional[Sequence[str]] = None,
+) -> List[Dict]:
+    """
+    Reports whose description matches every word of ``query`` (the last word
+    as a prefix), best match first. ``filters`` takes the query_reports
+    filter arguments (category, status, start_date, end_date, bbox). Each row
+    carries a ``score`` (lower is better).
+    """
+    columns = tuple(columns or REPORT_LIST_COLUMNS)
+    stmt = _search_reports_stmt(query, filters, limit, offset, columns)
+    if stmt is None:
+        return []
+    with engine.connect() as conn:
+        return [{**_report_row_to_dict(row, columns), "score": row.score} for row in conn.execute(stmt)]
+
+
+def _search_reports_stmt(query: str, filters: Optional[Dict], limit: int, offset: int, columns: Tuple[str, ...]):
+    """search_reports' statement (``columns`` plus ``score``); None when the query has no words."""
+    found = _text_search(Report, Report.description, query)
+    if found is None:
+        return None
+    target, cond, score = found
+    stmt = select(*[getattr(Report, c) for c in columns], score.label("score"))
+    stmt = stmt.join(target, cond) if target is not None else stmt.where(cond)
+    conds = _report_filters(**(filters or {}))
+    if conds:
+        stmt = stmt.where(*conds)
+    return stmt.order_by(score, Report.timestamp.desc(), Report.id.desc()).limit(limit).offset(offset)
+
+
+def count_reports(query: Optional[str] = None, **filters) -> int:
+    """
+    Number of reports matching ``filters`` (see query_reports) and, when
+    given, the keyword ``query`` (see search_reports): the total behind a
+    paged listing.
+    """
+    stmt = _count_reports_stmt(query, filters)
+    if stmt is None:
+        return 0
+    with engine.connect() as conn:
+        return conn.execute(stmt).scalar_one()
+
+
+def _count_reports_stmt(query: Optional[str], filters: Dict):
+    """count_reports' statement; None when ``query`` is given but has no words (nothing matches)."""
+    stmt = select(func.count()).select_from(Report)
+    if query:
+        found = _text_search(Report, Report.description, query)
+        if found is None:
+            return None
+        target, cond, _ = found
+        stmt = stmt.join(target, cond) if target is not None else stmt.where(cond)
+    conds = _report_filters(**filters)
+    if conds:
+        stmt = stmt.where(*conds)
+    return stmt
+
+
+def export_reports(out: BinaryIO, fmt: str = "csv", chunk_size: int = 1000, **filters) -> int:
+    """
+    Write the reports matching ``filters`` (see query_reports) to the binary
+    file ``out`` as csv, csv.gz or parquet, streaming ``chunk_size`` rows at a
+    time. Photo bytes are never exported. Returns the number of rows written.
+    """
+    rows = iter_reports(chunk_size=chunk_size, **filters)
+    return export.write_rows(rows, REPORT_LIST_COLUMNS, out, fmt)
+
+
+def store_photo(photo_bytes: bytes) -> Tuple[str, Optional[str]]:
+    """Put a photo and its thumbnail in the blob store; returns both keys."""
+    photo_sha256 = blob_store.put(photo_bytes)
+    thumb = make_thumbnail(photo_bytes)
+    thumb_sha256 = blob_store.put(thumb) if thumb else None
+    return photo_sha256, thumb_sha256
+
+
+def get_report_photo(report_id: int) -> Optional[bytes]:
+    """Load the full-size photo for a single report (None if it has no photo)."""
+    sess = SessionLocal()
+    try:
+        row = sess.query(Report.photo_sha256, Report.photo_blob).filter(Report.id == report_id).first()
+    finally:
+        sess.close()
+    if not row:
+        return None
+    if row.photo_sha256:
+        return blob_store.get(row.photo_sha256)
+    return row.photo_blob
+
+
+@_retry_on_lock
+def make_report_thumbnail(report_id: int) -> Optional[str]:
+    """Build and store the thumbnail of a report's photo; returns its key (None without a photo)."""
+    sess = SessionLocal()
+    try:
+        r = sess.get(Report, report_id)
+        if r is None or not (r.photo_sha256 or r.photo_blob):
+            return None
+        original = blob_store.get(r.photo_sha256) if r.photo_sha256 else r.photo_blob
+        thumb = make_thumbnail(original)
+        if thumb is None:
+            return None
+        r.thumb_sha256 = blob_store.put(thumb)
+        _log_change(sess, "reports", r.id)
+        sess.commit()
+        return r.thumb_sha256
+    finally:
+        sess.close()
+
+
+def get_report_thumbnail(report_id: int) -> Optional[bytes]:
+    """Load the downscaled photo for a report, falling back to the original."""
+    sess = SessionLocal()
+    try:
+        key = sess.query(Report.thumb_sha256).filter(Report.id == report_id).scalar()
+    finally:
+        sess.close()
+    if key:
+        thumb = blob_store.get(key)
+        if thumb:
+            return thumb
+    return get_report_photo(report_id)
+
+
+@_retry_on_lock
+def move_inline_photos_to_store(batch_size: int = 100) -> int:
+    """Move legacy ``photo_blob`` bytes into the blob store. Returns rows moved."""
+    moved = 0
+    while True:
+        sess = SessionLocal()
+        try:
+            rows = (
+                sess.query(Report)
+                .filter(Report.photo_blob.isnot(None))
+                .order_by(Report.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                return moved
+            for r in rows:
+                r.photo_sha256, r.thumb_sha256 = store_photo(r.photo_blob)
+                r.photo_blob = None
+            sess.commit()
+            moved += len(rows)
+        finally:
+            sess.close()
+
+
+@_retry_on_lock
 def update_report_status(report_id: int, status: str) -> bool:
     sess = SessionLocal()
     try:
         r = sess.query(Report).filter(Report.id == report_id).first()
         if not r:
             return False
+        if r.status != status:
+            _upsert_count(sess, "reports", "status", r.status, -1)
+            _upsert_count(sess, "reports", "status", status, 1)
         r.status = status
+        _log_change(sess, "reports", report_id)
         sess.commit()
         return True
     finally:
         sess.close()
 
 
+@_retry_on_lock
 def delete_report(report_id: int) -> bool:
     sess = SessionLocal()
     try:
         r = sess.query(Report).filter(Report.id == report_id).first()
         if not r:
             return False
+        _bump_summary(sess, "reports", _summary_row(r), -1)
         sess.delete(r)
+        _log_change(sess, "reports", report_id, deleted=True)
         sess.commit()
         return True
     finally:
         sess.close()
 
 
+@_retry_on_lock
+def remove_archived_rows(table: str, ids: Sequence[int]) -> int:
+    """
+    Delete reports/incidents/notifications that retention.py has copied to
+    the archive. Caches and feeds see a delete; the summary and hotspot
+    counters are all-time totals and keep counting the rows. A notification's
+    deliveries go with it, and unread ones leave their users' unread counts.
+    """
+    model = {"reports": Report, "incidents": Incident, "notifications": Notification}[table]
+    sess = SessionLocal()
+    try:
+        if table == "notifications":
+            delivered = sess.query(NotificationRecipient).filter(NotificationRecipient.notification_id.in_(ids))
+            unread = Counter(r.user_id for r in delivered.filter(NotificationRecipient.unread.is_(True)))
+            _bump_unread(sess, {u: -n for u, n in unread.items()})
+            delivered.delete(synchronize_session=False)
+        removed = sess.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+        for row_id in ids:
+            _log_change(sess, table, row_id, deleted=True)
+        sess.commit()
+        return removed
+    finally:
+        sess.close()
+
+
+def get_archived(
+    table: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: Optional[int] = 1000,
+    **equals,
+) -> List[Dict]:
+    """
+    Rows of reports/incidents/notifications that retention.py archived, with
+    start <= timestamp < end and columns equal to ``equals`` (e.g.
+    category="theft"), oldest first, in the same shape as the live getters.
+    """
+    import retention  # imported here: retention builds on this module
+
+    to_dict = {
+        "reports": lambda r: {c: getattr(r, c) for c in REPORT_LIST_COLUMNS},
+        "incidents": _incident_to_dict,
+        "notifications": _notification_to_dict,
+    }[table]
+    rows = retention.archived_rows(table, _as_datetime(start), _as_datetime(end), limit, **equals)
+    return [to_dict(r) for r in rows]
+
+
 # -------------------------
 # Incidents CRUD (derived or manual)
 # -------------------------
+@_retry_on_lock
 def add_incident(
     lat: Optional[float],
     lng: Optional[float],
@@ -184,22 +852,160 @@ def add_incident(
 ) -> int:
     sess = SessionLocal()
     try:
-        i = Incident(
-            lat=str(lat) if lat is not None else None,
-            lng=str(lng) if lng is not None else None,
-            type=type_,
-            desc=desc,
-            time=time_str,
-            distance=distance,
-        )
-        sess.add(i)
+        i = _insert_incident(sess, lat, lng, type_, desc, time_str, distance)
         sess.commit()
-        sess.refresh(i)
         return i.id
     finally:
         sess.close()
 
 
+def _insert_incident(sess, lat, lng, type_, desc, time_str, distance) -> Incident:
+    i = Incident(
+        lat=lat,
+        lng=lng,
+        type=type_,
+        desc=desc,
+        time=time_str,
+        distance=distance,
+    )
+    sess.add(i)
+    sess.flush()
+    _log_change(sess, "incidents", i.id)
+    _bump_summary(sess, "incidents", _summary_row(i), 1)
+    _bump_cell_hours(sess, [hotspot_key(i.lat, i.lng, i.timestamp)])
+    return i
+
+
+PLACE_INCIDENT_LOCK = 0x63676464  # pg_advisory_xact_lock key ("cgdd")
+
+
+def _begin_serialized(sess, key: int) -> None:
+    """
+    Open ``sess``'s transaction holding a lock that every other caller with
+    the same ``key`` waits for: SQLite's write lock (BEGIN IMMEDIATE), a
+    transaction-scoped advisory lock on PostgreSQL. Must be the session's
+    first statement.
+    """
+    if engine.dialect.name == "sqlite":
+        sess.execute(text("BEGIN IMMEDIATE"))
+    elif engine.dialect.name == "postgresql":
+        sess.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": key})
+
+
+@_retry_on_lock
+def place_report_incident(
+    report_id: int,
+    time_str: str,
+    distance: Optional[str] = None,
+    duplicate_of: Optional[int] = None,
+    photo_dhash: Optional[str] = None,
+    find_duplicate: Optional[Callable[[object], Optional[Dict]]] = None,
+) -> Optional[int]:
+    """
+    Put a report with coordinates on the incident map in one transaction:
+    linked to the incident of report ``duplicate_of`` when given, otherwise
+    as a new incident. A report that already has an incident keeps it, so
+    a retried job does not add a second one. Returns the incident id (None
+    if the report is gone or has no coordinates).
+
+    ``find_duplicate(sess)`` (see dedup.find_duplicate) picks the duplicated
+    report instead of ``duplicate_of``. It runs inside the transaction,
+    after the lock that serializes placements is taken, so two reports of
+    one burst handled at the same time cannot both miss each other and
+    open two incidents.
+    """
+    sess = SessionLocal()
+    try:
+        _begin_serialized(sess, PLACE_INCIDENT_LOCK)
+        r = sess.get(Report, report_id)
+        if r is None or r.latitude is None or r.longitude is None:
+            return None
+        if r.incident_id is None:
+            if find_duplicate is not None:
+                match = find_duplicate(sess)
+                duplicate_of = match["id"] if match else None
+            original = sess.get(Report, duplicate_of) if duplicate_of is not None else None
+            if original is not None and original.incident_id is not None:
+                r.incident_id, r.duplicate_of = original.incident_id, original.id
+            else:
+                r.incident_id = _insert_incident(sess, r.latitude, r.longitude, r.category, r.description, time_str, distance).id
+        r.photo_dhash = photo_dhash or r.photo_dhash
+        _log_change(sess, "reports", r.id)
+        sess.commit()
+        return r.incident_id
+    finally:
+        sess.close()
+
+
+def duplicate_candidates(
+    category: str,
+    lat: float,
+    lng: float,
+    timestamp: datetime,
+    radius_km: float,
+    window: timedelta,
+    exclude_id: Optional[int] = None,
+    limit: int = 50,
+    sess=None,
+) -> List[Dict]:
+    """
+    Reports already on the map with the same category, within radius_km of
+    (lat, lng) and ``window`` either side of ``timestamp`` (jobs do not run
+    in report order), newest first; each dict has id, incident_id,
+    description, photo_dhash, timestamp and distance_km. The bbox goes
+    through the spatial index and the rest through (category, timestamp),
+    so the cost depends on the neighbourhood only. With ``sess`` the query
+    runs in the caller's transaction (place_report_incident).
+    """
+    bbox = spatial.bbox_around(lat, lng, radius_km)
+    own_session = sess is None
+    if own_session:
+        sess = SessionLocal()
+    try:
+        q = sess.query(
+            Report.id, Report.incident_id, Report.description, Report.photo_dhash,
+            Report.timestamp, Report.latitude, Report.longitude,
+        ).filter(
+            Report.category == category,
+            Report.timestamp >= timestamp - window,
+            Report.timestamp <= timestamp + window,
+            Report.incident_id.isnot(None),
+            _bbox_condition("reports", Report.id, Report.latitude, Report.longitude, bbox),
+        )
+        if exclude_id is not None:
+            q = q.filter(Report.id != exclude_id)
+        rows = q.order_by(Report.timestamp.desc()).limit(limit).all()
+    finally:
+        if own_session:
+            sess.close()
+    out = []
+    for row in rows:
+        d = spatial.haversine_km(lat, lng, row.latitude, row.longitude)
+        if d <= radius_km:
+            out.append({
+                "id": row.id,
+                "incident_id": row.incident_id,
+                "description": row.description,
+                "photo_dhash": row.photo_dhash,
+                "timestamp": row.timestamp,
+                "distance_km": d,
+            })
+    return out
+
+
+def _incident_to_dict(r: Incident) -> Dict:
+    return {
+        "id": r.id,
+        "lat": r.lat,
+        "lng": r.lng,
+        "type": r.type,
+        "desc": r.desc,
+        "time": r.time,
+        "distance": r.distance,
+        "timestamp": r.timestamp,
+    }
+
+
 def get_incidents() -> List[Dict]:
     """
     Returns incidents in the same shape you provided earlier:
@@ -208,61 +1014,797 @@ def get_incidents() -> List[Dict]:
     sess = SessionLocal()
     try:
         rows = sess.query(Incident).all()
-        return [
-            {
-                "id": r.id,
-                "lat": float(r.lat) if r.lat else None,
-                "lng": float(r.lng) if r.lng else None,
-                "type": r.type,
-                "desc": r.desc,
-                "time": r.time,
-                "distance": r.distance,
-                "timestamp": r.timestamp,
-            }
-            for r in rows
-        ]
+        return [_incident_to_dict(r) for r in rows]
+    finally:
+        sess.close()
+
+
+def search_incidents(query: str, limit: int = 50, offset: int = 0) -> List[Dict]:
+    """Incidents whose description matches ``query``, best match first (see search_reports)."""
+    stmt = _search_incidents_stmt(query, limit, offset)
+    if stmt is None:
+        return []
+    sess = SessionLocal()
+    try:
+        return [{**_incident_to_dict(r), "score": s} for r, s in sess.execute(stmt)]
     finally:
         sess.close()
 
 
+def _search_incidents_stmt(query: str, limit: int, offset: int):
+    """search_incidents' statement, selecting (Incident, score); None when the query has no words."""
+    found = _text_search(Incident, Incident.desc, query)
+    if found is None:
+        return None
+    target, cond, score = found
+    stmt = select(Incident, score)
+    stmt = stmt.join(target, cond) if target is not None else stmt.where(cond)
+    return stmt.order_by(score, Incident.timestamp.desc(), Incident.id.desc()).limit(limit).offset(offset)
+
+
+def get_incidents_within(lat: float, lng: float, radius_km: float, limit: int = 500) -> List[Dict]:
+    """
+    Incidents within radius_km of (lat, lng), nearest first, at most ``limit``.
+    Each dict also carries ``distance_km``.
+    """
+    sess = SessionLocal()
+    try:
+        rows = sess.execute(_incidents_within_stmt(lat, lng, radius_km, limit)).all()
+    finally:
+        sess.close()
+    return _incidents_within_rows(rows, lat, lng, radius_km, limit)
+
+
+def _incidents_within_stmt(lat: float, lng: float, radius_km: float, limit: int):
+    """
+    get_incidents_within's statement. With PostGIS it selects (Incident,
+    metres) inside the circle, nearest first; otherwise (Incident,) inside
+    the circle's bbox, left for _incidents_within_rows to cut to the circle.
+    """
+    if _postgis:
+        geog = spatial.geography_expr(Incident.lat, Incident.lng)
+        center = spatial.postgis_point(lat, lng)
+        dist = func.ST_Distance(geog, center)
+        return select(Incident, dist).where(func.ST_DWithin(geog, center, radius_km * 1000.0)).order_by(dist).limit(limit)
+    bbox = spatial.bbox_around(lat, lng, radius_km)
+    return select(Incident).where(_bbox_condition("incidents", Incident.id, Incident.lat, Incident.lng, bbox))
+
+
+def _incidents_within_rows(rows, lat: float, lng: float, radius_km: float, limit: int) -> List[Dict]:
+    if _postgis:
+        return [{**_incident_to_dict(r), "distance_km": d / 1000.0} for r, d in rows]
+    out = []
+    for (r,) in rows:
+        d = _incident_to_dict(r)
+        if d["lat"] is None or d["lng"] is None:
+            continue
+        d["distance_km"] = spatial.haversine_km(lat, lng, d["lat"], d["lng"])
+        if d["distance_km"] <= radius_km:
+            out.append(d)
+    out.sort(key=lambda d: d["distance_km"])
+    return out[:limit]
+
+
+def get_incidents_in_bbox(bbox: Tuple[float, float, float, float], limit: int = 500) -> List[Dict]:
+    """Newest incidents inside (min_lat, min_lng, max_lat, max_lng), at most ``limit``."""
+    sess = SessionLocal()
+    try:
+        return [_incident_to_dict(r) for r in sess.scalars(_incidents_in_bbox_stmt(bbox, limit))]
+    finally:
+        sess.close()
+
+
+def _incidents_in_bbox_stmt(bbox: Tuple[float, float, float, float], limit: int):
+    return (
+        select(Incident)
+        .where(_bbox_condition("incidents", Incident.id, Incident.lat, Incident.lng, bbox))
+        .order_by(Incident.timestamp.desc(), Incident.id.desc())
+        .limit(limit)
+    )
+
+
+def get_incidents_geojson(bbox: Tuple[float, float, float, float], limit: int = 500) -> Dict:
+    """GeoJSON FeatureCollection of the incidents in a map viewport."""
+    return clustering.to_geojson(get_incidents_in_bbox(bbox, limit))
+
+
+def grid_index(col, offset: float, cell: float):
+    """SQL floor((col + offset) / cell) as an integer grid coordinate."""
+    scaled = (col + offset) / cell
+    if engine.dialect.name == "sqlite":
+        # operand is non-negative, so truncating cast == floor
+        return cast(scaled, Integer)
+    return cast(func.floor(scaled), Integer)
+
+
+def get_incident_clusters(bbox: Tuple[float, float, float, float], zoom: int) -> List[Dict]:
+    """
+    Grid clusters of the incidents inside bbox for a map zoom level, computed
+    with one GROUP BY. Each dict has cell, count and centroid lat/lng.
+    """
+    with engine.connect() as conn:
+        return _cluster_dicts(conn.execute(_incident_clusters_stmt(bbox, zoom)))
+
+
+def _incident_clusters_stmt(bbox: Tuple[float, float, float, float], zoom: int):
+    cell = clustering.cell_size_deg(zoom)
+    cy = grid_index(Incident.lat, 90.0, cell)
+    cx = grid_index(Incident.lng, 180.0, cell)
+    return (
+        select(cy, cx, func.count(Incident.id), func.avg(Incident.lat), func.avg(Incident.lng))
+        .where(_bbox_condition("incidents", Incident.id, Incident.lat, Incident.lng, bbox))
+        .group_by(cy, cx)
+    )
+
+
+def _cluster_dicts(rows) -> List[Dict]:
+    return [{"cell": (r[0], r[1]), "count": r[2], "lat": r[3], "lng": r[4]} for r in rows]
+
+
 # -------------------------
 # Notifications
 # -------------------------
-def add_notification(title: str, desc: str, time_str: str, unread: bool = True) -> int:
+@_retry_on_lock
+def add_notification(
+    title: str,
+    desc: str,
+    time_str: str,
+    unread: bool = True,
+    recipients: Optional[Sequence[str]] = None,
+    jobs: Sequence[Tuple[str, Dict]] = (),
+) -> int:
+    """
+    Insert a notification addressed to ``recipients`` (user ids; DEFAULT_USER
+    if omitted): one delivery row per user and their unread counters bumped,
+    all in one transaction. Delivery to open sessions and browsers is done by
+    notifications.py, which calls this; ``jobs`` are (kind, payload) background
+    jobs queued in the same transaction, each payload completed with
+    ``notification_id``.
+    """
+    recipients = list(dict.fromkeys(recipients or (DEFAULT_USER,)))
     sess = SessionLocal()
     try:
-        n = Notification(title=title, desc=desc, time=time_str, unread="true" if unread else "false")
+        n = Notification(title=title, desc=desc, time=time_str, unread=unread)
         sess.add(n)
+        sess.flush()
+        sess.execute(
+            sa_insert(NotificationRecipient),
+            [{"user_id": u, "notification_id": n.id, "unread": unread} for u in recipients],
+        )
+        if unread:
+            _bump_unread(sess, {u: 1 for u in recipients})
+        _log_change(sess, "notifications", n.id)
+        for kind, payload in jobs:
+            enqueue_job(kind, {**payload, "notification_id": n.id}, sess=sess)
         sess.commit()
-        sess.refresh(n)
         return n.id
     finally:
         sess.close()
 
 
+def _notification_to_dict(r: Notification) -> Dict:
+    return {
+        "id": r.id,
+        "title": r.title,
+        "desc": r.desc,
+        "time": r.time,
+        "unread": bool(r.unread),
+        "timestamp": r.timestamp,
+    }
+
+
 def get_notifications() -> List[Dict]:
     sess = SessionLocal()
     try:
         rows = sess.query(Notification).all()
-        return [
-            {
-                "id": r.id,
-                "title": r.title,
-                "desc": r.desc,
-                "time": r.time,
-                "unread": True if r.unread == "true" else False,
-                "timestamp": r.timestamp,
-            }
-            for r in rows
-        ]
+        return [_notification_to_dict(r) for r in rows]
+    finally:
+        sess.close()
+
+
+def get_user_notifications(user_id: str, limit: int = 50) -> List[Dict]:
+    """A user's newest notifications, ``unread`` reflecting that user's read state."""
+    sess = SessionLocal()
+    try:
+        rows = sess.execute(_user_notifications_stmt(user_id, limit))
+        return [{**_notification_to_dict(n), "unread": bool(unread)} for n, unread in rows]
+    finally:
+        sess.close()
+
+
+def _user_notifications_stmt(user_id: str, limit: int):
+    return (
+        select(Notification, NotificationRecipient.unread)
+        .join(NotificationRecipient, NotificationRecipient.notification_id == Notification.id)
+        .where(NotificationRecipient.user_id == user_id)
+        .order_by(Notification.id.desc())
+        .limit(limit)
+    )
+
+
+def get_unread_count(user_id: str) -> int:
+    """Unread notifications of a user (a primary-key lookup)."""
+    sess = SessionLocal()
+    try:
+        row = sess.get(UnreadCount, user_id)
+        return max(row.n, 0) if row else 0
+    finally:
+        sess.close()
+
+
+def _bump_unread(sess, deltas: Dict[str, int]) -> None:
+    _add_to_counters(sess, UnreadCount, ["user_id"], [{"user_id": u, "n": d} for u, d in deltas.items() if d])
+
+
+@_retry_on_lock
+def mark_notification_read(user_id: str, notification_id: int) -> bool:
+    """Mark one notification read for a user; False if it already was (or isn't theirs)."""
+    sess = SessionLocal()
+    try:
+        updated = (
+            sess.query(NotificationRecipient)
+            .filter_by(user_id=user_id, notification_id=notification_id, unread=True)
+            .update({"unread": False, "read_at": datetime.utcnow()})
+        )
+        if updated:
+            _bump_unread(sess, {user_id: -1})
+        sess.commit()
+        return bool(updated)
+    finally:
+        sess.close()
+
+
+@_retry_on_lock
+def mark_all_notifications_read(user_id: Optional[str] = None) -> None:
+    """Mark a user's notifications read; without ``user_id``, everyone's."""
+    now = datetime.utcnow()
+    sess = SessionLocal()
+    try:
+        delivered = sess.query(NotificationRecipient).filter(NotificationRecipient.unread.is_(True))
+        counters = sess.query(UnreadCount)
+        if user_id is not None:
+            delivered = delivered.filter(NotificationRecipient.user_id == user_id)
+            counters = counters.filter(UnreadCount.user_id == user_id)
+        else:
+            unread = Notification.unread.is_(True)
+            ids = [i for (i,) in sess.query(Notification.id).filter(unread)]
+            sess.query(Notification).filter(Notification.id.in_(ids)).update({"unread": False})
+            for nid in ids:
+                _log_change(sess, "notifications", nid)
+        delivered.update({"unread": False, "read_at": now}, synchronize_session=False)
+        counters.update({"n": 0}, synchronize_session=False)
+        sess.commit()
+    finally:
+        sess.close()
+
+
+@_retry_on_lock
+def add_push_subscription(user_id: str, subscription: Dict) -> None:
+    """Store (or re-assign) a browser push subscription: {"endpoint": ..., "keys": {...}}."""
+    sess = SessionLocal()
+    try:
+        sess.query(PushSubscription).filter_by(endpoint=subscription["endpoint"]).delete()
+        sess.add(
+            PushSubscription(
+                user_id=user_id,
+                endpoint=subscription["endpoint"],
+                keys=json.dumps(subscription.get("keys") or {}),
+            )
+        )
+        sess.commit()
+    finally:
+        sess.close()
+
+
+def get_push_subscriptions(user_ids: Sequence[str]) -> List[Dict]:
+    sess = SessionLocal()
+    try:
+        rows = sess.query(PushSubscription).filter(PushSubscription.user_id.in_(list(user_ids))).all()
+        return [{"user_id": r.user_id, "endpoint": r.endpoint, "keys": json.loads(r.keys or "{}")} for r in rows]
+    finally:
+        sess.close()
+
+
+@_retry_on_lock
+def remove_push_subscription(endpoint: str) -> None:
+    sess = SessionLocal()
+    try:
+        sess.query(PushSubscription).filter_by(endpoint=endpoint).delete()
+        sess.commit()
+    finally:
+        sess.close()
+
+
+# -------------------------
+# Materialized summary counts (read by stats.py)
+# -------------------------
+SUMMARY_CELL_DEG = 0.01  # ~1 km grid for the per-cell counts
+SUMMARY_DIMENSIONS = {
+    "reports": ("all", "category", "status", "day", "cell"),
+    "incidents": ("all", "type", "day", "cell"),
+}
+
+
+def _summary_row(obj) -> Dict:
+    if isinstance(obj, Report):
+        return {"category": obj.category, "status": obj.status, "timestamp": obj.timestamp, "lat": obj.latitude, "lng": obj.longitude}
+    return {"type": obj.type, "timestamp": obj.timestamp, "lat": obj.lat, "lng": obj.lng}
+
+
+def cell_key(lat: float, lng: float) -> str:
+    cy, cx = clustering.cell_of(lat, lng, SUMMARY_CELL_DEG)
+    return f"{cy}:{cx}"
+
+
+def summary_keys(source: str, row: Dict) -> List[Tuple[str, str]]:
+    """(dimension, key) pairs a row counts towards."""
+    keys = [("all", "*")]
+    for dim in ("category", "status", "type"):
+        if dim in SUMMARY_DIMENSIONS[source] and row.get(dim) is not None:
+            keys.append((dim, str(row[dim])))
+    ts = row.get("timestamp")
+    if ts is not None:
+        keys.append(("day", ts.date().isoformat()))
+    if row.get("lat") is not None and row.get("lng") is not None:
+        keys.append(("cell", cell_key(row["lat"], row["lng"])))
+    return keys
+
+
+def _add_to_counters(sess, model, key_columns: Sequence[str], params: List[Dict]) -> None:
+    """Add each params["n"] to the counter row with the same key, creating missing rows, in one executemany."""
+    if not params:
+        return
+    if engine.dialect.name in ("sqlite", "postgresql"):
+        stmt = (sqlite_insert if engine.dialect.name == "sqlite" else pg_insert)(model)
+        stmt = stmt.on_conflict_do_update(index_elements=list(key_columns), set_={"n": model.n + stmt.excluded.n})
+        sess.execute(stmt, params)
+        return
+    for p in params:
+        updated = (
+            sess.query(model)
+            .filter_by(**{c: p[c] for c in key_columns})
+            .update({"n": model.n + p["n"]})
+        )
+        if not updated:
+            sess.add(model(**p))
+
+
+HOTSPOT_CELL_DEG = 0.005  # ~550 m grid for the per-hour incident counts
+
+
+def hotspot_key(lat: Optional[float], lng: Optional[float], ts: Optional[datetime]) -> Optional[Tuple[int, int, datetime]]:
+    """(cy, cx, hour) counter an incident falls in; None without coordinates or time."""
+    if lat is None or lng is None or ts is None:
+        return None
+    cy, cx = clustering.cell_of(lat, lng, HOTSPOT_CELL_DEG)
+    return cy, cx, ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _bump_cell_hours(sess, keys: Iterable[Optional[Tuple[int, int, datetime]]], delta: int = 1) -> None:
+    counts = Counter(k for k in keys if k is not None)
+    params = [{"cy": cy, "cx": cx, "hour": hour, "n": n * delta} for (cy, cx, hour), n in counts.items()]
+    _add_to_counters(sess, IncidentCellHour, ["cy", "cx", "hour"], params)
+
+
+def _cell_hours_missing() -> bool:
+    """True when incidents with coordinates exist but incident_cell_hours was never filled (upgraded database)."""
+    sess = SessionLocal()
+    try:
+        if sess.query(IncidentCellHour.cy).limit(1).first() is not None:
+            return False
+        return sess.query(Incident.id).filter(Incident.lat.isnot(None), Incident.lng.isnot(None)).limit(1).first() is not None
+    finally:
+        sess.close()
+
+
+def _upsert_counts(sess, source: str, deltas: Dict[Tuple[str, str], int]) -> None:
+    """Add each delta to its (dimension, key) counter, creating missing rows, in one executemany."""
+    params = [
+        {"source": source, "dimension": dim, "key": str(key), "n": n}
+        for (dim, key), n in deltas.items()
+        if key is not None and n
+    ]
+    _add_to_counters(sess, SummaryCount, ["source", "dimension", "key"], params)
+
+
+def _upsert_count(sess, source: str, dimension: str, key: Optional[str], delta: int) -> None:
+    _upsert_counts(sess, source, {(dimension, key): delta})
+
+
+def _bump_summary(sess, source: str, row: Dict, delta: int) -> None:
+    _upsert_counts(sess, source, {k: delta for k in summary_keys(source, row)})
+
+
+# -------------------------
+# Change log, delta sync and shared read cache
+# -------------------------
+# Every write through this module appends to change_log in the same
+# transaction. Callers keep the last ``seq`` they saw as a cursor and ask for
+# rows changed after it; deletes come back as ids in ``deleted``. A
+# process-wide copy of each table (shared by every Streamlit session) is kept
+# current the same way, so no read rescans a whole table after the first.
+#
+# A cursor is only safe if seqs become visible in order: a reader that has
+# seen seq 7 must never later find a newly committed seq 6. SQLite admits one
+# writer at a time, so that holds by itself. On PostgreSQL two transactions
+# can draw 6 and 7 and commit 7 first, so writers take CHANGE_LOG_LOCK before
+# drawing a seq and hold it to commit; change-log writes are serialized there.
+CHANGE_LOG_LOCK = 0x6367636C  # pg_advisory_xact_lock key ("cgcl")
+
+
+def _lock_change_log(sess) -> None:
+    """Serialize change-log writers on PostgreSQL until this transaction ends (no-op on SQLite)."""
+    if engine.dialect.name != "postgresql":
+        return
+    tx = sess.get_transaction()
+    if sess.info.get("change_log_locked") is tx:
+        return
+    sess.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CHANGE_LOG_LOCK})
+    sess.info["change_log_locked"] = tx
+
+
+def _log_change(sess, table: str, row_id: int, deleted: bool = False) -> None:
+    _lock_change_log(sess)
+    sess.add(ChangeLog(table_name=table, row_id=row_id, op="delete" if deleted else "upsert"))
+
+
+def _max_seq(sess, table: str) -> int:
+    return sess.query(func.max(ChangeLog.seq)).filter(ChangeLog.table_name == table).scalar() or 0
+
+
+def _cursor_pruned(sess, table: str, cursor: int) -> bool:
+    """True when change_log entries after ``cursor`` may have been pruned (see retention.py)."""
+    first = sess.query(func.min(ChangeLog.seq)).filter(ChangeLog.table_name == table).scalar()
+    return first is not None and cursor < first - 1
+
+
+def _changes_between(sess, table: str, after: int, upto: Optional[int] = None) -> Tuple[int, set, set]:
+    """(last seq, upserted ids, deleted ids) for after < seq <= upto; the latest op per row wins."""
+    q = sess.query(ChangeLog.seq, ChangeLog.row_id, ChangeLog.op).filter(
+        ChangeLog.table_name == table, ChangeLog.seq > after
+    )
+    if upto is not None:
+        q = q.filter(ChangeLog.seq <= upto)
+    last, upserted, deleted = after, set(), set()
+    for seq, row_id, op in q.order_by(ChangeLog.seq):
+        last = seq
+        if op == "delete":
+            upserted.discard(row_id)
+            deleted.add(row_id)
+        else:
+            deleted.discard(row_id)
+            upserted.add(row_id)
+    return last, upserted, deleted
+
+
+def _load_rows(
+    sess, table: str, ids: Optional[Sequence[int]] = None, columns: Optional[Sequence[str]] = None
+) -> List[Dict]:
+    if table == "reports":
+        columns = tuple(columns or REPORT_LIST_COLUMNS)
+        q = sess.query(*[getattr(Report, c) for c in columns])
+        if ids is not None:
+            q = q.filter(Report.id.in_(ids))
+        return [_report_row_to_dict(r, columns) for r in q.order_by(Report.id)]
+    model, to_dict = {
+        "incidents": (Incident, _incident_to_dict),
+        "notifications": (Notification, _notification_to_dict),
+    }[table]
+    q = sess.query(model)
+    if ids is not None:
+        q = q.filter(model.id.in_(ids))
+    return [to_dict(r) for r in q.order_by(model.id)]
+
+
+class _TableCache:
+    def __init__(self, table: str):
+        self.table = table
+        self.cursor = 0
+        self.rows: Optional[Dict[int, Dict]] = None
+        self.lock = threading.Lock()
+
+    def _refresh(self, sess) -> None:
+        # caller holds self.lock
+        if self.rows is None or _cursor_pruned(sess, self.table, self.cursor):
+            # take the cursor first: a change racing the load is simply seen again next time
+            self.cursor = _max_seq(sess, self.table)
+            self.rows = {r["id"]: r for r in _load_rows(sess, self.table)}
+            return
+        last, upserted, deleted = _changes_between(sess, self.table, self.cursor)
+        for row_id in deleted:
+            self.rows.pop(row_id, None)
+        if upserted:
+            for r in _load_rows(sess, self.table, sorted(upserted)):
+                self.rows[r["id"]] = r
+        self.cursor = last
+
+    def _all_rows(self) -> List[Dict]:
+        return [dict(r) for r in sorted(self.rows.values(), key=lambda r: r["id"])]
+
+    def snapshot(self) -> Tuple[int, List[Dict]]:
+        sess = SessionLocal()
+        try:
+            with self.lock:
+                self._refresh(sess)
+                return self.cursor, self._all_rows()
+        finally:
+            sess.close()
+
+    def since(self, cursor: Optional[int]) -> Dict:
+        sess = SessionLocal()
+        try:
+            with self.lock:
+                self._refresh(sess)
+                if cursor is None or cursor > self.cursor or _cursor_pruned(sess, self.table, cursor):
+                    return {"cursor": self.cursor, "reset": True, "rows": self._all_rows(), "deleted": []}
+                _, upserted, deleted = _changes_between(sess, self.table, cursor, self.cursor)
+                rows = [dict(self.rows[i]) for i in sorted(upserted) if i in self.rows]
+                return {"cursor": self.cursor, "reset": False, "rows": rows, "deleted": sorted(deleted)}
+        finally:
+            sess.close()
+
+
+_caches = {table: _TableCache(table) for table in ("reports", "incidents", "notifications")}
+
+
+def get_cached(table: str) -> List[Dict]:
+    """All rows of reports/incidents/notifications from the shared cache (no photo bytes)."""
+    return _caches[table].snapshot()[1]
+
+
+def refresh_cached(table: str) -> int:
+    """Bring the shared cache of a table up to date now; returns its change-log cursor."""
+    cache = _caches[table]
+    sess = SessionLocal()
+    try:
+        with cache.lock:
+            cache._refresh(sess)
+            return cache.cursor
+    finally:
+        sess.close()
+
+
+def get_changes_since(table: str, cursor: Optional[int]) -> Dict:
+    """
+    Rows of a cached table changed after change-log ``cursor``:
+        {"cursor": latest seq, "reset": bool, "rows": [...], "deleted": [ids]}
+    With cursor=None (first sync) ``reset`` is True and ``rows`` holds the
+    whole table; the caller should replace rather than merge.
+    """
+    return _caches[table].since(cursor)
+
+
+def read_changes_since(
+    table: str, cursor: int, limit: int = 1000, columns: Optional[Sequence[str]] = None
+) -> Dict:
+    """
+    get_changes_since() for clients that hold only part of a table (the
+    HTTP API): read straight from change_log instead of the shared cache.
+    ``reset`` is True, with no rows, when more than ``limit`` rows changed
+    or the cursor predates the pruned change log; the client should then
+    list the table again. ``columns`` narrows report rows (REPORT_LIST_COLUMNS
+    by default).
+    """
+    sess = SessionLocal()
+    try:
+        return _read_changes(sess, table, cursor, limit, columns)
     finally:
         sess.close()
 
 
-def mark_all_notifications_read() -> None:
+def _read_changes(sess, table: str, cursor: int, limit: int, columns: Optional[Sequence[str]] = None) -> Dict:
+    last, upserted, deleted = _changes_between(sess, table, cursor)
+    if len(upserted) + len(deleted) > limit or _cursor_pruned(sess, table, cursor):
+        return {"cursor": last, "reset": True, "rows": [], "deleted": []}
+    rows = _load_rows(sess, table, sorted(upserted), columns) if upserted else []
+    return {"cursor": last, "reset": False, "rows": rows, "deleted": sorted(deleted)}
+
+
+def change_version(table: str) -> Tuple[int, Optional[datetime]]:
+    """(latest change-log seq, when it was written) for a table; (0, None) before any change."""
+    with engine.connect() as conn:
+        row = conn.execute(_change_version_stmt(table)).first()
+    return (row.seq, row.changed_at) if row else (0, None)
+
+
+def _change_version_stmt(table: str):
+    return (
+        select(ChangeLog.seq, ChangeLog.changed_at)
+        .where(ChangeLog.table_name == table)
+        .order_by(ChangeLog.seq.desc())
+        .limit(1)
+    )
+
+
+def get_reports_since(cursor: Optional[int]) -> Dict:
+    return get_changes_since("reports", cursor)
+
+
+def get_incidents_since(cursor: Optional[int]) -> Dict:
+    return get_changes_since("incidents", cursor)
+
+
+def get_notifications_since(cursor: Optional[int]) -> Dict:
+    return get_changes_since("notifications", cursor)
+
+
+# -------------------------
+# Bulk ingestion
+# -------------------------
+def _as_float(value) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    return float(value)
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    """Naive UTC, like the timestamps written by datetime.utcnow()."""
+    if not value:
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _report_record(row: Dict) -> Dict:
+    """Map an import row (add_report-style or exported column names) onto Report columns."""
+    if not row.get("category") or not row.get("description"):
+        raise ValueError("category and description are required")
+    return {
+        "fullname": row.get("fullname") or None,
+        "contact": row.get("contact") or None,
+        "category": row["category"],
+        "description": row["description"],
+        "latitude": _as_float(row.get("latitude")),
+        "longitude": _as_float(row.get("longitude")),
+        "date": _as_date(row.get("date", row.get("date_str"))),
+        "photo_name": row.get("photo_name") or None,
+        "timestamp": _as_datetime(row.get("timestamp")) or datetime.utcnow(),
+        "status": row.get("status") or "pending",
+    }
+
+
+def _incident_record(row: Dict) -> Dict:
+    kind = row.get("type", row.get("type_"))
+    if not kind:
+        raise ValueError("type is required")
+    return {
+        "lat": _as_float(row.get("lat")),
+        "lng": _as_float(row.get("lng")),
+        "type": kind,
+        "desc": row.get("desc") or None,
+        "time": row.get("time", row.get("time_str")) or None,
+        "distance": row.get("distance") or None,
+        "timestamp": _as_datetime(row.get("timestamp")) or datetime.utcnow(),
+    }
+
+
+_BULK_TABLES = {
+    # table -> (model, row mapper, summary row builder)
+    "reports": (
+        Report,
+        _report_record,
+        lambda r: {"category": r["category"], "status": r["status"], "timestamp": r["timestamp"], "lat": r["latitude"], "lng": r["longitude"]},
+    ),
+    "incidents": (
+        Incident,
+        _incident_record,
+        lambda r: {"type": r["type"], "timestamp": r["timestamp"], "lat": r["lat"], "lng": r["lng"]},
+    ),
+}
+
+
+@_retry_on_lock
+def _insert_chunk(table: str, records: List[Dict]) -> None:
+    model, _, summary_row = _BULK_TABLES[table]
+    sess = SessionLocal()
+    try:
+        # one executemany for the rows, one for their change-log entries
+        ids = sess.execute(sa_insert(model).returning(model.id), records).scalars().all()
+        _lock_change_log(sess)
+        sess.execute(
+            sa_insert(ChangeLog),
+            [{"table_name": table, "row_id": i, "op": "upsert", "changed_at": datetime.utcnow()} for i in ids],
+        )
+        deltas: Counter = Counter()
+        for rec in records:
+            deltas.update(summary_keys(table, summary_row(rec)))
+        _upsert_counts(sess, table, deltas)
+        if table == "incidents":
+            _bump_cell_hours(sess, [hotspot_key(r["lat"], r["lng"], r["timestamp"]) for r in records])
+        sess.commit()
+    finally:
+        sess.close()
+
+
+def _bulk_add(
+    table: str,
+    rows: Iterable[Dict],
+    chunk_size: int,
+    progress: Optional[Callable[[int, int], None]],
+    skip_invalid: bool,
+) -> int:
+    _, to_record, _ = _BULK_TABLES[table]
+    inserted = skipped = 0
+    chunk: List[Dict] = []
+    for n, row in enumerate(rows, 1):
+        try:
+            chunk.append(to_record(row))
+        except (ValueError, TypeError) as e:
+            if not skip_invalid:
+                raise ValueError(f"{table} record {n}: {e}") from e
+            skipped += 1
+            continue
+        if len(chunk) >= chunk_size:
+            _insert_chunk(table, chunk)
+            inserted += len(chunk)
+            chunk = []
+            if progress:
+                progress(inserted, skipped)
+    if chunk:
+        _insert_chunk(table, chunk)
+        inserted += len(chunk)
+    if progress:
+        progress(inserted, skipped)
+    return inserted
+
+
+def bulk_add_reports(
+    rows: Iterable[Dict],
+    chunk_size: int = 1000,
+    progress: Optional[Callable[[int, int], None]] = None,
+    skip_invalid: bool = False,
+) -> int:
+    """
+    Insert reports from any iterable/generator of dicts, committing every
+    ``chunk_size`` rows with batched INSERTs. Keys follow add_report() or the
+    exported column names (latitude, date, timestamp, status, ...); photos are
+    not imported. ``progress(inserted, skipped)`` is called after each chunk.
+    Invalid rows raise ValueError unless skip_invalid is set. Returns the
+    number of rows inserted.
+    """
+    return _bulk_add("reports", rows, chunk_size, progress, skip_invalid)
+
+
+def bulk_add_incidents(
+    rows: Iterable[Dict],
+    chunk_size: int = 1000,
+    progress: Optional[Callable[[int, int], None]] = None,
+    skip_invalid: bool = False,
+) -> int:
+    """Same as bulk_add_reports() for incidents (lat, lng, type, desc, time, distance, timestamp)."""
+    return _bulk_add("incidents", rows, chunk_size, progress, skip_invalid)
+
+
+# -------------------------
+# Background jobs (run by jobs.py)
+# -------------------------
+def enqueue_job(kind: str, payload: Optional[Dict] = None, sess=None, delay: float = 0.0) -> Optional[int]:
+    """
+    Queue a background job. With ``sess`` the job is added to that session and
+    commits (or rolls back) together with the caller's own writes; the id is
+    then only known after the flush, so None is returned.
+    """
+    fields = {
+        "kind": kind,
+        "payload": json.dumps(payload or {}),
+        "run_after": datetime.utcnow() + timedelta(seconds=delay),
+    }
+    if sess is not None:
+        sess.add(Job(**fields))
+        return None
+    return _add_job(fields)
+
+
+@_retry_on_lock
+def _add_job(fields: Dict) -> int:
     sess = SessionLocal()
     try:
-        sess.query(Notification).filter(Notification.unread == "true").update({"unread": "false"})
+        job = Job(**fields)
+        sess.add(job)
         sess.commit()
+        return job.id
     finally:
         sess.close()
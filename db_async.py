@@ -0,0 +1,263 @@
+# db_async.py
+"""
+asyncio variant of the db.py API, for serving many requests from one event
+loop and running independent reads concurrently.
+
+    import db_async
+
+    reports, incidents = await asyncio.gather(db_async.get_reports(), db_async.get_incidents())
+    rows, cursor = await db_async.query_reports(category="theft", limit=50)
+
+    # from synchronous code (a Streamlit page, a thread):
+    tables = db_async.run(db_async.load_tables("reports", "incidents", "notifications"))
+
+Functions keep db.py's names, arguments and return shapes. Reads execute
+the statements db.py builds for the same call (db._query_reports_stmt and
+friends), so filters, ordering and spatial/full-text conditions cannot
+drift between the two layers. Reads run on
+an async engine (aiosqlite for SQLite, asyncpg for PostgreSQL; see
+dbconfig.create_async_db_engine) with its own connection pool, so
+concurrent reads use separate connections. Writes run the synchronous db.py
+function in a worker thread: they keep one implementation of the counter,
+change-log and job bookkeeping, and SQLite admits one writer at a time
+anyway. Reads of the shared in-process cache (get_changes_since and the
+get_*_since helpers) and of archive partitions run in a thread the same
+way. Call db.init_db() before first use.
+"""
+import asyncio
+import functools
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import clustering
+import db
+import dbconfig
+from db import REPORT_LIST_COLUMNS, Incident, Notification, Report, UnreadCount
+
+engine = dbconfig.create_async_db_engine(db.SETTINGS)
+AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+
+
+# -------------------------
+# Calling from synchronous code
+# -------------------------
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    # one loop per process: pooled connections belong to the loop that opened them
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="db-async-loop", daemon=True).start()
+        return _loop
+
+
+def run(coro):
+    """Run a coroutine of this module on the process's background loop and wait for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result()
+
+
+async def load_tables(*tables: str) -> Dict[str, List[Dict]]:
+    """Full reports/incidents/notifications listings, read concurrently."""
+    readers = {"reports": get_reports, "incidents": get_incidents, "notifications": get_notifications}
+    rows = await asyncio.gather(*(readers[t]() for t in tables))
+    return dict(zip(tables, rows))
+
+
+# -------------------------
+# Reports
+# -------------------------
+async def get_reports(include_photo: bool = False) -> List[Dict]:
+    """Return every report. Photo bytes are only loaded when include_photo=True."""
+    columns = REPORT_LIST_COLUMNS + (("photo_blob",) if include_photo else ())
+    async with AsyncSessionLocal() as sess:
+        result = await sess.execute(select(*[getattr(Report, c) for c in columns]))
+        return [db._report_row_to_dict(r, columns) for r in result]
+
+
+async def query_reports(
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    start_date=None,
+    end_date=None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    after: Optional[Tuple[datetime, int]] = None,
+    limit: int = 50,
+    columns: Optional[Sequence[str]] = None,
+) -> Tuple[List[Dict], Optional[Tuple[datetime, int]]]:
+    """Keyset-paginated report listing, newest first; see db.query_reports."""
+    columns = tuple(columns or REPORT_LIST_COLUMNS)
+    stmt, select_cols = db._query_reports_stmt(category, status, start_date, end_date, bbox, after, limit, columns)
+    async with AsyncSessionLocal() as sess:
+        rows = (await sess.execute(stmt)).all()
+    return db._report_page(rows, columns, select_cols, limit)
+
+
+async def search_reports(
+    query: str,
+    filters: Optional[Dict] = None,
+    limit: int = 50,
+    offset: int = 0,
+    columns: Optional[Sequence[str]] = None,
+) -> List[Dict]:
+    """Keyword search over report descriptions, best match first; see db.search_reports."""
+    columns = tuple(columns or REPORT_LIST_COLUMNS)
+    stmt = db._search_reports_stmt(query, filters, limit, offset, columns)
+    if stmt is None:
+        return []
+    async with AsyncSessionLocal() as sess:
+        result = await sess.execute(stmt)
+        return [{**db._report_row_to_dict(row, columns), "score": row.score} for row in result]
+
+
+async def count_reports(query: Optional[str] = None, **filters) -> int:
+    """Number of reports matching ``filters`` and ``query``; see db.count_reports."""
+    stmt = db._count_reports_stmt(query, filters)
+    if stmt is None:
+        return 0
+    async with AsyncSessionLocal() as sess:
+        return (await sess.execute(stmt)).scalar_one()
+
+
+async def get_report_photo(report_id: int) -> Optional[bytes]:
+    """Load the full-size photo for a single report (None if it has no photo)."""
+    async with AsyncSessionLocal() as sess:
+        row = (await sess.execute(select(Report.photo_sha256, Report.photo_blob).where(Report.id == report_id))).first()
+    if not row:
+        return None
+    if row.photo_sha256:
+        return await asyncio.to_thread(db.blob_store.get, row.photo_sha256)
+    return row.photo_blob
+
+
+async def get_report_thumbnail(report_id: int) -> Optional[bytes]:
+    """Load the downscaled photo for a report, falling back to the original."""
+    async with AsyncSessionLocal() as sess:
+        key = (await sess.execute(select(Report.thumb_sha256).where(Report.id == report_id))).scalar()
+    if key:
+        thumb = await asyncio.to_thread(db.blob_store.get, key)
+        if thumb:
+            return thumb
+    return await get_report_photo(report_id)
+
+
+# -------------------------
+# Incidents
+# -------------------------
+async def get_incidents() -> List[Dict]:
+    async with AsyncSessionLocal() as sess:
+        return [db._incident_to_dict(r) for r in (await sess.scalars(select(Incident)))]
+
+
+async def search_incidents(query: str, limit: int = 50, offset: int = 0) -> List[Dict]:
+    """Incidents whose description matches ``query``, best match first (see db.search_reports)."""
+    stmt = db._search_incidents_stmt(query, limit, offset)
+    if stmt is None:
+        return []
+    async with AsyncSessionLocal() as sess:
+        return [{**db._incident_to_dict(r), "score": s} for r, s in (await sess.execute(stmt))]
+
+
+async def get_incidents_within(lat: float, lng: float, radius_km: float, limit: int = 500) -> List[Dict]:
+    """Incidents within radius_km of (lat, lng), nearest first, with ``distance_km``; see db.get_incidents_within."""
+    async with AsyncSessionLocal() as sess:
+        rows = (await sess.execute(db._incidents_within_stmt(lat, lng, radius_km, limit))).all()
+    return db._incidents_within_rows(rows, lat, lng, radius_km, limit)
+
+
+async def get_incidents_in_bbox(bbox: Tuple[float, float, float, float], limit: int = 500) -> List[Dict]:
+    """Newest incidents inside (min_lat, min_lng, max_lat, max_lng), at most ``limit``."""
+    async with AsyncSessionLocal() as sess:
+        return [db._incident_to_dict(r) for r in (await sess.scalars(db._incidents_in_bbox_stmt(bbox, limit)))]
+
+
+async def get_incidents_geojson(bbox: Tuple[float, float, float, float], limit: int = 500) -> Dict:
+    """GeoJSON FeatureCollection of the incidents in a map viewport."""
+    return clustering.to_geojson(await get_incidents_in_bbox(bbox, limit))
+
+
+async def get_incident_clusters(bbox: Tuple[float, float, float, float], zoom: int) -> List[Dict]:
+    """Grid clusters of the incidents inside bbox for a zoom level; see db.get_incident_clusters."""
+    async with AsyncSessionLocal() as sess:
+        return db._cluster_dicts(await sess.execute(db._incident_clusters_stmt(bbox, zoom)))
+
+
+# -------------------------
+# Notifications
+# -------------------------
+async def get_notifications() -> List[Dict]:
+    async with AsyncSessionLocal() as sess:
+        return [db._notification_to_dict(r) for r in (await sess.scalars(select(Notification)))]
+
+
+async def get_user_notifications(user_id: str, limit: int = 50) -> List[Dict]:
+    """A user's newest notifications, ``unread`` reflecting that user's read state."""
+    async with AsyncSessionLocal() as sess:
+        rows = await sess.execute(db._user_notifications_stmt(user_id, limit))
+        return [{**db._notification_to_dict(n), "unread": bool(unread)} for n, unread in rows]
+
+
+async def get_unread_count(user_id: str) -> int:
+    """Unread notifications of a user (a primary-key lookup)."""
+    async with AsyncSessionLocal() as sess:
+        row = await sess.get(UnreadCount, user_id)
+        return max(row.n, 0) if row else 0
+
+
+# -------------------------
+# Change feed
+# -------------------------
+async def change_version(table: str) -> Tuple[int, Optional[datetime]]:
+    """(latest change-log seq, when it was written) for a table; (0, None) before any change."""
+    async with AsyncSessionLocal() as sess:
+        row = (await sess.execute(db._change_version_stmt(table))).first()
+    return (row.seq, row.changed_at) if row else (0, None)
+
+
+async def read_changes_since(
+    table: str, cursor: int, limit: int = 1000, columns: Optional[Sequence[str]] = None
+) -> Dict:
+    """Rows of a table changed after ``cursor``, straight from change_log; see db.read_changes_since."""
+    async with AsyncSessionLocal() as sess:
+        # the change-log helpers are written against a sync Session; run_sync hands them one
+        return await sess.run_sync(db._read_changes, table, cursor, limit, columns)
+
+
+# -------------------------
+# The db.py function in a worker thread
+# -------------------------
+def _in_thread(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    return wrapper
+
+
+# reads served from the process-wide cache (db._caches), archive files or rarely-read tables
+get_cached = _in_thread(db.get_cached)
+get_changes_since = _in_thread(db.get_changes_since)
+get_reports_since = _in_thread(db.get_reports_since)
+get_incidents_since = _in_thread(db.get_incidents_since)
+get_notifications_since = _in_thread(db.get_notifications_since)
+get_archived = _in_thread(db.get_archived)
+get_push_subscriptions = _in_thread(db.get_push_subscriptions)
+
+# writes
+
+
+add_report = _in_thread(db.add_report)
+submit_reports = _in_thread(db.submit_reports)
+update_report_status = _in_thread(db.update_report_status)
+delete_report = _in_thread(db.delete_report)
+add_incident = _in_thread(db.add_incident)
+add_notification = _in_thread(db.add_notification)
+mark_notification_read = _in_thread(db.mark_notification_read)
+mark_all_notifications_read = _in_thread(db.mark_all_notifications_read)
+enqueue_job = _in_thread(db.enqueue_job)
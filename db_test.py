@@ -40,9 +40,15 @@ except Exception as e:
 st.subheader("Add Sample Report")
 if st.button("➕ Add Report"):
     report_id = db.add_report(
-        type_="vandalism",
+        fullname=None,
+        contact=None,
+        category="vandalism",
         description="Test report",
-        location="Test location"
+        latitude=None,
+        longitude=None,
+        date_str=None,
+        photo_bytes=None,
+        photo_name=None,
     )
     st.write(f"Added Report ID: {report_id}")
 
@@ -0,0 +1,171 @@
+# dbconfig.py
+"""
+Engine configuration, read from environment variables (and a .env file).
+
+    DATABASE_URL             SQLAlchemy URL or postgres:// DSN; also read from
+                             st.secrets["DATABASE_URL"] (default: sqlite:///data/reports.db)
+    SQLITE_JOURNAL_MODE      WAL | DELETE | ...     (default WAL)
+    SQLITE_SYNCHRONOUS       OFF | NORMAL | FULL    (default NORMAL)
+    SQLITE_MMAP_SIZE         bytes to memory-map    (default 268435456)
+    SQLITE_BUSY_TIMEOUT_MS   wait on locks this long (default 5000)
+    SQLITE_CACHE_SIZE_KB     page cache per connection (default 20000)
+    DB_POOL_SIZE             pooled connections      (default 10)
+    DB_MAX_OVERFLOW          extra connections under load (default 20)
+    DB_POOL_TIMEOUT          seconds to wait for a connection (default 30)
+    DB_POOL_RECYCLE          seconds before a connection is replaced (default 1800)
+    DB_LOCK_RETRIES          retries of a write that hit "database is locked" (default 5)
+
+WAL lets readers keep going while one writer commits. busy_timeout makes
+writers queue instead of failing immediately. The SQLITE_* settings are
+ignored for PostgreSQL, which gets a pre-pinged, recycled QueuePool.
+"""
+import os
+from typing import Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+try:
+    from dotenv import load_dotenv
+except ImportError:  # python-dotenv is optional at runtime
+    load_dotenv = None
+
+if load_dotenv is not None:
+    load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _streamlit_secret(name: str) -> Optional[str]:
+    try:
+        import streamlit as st
+
+        return st.secrets.get(name)
+    except Exception:  # no secrets.toml, or not running under Streamlit
+        return None
+
+
+def normalize_url(url: str) -> str:
+    """Accept Heroku/Supabase style postgres:// DSNs."""
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def load_settings(default_url: str) -> Dict:
+    return {
+        "url": normalize_url(os.getenv("DATABASE_URL") or _streamlit_secret("DATABASE_URL") or default_url),
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL").upper(),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper(),
+        "mmap_size": _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+        "busy_timeout_ms": _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000),
+        "cache_size_kb": _env_int("SQLITE_CACHE_SIZE_KB", 20000),
+        "pool_size": _env_int("DB_POOL_SIZE", 10),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 20),
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+        "lock_retries": _env_int("DB_LOCK_RETRIES", 5),
+    }
+
+
+def _sqlite_pragmas(settings: Dict) -> Dict[str, object]:
+    return {
+        # only takes effect on a new file; retention.compact() converts existing ones
+        "auto_vacuum": "INCREMENTAL",
+        "journal_mode": settings["journal_mode"],
+        "synchronous": settings["synchronous"],
+        "mmap_size": settings["mmap_size"],
+        "busy_timeout": settings["busy_timeout_ms"],
+        "cache_size": -settings["cache_size_kb"],  # negative = KiB rather than pages
+        "temp_store": "MEMORY",
+    }
+
+
+def create_db_engine(settings: Dict, url: Optional[str] = None) -> Engine:
+    url = url or settings["url"]
+    if url.startswith("sqlite"):
+        kwargs = {"connect_args": {"check_same_thread": False, "timeout": settings["busy_timeout_ms"] / 1000}}
+        if ":memory:" not in url and url.rstrip("/") != "sqlite:":
+            kwargs.update(
+                pool_size=settings["pool_size"],
+                max_overflow=settings["max_overflow"],
+                pool_timeout=settings["pool_timeout"],
+            )
+        engine = create_engine(url, future=True, **kwargs)
+        pragmas = _sqlite_pragmas(settings)
+
+        @event.listens_for(engine, "connect")
+        def _set_pragmas(dbapi_conn, _record):
+            cur = dbapi_conn.cursor()
+            try:
+                for name, value in pragmas.items():
+                    cur.execute(f"PRAGMA {name}={value}")
+            finally:
+                cur.close()
+
+        return engine
+    return create_engine(
+        url,
+        future=True,
+        pool_size=settings["pool_size"],
+        max_overflow=settings["max_overflow"],
+        pool_timeout=settings["pool_timeout"],
+        pool_recycle=settings["pool_recycle"],
+        pool_pre_ping=True,
+    )
+
+
+def async_url(url: str) -> str:
+    """The asyncio driver URL for a sync one: aiosqlite for SQLite, asyncpg for PostgreSQL."""
+    scheme, sep, rest = url.partition("://")
+    if scheme.split("+")[0] == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if scheme.split("+")[0] == "postgresql":
+        return f"postgresql+asyncpg{sep}{rest}"
+    return url
+
+
+def create_async_db_engine(settings: Dict, url: Optional[str] = None):
+    """create_db_engine() for db_async.py: same pool sizes and SQLite PRAGMAs, asyncio driver."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = async_url(url or settings["url"])
+    if url.startswith("sqlite"):
+        kwargs = {"connect_args": {"timeout": settings["busy_timeout_ms"] / 1000}}
+        if ":memory:" not in url:
+            kwargs.update(
+                pool_size=settings["pool_size"],
+                max_overflow=settings["max_overflow"],
+                pool_timeout=settings["pool_timeout"],
+            )
+        engine = create_async_engine(url, **kwargs)
+        pragmas = _sqlite_pragmas(settings)
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def _set_pragmas(dbapi_conn, _record):
+            cur = dbapi_conn.cursor()
+            try:
+                for name, value in pragmas.items():
+                    cur.execute(f"PRAGMA {name}={value}")
+            finally:
+                cur.close()
+
+        return engine
+    return create_async_engine(
+        url,
+        pool_size=settings["pool_size"],
+        max_overflow=settings["max_overflow"],
+        pool_timeout=settings["pool_timeout"],
+        pool_recycle=settings["pool_recycle"],
+        pool_pre_ping=True,
+    )
+
+
+def is_lock_error(exc: Exception) -> bool:
+    msg = str(getattr(exc, "orig", exc)).lower()
+    return "database is locked" in msg or "database is busy" in msg
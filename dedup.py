@@ -0,0 +1,145 @@
+# dedup.py
+"""
+Near-duplicate detection for submitted reports.
+
+One event (a road accident, say) often produces a burst of reports. When the
+derive_incident job places a report on the map, db.place_report_incident
+asks find_duplicate() for another report of the same event inside its
+write transaction; a match links the new report to that report's incident
+instead of adding another incident. Placements are serialized, so reports
+of one burst handled by concurrent workers still find each other.
+
+Candidates are reports of the same category within DEDUP_RADIUS_M metres
+and DEDUP_WINDOW_MINUTES minutes (either side) that are already on the map
+(db.duplicate_candidates: R*Tree/PostGIS bbox plus the (category, timestamp)
+index, so the lookup never scans the table). A candidate matches when
+
+* the descriptions are similar: MinHash estimate of the Jaccard similarity
+  of their character shingles >= TEXT_THRESHOLD, or
+* both have photos whose 64-bit difference hashes (dHash, stored on the
+  report as photo_dhash) differ in at most PHOTO_MAX_BITS bits.
+
+Environment:
+    DEDUP_RADIUS_M          match radius in metres (default 150; 0 disables)
+    DEDUP_WINDOW_MINUTES    how far apart in time a match may be (default 120)
+"""
+import io
+import os
+import re
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+import numpy as np
+
+import db
+
+try:
+    from PIL import Image
+except ImportError:  # photo hashes are skipped without Pillow
+    Image = None
+
+SHINGLE_CHARS = 4
+NUM_PERM = 64
+TEXT_THRESHOLD = 0.5
+PHOTO_MAX_BITS = 10  # of 64
+MAX_CANDIDATES = 50
+
+_rng = np.random.RandomState(20240601)  # fixed, so signatures are comparable across processes
+_A = _rng.randint(1, 2 ** 62, NUM_PERM, dtype=np.int64).astype(np.uint64) | np.uint64(1)
+_B = _rng.randint(0, 2 ** 62, NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+
+def radius_m() -> float:
+    return float(os.getenv("DEDUP_RADIUS_M", "150"))
+
+
+def window() -> timedelta:
+    return timedelta(minutes=float(os.getenv("DEDUP_WINDOW_MINUTES", "120")))
+
+
+def shingles(text: Optional[str], k: int = SHINGLE_CHARS) -> set:
+    """Hashed character k-grams of the lower-cased words (the whole text when shorter than k)."""
+    norm = " ".join(re.findall(r"\w+", (text or "").lower()))
+    if not norm:
+        return set()
+    if len(norm) <= k:
+        return {zlib.crc32(norm.encode())}
+    return {zlib.crc32(norm[i:i + k].encode()) for i in range(len(norm) - k + 1)}
+
+
+def minhash(text: Optional[str]) -> Optional[np.ndarray]:
+    """NUM_PERM-value MinHash signature of the text's shingles (None for empty text)."""
+    values = shingles(text)
+    if not values:
+        return None
+    x = np.fromiter(values, dtype=np.uint64, count=len(values))
+    # multiply-shift hashing, one row per permutation; uint64 arithmetic wraps around
+    hashed = (_A[:, None] * x[None, :] + _B[:, None]) >> np.uint64(32)
+    return hashed.min(axis=1)
+
+
+def text_similarity(a: Optional[np.ndarray], b: Optional[np.ndarray]) -> float:
+    """Estimated Jaccard similarity of two minhash() signatures."""
+    if a is None or b is None:
+        return 0.0
+    return float(np.mean(a == b))
+
+
+def photo_hash(data: Optional[bytes]) -> Optional[str]:
+    """64-bit difference hash of an image as 16 hex digits; None without Pillow or for undecodable bytes."""
+    if Image is None or not data:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            small = np.asarray(img.convert("L").resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    except Exception:
+        return None
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return f"{int(''.join('1' if b else '0' for b in bits), 2):016x}"
+
+
+def photo_distance(a: Optional[str], b: Optional[str]) -> Optional[int]:
+    """Differing bits between two photo_hash() values (None if either is missing)."""
+    if not a or not b:
+        return None
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def find_duplicate(report: Dict, photo_dhash: Optional[str] = None, sess=None) -> Optional[Dict]:
+    """
+    The report already on the map that ``report`` (id, category,
+    description, latitude, longitude, timestamp) most likely duplicates, or
+    None. The result is the candidate dict from db.duplicate_candidates()
+    plus ``text_similarity`` and ``photo_distance``. Photo matches rank
+    first, then text similarity, then distance. ``sess`` runs the candidate
+    query in that session's transaction.
+    """
+    radius = radius_m()
+    if radius <= 0 or report.get("latitude") is None or report.get("longitude") is None:
+        return None
+    candidates = db.duplicate_candidates(
+        report["category"],
+        report["latitude"],
+        report["longitude"],
+        report.get("timestamp") or datetime.utcnow(),
+        radius / 1000.0,
+        window(),
+        exclude_id=report.get("id"),
+        limit=MAX_CANDIDATES,
+        sess=sess,
+    )
+    if not candidates:
+        return None
+    signature = minhash(report.get("description"))
+    best, best_rank = None, None
+    for c in candidates:
+        similarity = text_similarity(signature, minhash(c["description"]))
+        distance = photo_distance(photo_dhash, c["photo_dhash"])
+        photo_match = distance is not None and distance <= PHOTO_MAX_BITS
+        if not (photo_match or similarity >= TEXT_THRESHOLD):
+            continue
+        rank = (photo_match, similarity, -c["distance_km"])
+        if best_rank is None or rank > best_rank:
+            best, best_rank = {**c, "text_similarity": similarity, "photo_distance": distance}, rank
+    return best
@@ -0,0 +1,125 @@
+# export.py
+"""
+Incremental writers for report exports.
+
+Each writer consumes an iterator of row dicts (normally db.iter_reports())
+and writes it to a binary file object as it goes, so memory use depends on
+the chunk size rather than on the number of rows exported.
+"""
+import csv
+import gzip
+import importlib.util
+import io
+from datetime import date, datetime
+from itertools import islice
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Sequence
+
+FORMATS = {
+    "csv": ("reports.csv", "text/csv"),
+    "csv.gz": ("reports.csv.gz", "application/gzip"),
+    "parquet": ("reports.parquet", "application/vnd.apache.parquet"),
+}
+
+
+def available_formats() -> List[str]:
+    # find_spec rather than an import: pyarrow is only loaded when a Parquet export is written
+    return [f for f in FORMATS if f != "parquet" or importlib.util.find_spec("pyarrow") is not None]
+
+
+def _chunks(rows: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    it = iter(rows)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def write_csv(rows: Iterable[Dict], columns: Sequence[str], out: BinaryIO, compress: bool = False) -> int:
+    """Write rows as CSV (optionally gzip-compressed); returns the row count."""
+    raw = gzip.GzipFile(fileobj=out, mode="wb") if compress else out
+    text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    n = 0
+    for chunk in _chunks(rows, 1000):
+        writer.writerows([[_csv_value(r.get(c)) for c in columns] for r in chunk])
+        n += len(chunk)
+    text.flush()
+    text.detach()  # leave ``out`` open for the caller
+    if compress:
+        raw.close()  # writes the gzip trailer; GzipFile doesn't close fileobj
+    return n
+
+
+_ARROW_TYPES = {
+    "id": "int64",
+    "latitude": "float64",
+    "longitude": "float64",
+    "date": "date32",
+    "timestamp": "timestamp",
+}
+
+
+def _arrow_schema(pa, columns: Sequence[str]):
+    fields = []
+    for c in columns:
+        kind = _ARROW_TYPES.get(c, "string")
+        arrow_type = {
+            "int64": pa.int64(),
+            "float64": pa.float64(),
+            "date32": pa.date32(),
+            "timestamp": pa.timestamp("us"),
+            "string": pa.string(),
+        }[kind]
+        fields.append(pa.field(c, arrow_type))
+    return pa.schema(fields)
+
+
+def _arrow_value(kind: str, value):
+    # session-only rows may still carry ISO strings
+    if isinstance(value, str) and value:
+        if kind == "date32":
+            return date.fromisoformat(value[:10])
+        if kind == "timestamp":
+            return datetime.fromisoformat(value)
+    if kind == "string" and value is not None and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+def write_parquet(rows: Iterable[Dict], columns: Sequence[str], out: BinaryIO, chunk_size: int = 5000) -> int:
+    """Write rows as Parquet, one row group per chunk; returns the row count."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow") from None
+    schema = _arrow_schema(pa, columns)
+    n = 0
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        for chunk in _chunks(rows, chunk_size):
+            data = {c: [_arrow_value(_ARROW_TYPES.get(c, "string"), r.get(c)) for r in chunk] for c in columns}
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+            n += len(chunk)
+        if n == 0:
+            writer.write_table(schema.empty_table())
+    return n
+
+
+def write_rows(rows: Iterable[Dict], columns: Sequence[str], out: BinaryIO, fmt: str = "csv") -> int:
+    if fmt == "csv":
+        return write_csv(rows, columns, out)
+    if fmt == "csv.gz":
+        return write_csv(rows, columns, out, compress=True)
+    if fmt == "parquet":
+        return write_parquet(rows, columns, out)
+    raise ValueError(f"Unknown export format: {fmt}")
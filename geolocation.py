@@ -0,0 +1,125 @@
+# geolocation.py
+"""
+Approximate user location from the client IP, with caching.
+
+Streamlit reruns the whole script on every interaction, so the lookup must
+not hit the network each time. GeolocationService keeps a per-IP TTL cache
+(shared by all sessions in the process, at most max_entries IPs), bounds each lookup with a hard
+timeout and falls back to a default position when the provider fails. The
+provider is pluggable: GeocoderIPProvider for real lookups, StaticProvider
+as a stub for tests and offline use.
+"""
+import ipaddress
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Optional, Tuple
+
+LatLng = Tuple[float, float]
+
+
+class GeoProvider:
+    """Resolves an IP address (None = this server) to (lat, lng)."""
+
+    def locate(self, ip: Optional[str], timeout: float) -> Optional[LatLng]:
+        raise NotImplementedError
+
+
+class GeocoderIPProvider(GeoProvider):
+    def locate(self, ip: Optional[str], timeout: float) -> Optional[LatLng]:
+        import geocoder
+
+        g = geocoder.ip(ip or "me", timeout=timeout)
+        if g.ok and g.latlng:
+            lat, lng = g.latlng
+            return float(lat), float(lng)
+        return None
+
+
+class StaticProvider(GeoProvider):
+    """Always answers with the same position (or None to simulate failure)."""
+
+    def __init__(self, latlng: Optional[LatLng]):
+        self.latlng = latlng
+        self.calls = 0
+
+    def locate(self, ip: Optional[str], timeout: float) -> Optional[LatLng]:
+        self.calls += 1
+        return self.latlng
+
+
+def lookup_key(client_ip: Optional[str]) -> Optional[str]:
+    """IP to geolocate; None for loopback/private clients (locate the server)."""
+    if not client_ip:
+        return None
+    try:
+        addr = ipaddress.ip_address(client_ip)
+    except ValueError:
+        return None
+    if addr.is_private or addr.is_loopback or addr.is_link_local:
+        return None
+    return client_ip
+
+
+class GeolocationService:
+    def __init__(
+        self,
+        provider: GeoProvider,
+        default: LatLng,
+        ttl: float = 3600.0,
+        failure_ttl: float = 60.0,
+        timeout: float = 2.0,
+        max_entries: int = 10000,
+    ):
+        self.provider = provider
+        self.default = default
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Optional[str], Tuple[LatLng, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="geolocate")
+
+    def locate(self, client_ip: Optional[str] = None) -> LatLng:
+        key = lookup_key(client_ip)
+        now = time.monotonic()
+        with self._lock:
+            hit = self._cache.get(key)
+        if hit and hit[1] > now:
+            return hit[0]
+        latlng = None
+        try:
+            future = self._executor.submit(self.provider.locate, key, self.timeout)
+            latlng = future.result(timeout=self.timeout)
+        except (FutureTimeout, Exception):
+            latlng = None
+        # remember failures too, but briefly, so an offline network isn't retried on every rerun
+        value, ttl = (latlng, self.ttl) if latlng else (self.default, self.failure_ttl)
+        with self._lock:
+            self._store(key, value, time.monotonic() + ttl)
+        return value
+
+    def _store(self, key: Optional[str], value: LatLng, expires: float) -> None:
+        # caller holds the lock; entries stay in insertion order, so the oldest go first
+        self._cache.pop(key, None)
+        self._cache[key] = (value, expires)
+        if len(self._cache) > self.max_entries:
+            now = time.monotonic()
+            for k in [k for k, (_, exp) in self._cache.items() if exp <= now]:
+                del self._cache[k]
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+def provider_from_env(default: LatLng) -> GeoProvider:
+    """GEOLOCATION_PROVIDER=static pins the position to the default (tests, offline)."""
+    if os.getenv("GEOLOCATION_PROVIDER", "geocoder").lower() == "static":
+        return StaticProvider(default)
+    return GeocoderIPProvider()
@@ -0,0 +1,293 @@
+# hotspots.py
+"""
+Spatio-temporal hotspots over incidents: heatmap layers and emerging clusters.
+
+Incidents are counted per fine grid cell (db.HOTSPOT_CELL_DEG, ~550 m) and
+UTC hour in ``incident_cell_hours``, which db.py updates in the same
+transaction as every incident insert, so nothing here rescans the incidents
+table (except rebuild_cell_hours() for an upgraded database). A read sums
+those counters for a viewport and time window with one GROUP BY and works
+on the result as NumPy grids:
+
+* heatmap_points(): a Gaussian kernel-density surface over the cell counts,
+  as [lat, lng, weight] for folium.plugins.HeatMap;
+* emerging_clusters(): cells whose count in a trailing window is far above
+  their own baseline rate (Poisson z-score), merged into clusters of
+  touching cells;
+* counts_over_time(): incidents per hour or day.
+"""
+import math
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import case, func, insert as sa_insert, select
+
+import clustering
+import db
+from db import Incident, IncidentCellHour, SessionLocal
+
+BBox = clustering.BBox
+EPOCH = datetime(1970, 1, 1)
+MAX_GRID_CELLS = 160  # heatmap grid side; wider views sum neighbouring cells first
+BANDWIDTH_CELLS = 1.5  # kernel standard deviation, in grid cells
+MIN_WEIGHT = 0.02  # density (relative to the peak) below which heatmap cells are dropped
+
+
+def current_hour(now: Optional[datetime] = None) -> datetime:
+    """Start of the hour after ``now`` (UTC): the exclusive end of windows that include it."""
+    now = now or datetime.utcnow()
+    return now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+
+
+def bin_points(
+    lats: Sequence[Optional[float]],
+    lngs: Sequence[Optional[float]],
+    timestamps: Sequence[Optional[datetime]],
+    cell_deg: float = db.HOTSPOT_CELL_DEG,
+    bucket: timedelta = timedelta(hours=1),
+) -> Counter:
+    """
+    Count points per (cy, cx, bucket start) in one vectorized pass. Points
+    missing a coordinate or time are skipped. With the defaults the keys are
+    db.hotspot_key()'s.
+    """
+    lat = np.asarray(lats, dtype=float)
+    lng = np.asarray(lngs, dtype=float)
+    ts = np.asarray(timestamps, dtype="datetime64[us]")
+    ok = ~(np.isnan(lat) | np.isnan(lng) | np.isnat(ts))
+    if not ok.any():
+        return Counter()
+    seconds = int(bucket.total_seconds())
+    keys = np.stack(
+        [
+            np.floor((lat[ok] + 90.0) / cell_deg).astype(np.int64),
+            np.floor((lng[ok] + 180.0) / cell_deg).astype(np.int64),
+            ts[ok].astype("datetime64[s]").astype(np.int64) // seconds,
+        ],
+        axis=1,
+    )
+    uniq, counts = np.unique(keys, axis=0, return_counts=True)
+    return Counter(
+        {(int(cy), int(cx), EPOCH + timedelta(seconds=int(b) * seconds)): int(n) for (cy, cx, b), n in zip(uniq, counts)}
+    )
+
+
+def rebuild_cell_hours(chunk_size: int = 50_000) -> int:
+    """
+    Recompute incident_cell_hours from the incidents table and its archive
+    partitions (see retention.py) in one transaction; returns rows written.
+    """
+    import retention
+
+    sess = SessionLocal()
+    try:
+        # deleting first takes the write lock, so concurrent writers wait for the rebuild
+        sess.query(IncidentCellHour).delete()
+        totals: Counter = Counter()
+        stmt = select(Incident.lat, Incident.lng, Incident.timestamp).where(
+            Incident.lat.isnot(None), Incident.lng.isnot(None)
+        )
+        with retention.archive_sessions("incidents") as archived:
+            for source in [sess] + archived:
+                for chunk in source.execute(stmt.execution_options(yield_per=chunk_size)).partitions():
+                    lats, lngs, timestamps = zip(*chunk)
+                    totals.update(bin_points(lats, lngs, timestamps))
+        params = [{"cy": cy, "cx": cx, "hour": hour, "n": n} for (cy, cx, hour), n in totals.items()]
+        for i in range(0, len(params), chunk_size):
+            sess.execute(sa_insert(IncidentCellHour), params[i:i + chunk_size])
+        sess.commit()
+        return len(params)
+    finally:
+        sess.close()
+
+
+def _cell_range(bbox: BBox, factor: int, margin: int = 0) -> Tuple[int, int, int, int]:
+    """(y0, x0, y1, x1) of the coarse cells (``factor`` fine cells across) covering bbox."""
+    y0, x0 = clustering.cell_of(bbox[0], bbox[1], db.HOTSPOT_CELL_DEG)
+    y1, x1 = clustering.cell_of(bbox[2], bbox[3], db.HOTSPOT_CELL_DEG)
+    return y0 // factor - margin, x0 // factor - margin, y1 // factor + margin, x1 // factor + margin
+
+
+def _within(q, bbox: Optional[BBox], factor: int, margin: int = 0):
+    """Limit a query on incident_cell_hours to the fine cells under bbox's coarse cells."""
+    if bbox is None:
+        return q
+    t = IncidentCellHour
+    y0, x0, y1, x1 = _cell_range(bbox, factor, margin)
+    return q.filter(t.cy.between(y0 * factor, (y1 + 1) * factor - 1), t.cx.between(x0 * factor, (x1 + 1) * factor - 1))
+
+
+def cell_counts(
+    start: datetime,
+    end: datetime,
+    bbox: Optional[BBox] = None,
+    factor: int = 1,
+    margin: int = 0,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Incidents per cell in [start, end) as arrays (cy, cx, n), for cells of
+    ``factor`` x ``factor`` fine cells, optionally limited to bbox (grown by
+    ``margin`` cells).
+    """
+    t = IncidentCellHour
+    cy, cx = t.cy // factor, t.cx // factor
+    sess = SessionLocal()
+    try:
+        q = sess.query(cy, cx, func.sum(t.n)).filter(t.hour >= start, t.hour < end).group_by(cy, cx)
+        rows = _within(q, bbox, factor, margin).all()
+    finally:
+        sess.close()
+    if not rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    arr = np.asarray(rows, dtype=np.int64)
+    return arr[:, 0], arr[:, 1], arr[:, 2]
+
+
+def gaussian_smooth(grid: np.ndarray, sigma: float) -> np.ndarray:
+    """Separable Gaussian blur of a 2-D array (zero outside it)."""
+    radius = max(1, int(math.ceil(3 * sigma)))
+    offsets = np.arange(-radius, radius + 1)
+    kernel = np.exp(-0.5 * (offsets / sigma) ** 2)
+    kernel /= kernel.sum()
+    ny, nx = grid.shape
+    padded = np.pad(grid.astype(float), radius)
+    rows = sum(w * padded[radius + o:radius + o + ny, :] for o, w in zip(offsets, kernel))
+    return sum(w * rows[:, radius + o:radius + o + nx] for o, w in zip(offsets, kernel))
+
+
+def heatmap_points(bbox: BBox, start: datetime, end: datetime, max_cells: int = MAX_GRID_CELLS) -> List[List[float]]:
+    """
+    Kernel-density heatmap of the incidents in bbox during [start, end):
+    [lat, lng, weight] per grid cell, weights relative to the densest cell.
+    """
+    y0, x0, y1, x1 = _cell_range(bbox, 1)
+    factor = max(1, math.ceil(max(y1 - y0 + 1, x1 - x0 + 1) / max_cells))
+    margin = max(1, int(math.ceil(3 * BANDWIDTH_CELLS)))  # so cells just outside the view still blur in
+    cy, cx, n = cell_counts(start, end, bbox, factor, margin)
+    if not len(n):
+        return []
+    y0, x0, y1, x1 = _cell_range(bbox, factor, margin)
+    grid = np.zeros((y1 - y0 + 1, x1 - x0 + 1))
+    np.add.at(grid, (cy - y0, cx - x0), n)
+    density = gaussian_smooth(grid, BANDWIDTH_CELLS)
+    density = density[margin:-margin, margin:-margin]
+    peak = density.max()
+    if peak <= 0:
+        return []
+    iy, ix = np.nonzero(density >= peak * MIN_WEIGHT)
+    cell = db.HOTSPOT_CELL_DEG * factor
+    lats = (y0 + margin + iy + 0.5) * cell - 90.0
+    lngs = (x0 + margin + ix + 0.5) * cell - 180.0
+    weights = density[iy, ix] / peak
+    return [[round(float(a), 6), round(float(b), 6), round(float(w), 4)] for a, b, w in zip(lats, lngs, weights)]
+
+
+def _touching_groups(cells: List[Tuple[int, int]]) -> List[List[Tuple[int, int]]]:
+    """Connected groups of cells (8-neighbourhood)."""
+    left, groups = set(cells), []
+    while left:
+        stack, group = [left.pop()], []
+        while stack:
+            y, x = stack.pop()
+            group.append((y, x))
+            for dy in (-1, 0, 1):
+                for dx in (-1, 0, 1):
+                    if (y + dy, x + dx) in left:
+                        left.remove((y + dy, x + dx))
+                        stack.append((y + dy, x + dx))
+        groups.append(group)
+    return groups
+
+
+def emerging_clusters(
+    now: Optional[datetime] = None,
+    window: timedelta = timedelta(hours=24),
+    baseline: timedelta = timedelta(days=14),
+    bbox: Optional[BBox] = None,
+    factor: int = 2,
+    min_count: int = 3,
+    min_score: float = 3.0,
+) -> List[Dict]:
+    """
+    Clusters of cells (``factor`` fine cells across, ~1.1 km by default) with
+    unusually many incidents in the trailing ``window`` compared with the
+    ``baseline`` period before it. A cell qualifies with at least
+    ``min_count`` incidents and a z-score (recent - expected) / sqrt(expected)
+    of ``min_score`` or more. Touching qualifying cells form one cluster.
+    Strongest first, each with centroid, cell count, recent and expected
+    counts, score and bbox.
+    """
+    end = current_hour(now)
+    split = end - window
+    start = split - baseline
+    t = IncidentCellHour
+    cy, cx = t.cy // factor, t.cx // factor
+    sess = SessionLocal()
+    try:
+        q = (
+            sess.query(
+                cy,
+                cx,
+                func.sum(case((t.hour >= split, t.n), else_=0)),
+                func.sum(case((t.hour < split, t.n), else_=0)),
+            )
+            .filter(t.hour >= start, t.hour < end)
+            .group_by(cy, cx)
+        )
+        rows = _within(q, bbox, factor).all()
+    finally:
+        sess.close()
+    if not rows:
+        return []
+    arr = np.asarray(rows, dtype=float)
+    recent, base = arr[:, 2], arr[:, 3]
+    expected = base * (window / baseline)
+    score = (recent - expected) / np.sqrt(np.maximum(expected, 1.0))
+    hot = (recent >= min_count) & (score >= min_score)
+    by_cell = {
+        (int(y), int(x)): (r, e) for y, x, r, e in zip(arr[hot, 0], arr[hot, 1], recent[hot], expected[hot])
+    }
+    cell = db.HOTSPOT_CELL_DEG * factor
+    clusters = []
+    for group in _touching_groups(list(by_cell)):
+        ys = np.array([y for y, _ in group])
+        xs = np.array([x for _, x in group])
+        r = np.array([by_cell[c][0] for c in group])
+        e = np.array([by_cell[c][1] for c in group])
+        total, exp_total = float(r.sum()), float(e.sum())
+        clusters.append({
+            "lat": round(float(((ys + 0.5) * r).sum() / total * cell - 90.0), 6),
+            "lng": round(float(((xs + 0.5) * r).sum() / total * cell - 180.0), 6),
+            "cells": len(group),
+            "recent": int(total),
+            "expected": round(exp_total, 2),
+            "score": round((total - exp_total) / math.sqrt(max(exp_total, 1.0)), 2),
+            "bbox": tuple(
+                round(float(v), 6)
+                for v in (ys.min() * cell - 90.0, xs.min() * cell - 180.0, (ys.max() + 1) * cell - 90.0, (xs.max() + 1) * cell - 180.0)
+            ),
+        })
+    return sorted(clusters, key=lambda c: c["score"], reverse=True)
+
+
+def counts_over_time(start: datetime, end: datetime, bbox: Optional[BBox] = None, daily: bool = False) -> List[Tuple[datetime, int]]:
+    """Incidents per hour (or per day) in [start, end), oldest first, empty buckets included."""
+    t = IncidentCellHour
+    sess = SessionLocal()
+    try:
+        q = sess.query(t.hour, func.sum(t.n)).filter(t.hour >= start, t.hour < end).group_by(t.hour)
+        rows = _within(q, bbox, 1).all()
+    finally:
+        sess.close()
+    step = timedelta(days=1) if daily else timedelta(hours=1)
+    first = start.replace(minute=0, second=0, microsecond=0)
+    if daily:
+        first = first.replace(hour=0)
+    buckets = int(math.ceil((end - first) / step))
+    totals = np.zeros(max(buckets, 0), dtype=np.int64)
+    for hour, n in rows:
+        totals[int((hour - first) / step)] += n
+    return [(first + i * step, int(n)) for i, n in enumerate(totals)]
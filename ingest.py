@@ -0,0 +1,85 @@
+# ingest.py
+"""
+Stream historical reports or incidents from JSONL/CSV files into the database.
+
+    python ingest.py reports police_2024.jsonl barangay_2024.csv.gz
+    python ingest.py incidents incidents.csv --chunk-size 5000 --skip-invalid
+    cat reports.jsonl | python ingest.py reports - --format jsonl
+
+Files are read line by line and written with db.bulk_add_reports /
+db.bulk_add_incidents, one transaction per chunk, so memory stays flat
+whatever the file size. Column names follow the add_report/add_incident
+arguments or the exported report columns.
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+from typing import Dict, Iterator
+
+import db
+
+
+def _open_text(path: str):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def _detect_format(path: str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.lower().endswith(".csv") else "jsonl"
+
+
+def read_records(path: str, fmt: str = None) -> Iterator[Dict]:
+    """Yield one dict per JSONL line / CSV row of ``path`` ("-" for stdin)."""
+    fmt = fmt or _detect_format(path)
+    with _open_text(path) as f:
+        if fmt == "csv":
+            for row in csv.DictReader(f):
+                yield row
+            return
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("table", choices=["reports", "incidents"])
+    parser.add_argument("paths", nargs="+", help="JSONL or CSV files (optionally .gz); '-' reads stdin")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="override detection by file extension")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="rows per transaction (default 1000)")
+    parser.add_argument("--skip-invalid", action="store_true", help="skip rows missing required fields")
+    args = parser.parse_args(argv)
+
+    if not db.init_db():
+        print("Database initialization failed", file=sys.stderr)
+        return 1
+    bulk_add = db.bulk_add_reports if args.table == "reports" else db.bulk_add_incidents
+    started = time.perf_counter()
+    total = 0
+    for path in args.paths:
+        def progress(inserted, skipped, path=path):
+            rate = (total + inserted) / max(time.perf_counter() - started, 1e-9)
+            print(f"\r{path}: {inserted} inserted, {skipped} skipped ({rate:,.0f} rows/s)", end="", file=sys.stderr)
+
+        total += bulk_add(
+            read_records(path, args.format),
+            chunk_size=args.chunk_size,
+            progress=progress,
+            skip_invalid=args.skip_invalid,
+        )
+        print(file=sys.stderr)
+    print(f"{total} {args.table} imported in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+# jobs.py
+"""
+Durable background jobs for the slow side effects of a write.
+
+Jobs are rows of the ``jobs`` table (db.Job), so they survive a restart. A
+request queues them, normally in the same transaction as its own insert
+(db.add_report(jobs=...) / db.enqueue_job(sess=...)), and returns; a small
+pool of worker threads in the same process claims and runs them. A failing
+job is retried with exponential backoff up to MAX_ATTEMPTS times and then
+left with status "failed" and its last error.
+
+    @jobs.handler("my_kind")
+    def my_kind(payload): ...
+
+    jobs.start_workers()                  # once per process
+    db.enqueue_job("my_kind", {"x": 1})
+    jobs.wake()                           # optional: skip the poll delay
+
+Environment:
+    JOB_WORKERS          worker threads per process (default 2)
+    JOB_POLL_INTERVAL    seconds between polls when idle (default 1.0)
+"""
+import json
+import logging
+import os
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+
+import db
+import notifications
+from db import Job, Report, SessionLocal
+
+log = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 2.0
+STALE_AFTER = timedelta(minutes=5)  # a "running" job this old belonged to a dead worker
+
+HANDLERS: Dict[str, Callable[[Dict], None]] = {}
+_listeners: List[Callable[[str, Dict], None]] = []
+
+
+def handler(kind: str):
+    """Register the function that runs jobs of ``kind`` (it receives the payload dict)."""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def add_listener(fn: Callable[[str, Dict], None]) -> None:
+    """Call fn(kind, payload) in the worker thread after each job that succeeds."""
+    _listeners.append(fn)
+
+
+def claim() -> Optional[Tuple[int, str, Dict, int]]:
+    """Atomically mark the next due job as running; returns (id, kind, payload, attempts)."""
+    now = datetime.utcnow()
+    due = (
+        select(Job.id)
+        .where(Job.status == "queued", Job.run_after <= now)
+        .order_by(Job.run_after, Job.id)
+        .limit(1)
+    )
+    if db.engine.dialect.name == "postgresql":
+        due = due.with_for_update(skip_locked=True)
+    stmt = (
+        update(Job)
+        .where(Job.id == due.scalar_subquery(), Job.status == "queued")
+        .values(status="running", attempts=Job.attempts + 1, updated_at=now)
+        .returning(Job.id, Job.kind, Job.payload, Job.attempts)
+    )
+    with db.engine.begin() as conn:
+        row = conn.execute(stmt).first()
+    if row is None:
+        return None
+    return row.id, row.kind, json.loads(row.payload or "{}"), row.attempts
+
+
+def _finish(job_id: int, values: Dict) -> None:
+    with db.engine.begin() as conn:
+        conn.execute(update(Job).where(Job.id == job_id).values(updated_at=datetime.utcnow(), **values))
+
+
+def run_job(job_id: int, kind: str, payload: Dict, attempts: int) -> bool:
+    """Run one claimed job and record the outcome; returns True on success."""
+    try:
+        fn = HANDLERS.get(kind)
+        if fn is None:
+            raise LookupError(f"No handler registered for job kind {kind!r}")
+        fn(payload)
+    except Exception:
+        error = traceback.format_exc(limit=5)
+        log.warning("job %s (%s) failed on attempt %s", job_id, kind, attempts)
+        if attempts < MAX_ATTEMPTS:
+            delay = RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+            _finish(job_id, {"status": "queued", "last_error": error, "run_after": datetime.utcnow() + timedelta(seconds=delay)})
+        else:
+            _finish(job_id, {"status": "failed", "last_error": error})
+        return False
+    _finish(job_id, {"status": "done", "last_error": None})
+    for listener in list(_listeners):
+        try:
+            listener(kind, payload)
+        except Exception:
+            log.exception("job listener failed")
+    return True
+
+
+def run_pending(max_jobs: Optional[int] = None) -> int:
+    """Run due jobs in the calling thread until none are left; returns how many ran."""
+    ran = 0
+    while max_jobs is None or ran < max_jobs:
+        job = claim()
+        if job is None:
+            break
+        run_job(*job)
+        ran += 1
+    return ran
+
+
+def recover_stale(older_than: timedelta = STALE_AFTER) -> int:
+    """Requeue jobs left "running" by a worker that died; returns how many."""
+    cutoff = datetime.utcnow() - older_than
+    with db.engine.begin() as conn:
+        result = conn.execute(
+            update(Job).where(Job.status == "running", Job.updated_at < cutoff).values(status="queued")
+        )
+        return result.rowcount or 0
+
+
+def queue_stats() -> Dict[str, int]:
+    """Number of jobs per status."""
+    sess = SessionLocal()
+    try:
+        return {status: n for status, n in sess.query(Job.status, func.count(Job.id)).group_by(Job.status)}
+    finally:
+        sess.close()
+
+
+class WorkerPool:
+    """Daemon threads that poll the jobs table; wake() makes an idle worker look immediately."""
+
+    def __init__(self, threads: int = 2, poll_interval: float = 1.0):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._workers: List[threading.Thread] = []
+
+    def start(self) -> "WorkerPool":
+        recover_stale()
+        for i in range(self.threads):
+            t = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._workers.append(t)
+        return self
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        for t in self._workers:
+            t.join(timeout)
+        self._workers = []
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = claim()
+            except Exception:
+                # e.g. the database is locked or unreachable: back off and poll again
+                log.exception("could not claim a job")
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            run_job(*job)
+
+
+_pool: Optional[WorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def start_workers(threads: Optional[int] = None, poll_interval: Optional[float] = None) -> WorkerPool:
+    """Start the process-wide worker pool (idempotent)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(
+                threads if threads is not None else int(os.getenv("JOB_WORKERS", "2")),
+                poll_interval if poll_interval is not None else float(os.getenv("JOB_POLL_INTERVAL", "1.0")),
+            ).start()
+        return _pool
+
+
+def stop_workers() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.stop()
+            _pool = None
+
+
+def wake() -> None:
+    """Tell the pool new work is queued (no-op when no pool runs in this process)."""
+    if _pool is not None:
+        _pool.wake()
+
+
+# -------------------------
+# Handlers
+# -------------------------
+@handler("report_photo")
+def _report_photo(payload: Dict) -> None:
+    db.make_report_thumbnail(payload["report_id"])
+
+
+@handler("derive_incident")
+def _derive_incident(payload: Dict) -> None:
+    """Put a report with coordinates on the incident map, or link it to the incident it duplicates."""
+    import dedup  # loads NumPy/Pillow, so not at app start
+
+    sess = SessionLocal()
+    try:
+        r = sess.get(Report, payload["report_id"])
+        if r is None or r.latitude is None or r.longitude is None or r.incident_id is not None:
+            return
+        report = {c: getattr(r, c) for c in ("id", "category", "description", "latitude", "longitude", "timestamp")}
+        has_photo = bool(r.photo_sha256 or r.photo_blob)
+    finally:
+        sess.close()
+    photo_dhash = dedup.photo_hash(db.get_report_photo(report["id"])) if has_photo else None
+    # the candidate lookup runs inside place_report_incident's serialized transaction
+    db.place_report_incident(
+        report["id"],
+        payload.get("time", "Just now"),
+        payload.get("distance", "0 miles"),
+        photo_dhash=photo_dhash,
+        find_duplicate=lambda sess: dedup.find_duplicate(report, photo_dhash, sess=sess),
+    )
+    for table in ("reports", "incidents"):
+        db.refresh_cached(table)
+
+
+@handler("notify")
+def _notify(payload: Dict) -> None:
+    """Store a notification; its delivery is a job of its own, so a retry never stores it twice."""
+    notifications.send_later(payload["title"], payload.get("desc"), payload.get("recipients"), payload.get("time", "Just now"))
+    wake()
+
+
+@handler("deliver_notification")
+def _deliver_notification(payload: Dict) -> None:
+    """Publish a stored notification to open sessions and browsers."""
+    notifications.deliver(payload)
+
+
+@handler("refresh_cache")
+def _refresh_cache(payload: Dict) -> None:
+    for table in payload.get("tables", ("reports", "incidents", "notifications")):
+        db.refresh_cached(table)
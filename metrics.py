@@ -0,0 +1,255 @@
+# metrics.py
+"""
+Process-wide latency histograms, row counts and byte counts.
+
+    metrics.instrument_module(db, "db")        # wrap every public db.* function
+    with metrics.timer("map.build"):
+        ...
+    metrics.prometheus_text()                  # text exposition format
+
+Each timed name gets a cumulative histogram (Prometheus-style buckets) and
+a window of recent samples for percentiles. Calls made while a trace is
+open on the current thread (begin_trace()/end_trace(), one per Streamlit
+rerun) are also collected in that trace, giving a per-rerun breakdown.
+Set METRICS_PORT to serve /metrics over HTTP (see serve()).
+"""
+import functools
+import inspect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RECENT_SAMPLES = 1024
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)  # non-cumulative; +Inf is ``count``
+        self.count = 0
+        self.sum = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.errors = 0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds: float, rows: Optional[int] = None, nbytes: Optional[int] = None, error: bool = False):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+        self.rows += rows or 0
+        self.bytes += nbytes or 0
+        self.errors += int(error)
+        self.recent.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.recent:
+            return None
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(len(values) * p))]
+
+
+_histograms: Dict[str, Histogram] = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def record(name: str, seconds: float, rows: Optional[int] = None, nbytes: Optional[int] = None, error: bool = False):
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = Histogram()
+        hist.observe(seconds, rows, nbytes, error)
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace.append({"name": name, "ms": seconds * 1000.0, "rows": rows, "bytes": nbytes, "error": error})
+
+
+@contextmanager
+def timer(name: str):
+    t0 = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        record(name, time.perf_counter() - t0, error=error)
+
+
+class Timer:
+    """Start/stop form of timer() for code that can't be wrapped in a with block."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.t0 = time.perf_counter()
+
+    def stop(self) -> float:
+        seconds = time.perf_counter() - self.t0
+        record(self.name, seconds)
+        return seconds
+
+
+def _result_size(result):
+    """(rows, bytes) read, as far as they can be told from a return value."""
+    if isinstance(result, (bytes, bytearray)):
+        return None, len(result)
+    if isinstance(result, list):
+        return len(result), None
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        return len(result[0]), None  # (rows, next_cursor)
+    if isinstance(result, dict) and isinstance(result.get("rows"), list):
+        return len(result["rows"]), None  # delta sync
+    return None, None
+
+
+def instrumented(name: str, fn: Callable) -> Callable:
+    """Wrap fn so every call is recorded under ``name`` (generators: timed until exhausted)."""
+    if getattr(fn, "_metrics_name", None):
+        return fn
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def gen_wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            rows = 0
+            error = False
+            try:
+                for item in fn(*args, **kwargs):
+                    rows += 1
+                    yield item
+            except BaseException:
+                error = True
+                raise
+            finally:
+                record(name, time.perf_counter() - t0, rows=rows, error=error)
+        gen_wrapper._metrics_name = name
+        return gen_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException:
+            record(name, time.perf_counter() - t0, error=True)
+            raise
+        rows, nbytes = _result_size(result)
+        record(name, time.perf_counter() - t0, rows=rows, nbytes=nbytes)
+        return result
+    wrapper._metrics_name = name
+    return wrapper
+
+
+def instrument_module(module, prefix: str, exclude: Sequence[str] = ()) -> List[str]:
+    """
+    Replace the public functions defined in ``module`` by instrumented
+    wrappers (idempotent). Calls through the module attribute, including the
+    module's own calls to its functions, are then recorded as "prefix.name".
+    ``exclude`` names cheap helpers not worth timing.
+    """
+    wrapped = []
+    for attr in dir(module):
+        fn = getattr(module, attr, None)
+        if attr.startswith("_") or attr in exclude or not inspect.isfunction(fn) or fn.__module__ != module.__name__:
+            continue
+        setattr(module, attr, instrumented(f"{prefix}.{attr}", fn))
+        wrapped.append(attr)
+    return wrapped
+
+
+def begin_trace() -> None:
+    """Start collecting this thread's calls (e.g. one Streamlit rerun)."""
+    _local.trace = []
+
+
+def end_trace() -> List[Dict]:
+    """Stop collecting and return the calls recorded since begin_trace()."""
+    trace = getattr(_local, "trace", None) or []
+    _local.trace = None
+    return trace
+
+
+def snapshot() -> List[Dict]:
+    """One summary row per timed name, slowest total first."""
+    with _lock:
+        rows = [
+            {
+                "name": name,
+                "calls": h.count,
+                "errors": h.errors,
+                "total_ms": h.sum * 1000.0,
+                "mean_ms": h.sum / h.count * 1000.0 if h.count else 0.0,
+                "p50_ms": (h.percentile(0.5) or 0.0) * 1000.0,
+                "p95_ms": (h.percentile(0.95) or 0.0) * 1000.0,
+                "p99_ms": (h.percentile(0.99) or 0.0) * 1000.0,
+                "rows": h.rows,
+                "bytes": h.bytes,
+            }
+            for name, h in _histograms.items()
+        ]
+    return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+
+def reset() -> None:
+    with _lock:
+        _histograms.clear()
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(namespace: str = "civicguardian") -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        items = sorted((name, h.buckets[:], h.count, h.sum, h.rows, h.bytes, h.errors) for name, h in _histograms.items())
+    duration = f"{namespace}_call_duration_seconds"
+    lines = [f"# HELP {duration} Latency of instrumented calls.", f"# TYPE {duration} histogram"]
+    for name, buckets, count, total, _, _, _ in items:
+        label = f'name="{_label(name)}"'
+        cumulative = 0
+        for bound, n in zip(BUCKETS, buckets):
+            cumulative += n
+            lines.append(f'{duration}_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'{duration}_bucket{{{label},le="+Inf"}} {count}')
+        lines.append(f"{duration}_sum{{{label}}} {total}")
+        lines.append(f"{duration}_count{{{label}}} {count}")
+    for metric, index, help_text in (
+        ("rows_read_total", 4, "Rows returned by instrumented calls."),
+        ("bytes_read_total", 5, "Bytes returned by instrumented calls."),
+        ("call_errors_total", 6, "Instrumented calls that raised."),
+    ):
+        full = f"{namespace}_{metric}"
+        lines += [f"# HELP {full} {help_text}", f"# TYPE {full} counter"]
+        lines += [f'{full}{{name="{_label(item[0])}"}} {item[index]}' for item in items]
+    return "\n".join(lines) + "\n"
+
+
+def serve(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve prometheus_text() at /metrics from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
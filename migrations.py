@@ -0,0 +1,199 @@
+# migrations.py
+"""
+Versioned schema migrations.
+
+Applied versions are recorded in ``schema_migrations``; run_migrations() only
+runs the ones that are missing, and every step also checks the live schema
+before changing it, so running it again (or on a database created by
+create_all with the current models) is harmless.
+"""
+from datetime import datetime
+from typing import Callable, List, Sequence, Tuple
+
+from sqlalchemy import MetaData, Table, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+# version, description, fn(conn, metadata)
+Migration = Tuple[int, str, Callable[[Connection, MetaData], None]]
+
+
+def _column_types(conn: Connection, table: str) -> dict:
+    return {c["name"]: str(c["type"]).upper() for c in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn: Connection, table: Table, name: str) -> None:
+    col_type = table.c[name].type.compile(dialect=conn.dialect)
+    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{name}" {col_type}'))
+
+
+def _add_missing_columns(conn: Connection, metadata: MetaData) -> None:
+    """Add columns introduced after a table was first created (create_all won't)."""
+    insp = inspect(conn)
+    for table in metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name not in existing:
+                _add_column(conn, table, col.name)
+
+
+def _add_columns(
+    conn: Connection, metadata: MetaData, table_name: str, columns: Sequence[str], indexes: Sequence[str] = ()
+) -> None:
+    """Add the named columns of one table, and indexes over them, where missing."""
+    insp = inspect(conn)
+    if not insp.has_table(table_name):
+        return
+    table = metadata.tables[table_name]
+    existing = {c["name"] for c in insp.get_columns(table_name)}
+    for name in columns:
+        if name not in existing:
+            _add_column(conn, table, name)
+    for idx in table.indexes:
+        if idx.name in indexes:
+            idx.create(conn, checkfirst=True)
+
+
+# table -> {column: (SQLite expression converting the old text value, Postgres USING expression)}
+_TYPED_COLUMNS = {
+    "incidents": {
+        "lat": ("CASE WHEN trim(lat) = '' THEN NULL ELSE CAST(lat AS REAL) END", "NULLIF(trim(lat), '')::double precision"),
+        "lng": ("CASE WHEN trim(lng) = '' THEN NULL ELSE CAST(lng AS REAL) END", "NULLIF(trim(lng), '')::double precision"),
+    },
+    "reports": {
+        "latitude": (
+            "CASE WHEN trim(latitude) = '' THEN NULL ELSE CAST(latitude AS REAL) END",
+            "NULLIF(trim(latitude), '')::double precision",
+        ),
+        "longitude": (
+            "CASE WHEN trim(longitude) = '' THEN NULL ELSE CAST(longitude AS REAL) END",
+            "NULLIF(trim(longitude), '')::double precision",
+        ),
+        "date": ("date(date)", "NULLIF(trim(date), '')::date"),
+    },
+    "notifications": {
+        "unread": (
+            "CASE WHEN lower(CAST(unread AS TEXT)) IN ('true', '1') THEN 1 ELSE 0 END",
+            "lower(unread) IN ('true', '1')",
+        ),
+    },
+}
+
+
+def _typed_columns(conn: Connection, metadata: MetaData) -> None:
+    """Convert legacy VARCHAR coordinates/dates/flags to Float, Date and Boolean."""
+    insp = inspect(conn)
+    for table_name, conversions in _TYPED_COLUMNS.items():
+        if not insp.has_table(table_name):
+            continue
+        current = _column_types(conn, table_name)
+        stale = {c: conv for c, conv in conversions.items() if c in current and "CHAR" in current[c]}
+        if not stale:
+            continue
+        table = metadata.tables[table_name]
+        if conn.dialect.name == "sqlite":
+            # SQLite can't change a column type in place: rebuild the table.
+            # Triggers on the old table (e.g. the R*Tree sync) go with it and
+            # are recreated by init_db().
+            old = f"_{table_name}_old"
+            conn.execute(text(f"ALTER TABLE {table_name} RENAME TO {old}"))
+            for idx in insp.get_indexes(old):
+                conn.execute(text(f'DROP INDEX IF EXISTS "{idx["name"]}"'))
+            table.create(conn)
+            cols = [c.name for c in table.columns if c.name in current]
+            exprs = [stale[c][0] if c in stale else f'"{c}"' for c in cols]
+            col_list = ", ".join(f'"{c}"' for c in cols)
+            conn.execute(text(f"INSERT INTO {table_name} ({col_list}) SELECT {', '.join(exprs)} FROM {old}"))
+            conn.execute(text(f"DROP TABLE {old}"))
+        else:
+            for col, (_, using) in stale.items():
+                col_type = table.c[col].type.compile(dialect=conn.dialect)
+                conn.execute(text(f'ALTER TABLE {table_name} ALTER COLUMN "{col}" DROP DEFAULT'))
+                conn.execute(text(f'ALTER TABLE {table_name} ALTER COLUMN "{col}" TYPE {col_type} USING {using}'))
+            if "unread" in stale:
+                conn.execute(text("ALTER TABLE notifications ALTER COLUMN unread SET DEFAULT true"))
+
+
+def _create_missing_indexes(conn: Connection, metadata: MetaData) -> None:
+    for table in metadata.sorted_tables:
+        for idx in table.indexes:
+            idx.create(conn, checkfirst=True)
+
+
+_LEGACY_RECIPIENT = "local"  # db.DEFAULT_USER
+
+
+def _notification_recipients(conn: Connection, metadata: MetaData) -> None:
+    """Address notifications that predate per-user delivery to the default user and count their unread."""
+    insp = inspect(conn)
+    if not (insp.has_table("notifications") and insp.has_table("notification_recipients")):
+        return
+    conn.execute(
+        text(
+            "INSERT INTO notification_recipients (user_id, notification_id, unread) "
+            "SELECT :user, n.id, n.unread FROM notifications n WHERE NOT EXISTS "
+            "(SELECT 1 FROM notification_recipients r WHERE r.notification_id = n.id)"
+        ),
+        {"user": _LEGACY_RECIPIENT},
+    )
+    conn.execute(text("DELETE FROM unread_counts"))
+    conn.execute(
+        text(
+            "INSERT INTO unread_counts (user_id, n) SELECT user_id, COUNT(*) FROM notification_recipients "
+            "WHERE unread = :true GROUP BY user_id"
+        ),
+        {"true": True},
+    )
+
+
+def _report_client_ids(conn: Connection, metadata: MetaData) -> None:
+    """reports.client_id and its unique index, for idempotent batched submissions."""
+    _add_columns(conn, metadata, "reports", ["client_id"], ["ux_reports_client_id"])
+
+
+def _report_incident_links(conn: Connection, metadata: MetaData) -> None:
+    """reports.incident_id/duplicate_of/photo_dhash for near-duplicate linking (older reports stay unlinked)."""
+    _add_columns(conn, metadata, "reports", ["incident_id", "duplicate_of", "photo_dhash"], ["ix_reports_incident_id"])
+
+
+MIGRATIONS: List[Migration] = [
+    (1, "add columns missing from older tables", _add_missing_columns),
+    (2, "typed lat/lng, report date and notification unread flag", _typed_columns),
+    (3, "composite (category|status, timestamp) indexes", _create_missing_indexes),
+    (4, "per-user notification recipients and unread counters", _notification_recipients),
+    (5, "client submission ids on reports", _report_client_ids),
+    (6, "report incident and duplicate links", _report_incident_links),
+]
+
+
+def _ensure_version_table(conn: Connection) -> None:
+    conn.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+        )
+    )
+
+
+def applied_versions(conn: Connection) -> set:
+    _ensure_version_table(conn)
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations(engine: Engine, metadata: MetaData) -> List[int]:
+    """Apply pending migrations in order; returns the versions applied now."""
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+    applied = []
+    for version, name, fn in MIGRATIONS:
+        with engine.begin() as conn:
+            if version in applied_versions(conn):
+                continue
+            fn(conn, metadata)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": version, "n": name, "t": datetime.utcnow()},
+            )
+        applied.append(version)
+    return applied
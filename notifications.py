@@ -0,0 +1,151 @@
+# notifications.py
+"""
+Notification fan-out: database, open sessions and browsers.
+
+send() writes a notification with one delivery row and unread-counter bump
+per recipient (db.add_notification), then deliver()s it: publishes it on
+the in-process ``broadcaster`` so every open session of those users picks
+it up from its inbox without querying the database, and pushes it to the
+users' browser subscriptions (push.py).
+
+The app uses send_later() instead (from the "notify" job in jobs.py): it stores
+the notification together with a "deliver_notification" job, so a failed
+delivery is retried on its own and never stores the notification twice.
+
+The broadcaster only reaches sessions served by the same process; sessions
+elsewhere notice the change through db.get_unread_count(). It holds inboxes
+weakly, so an inbox goes away with the session state that owns it.
+"""
+import logging
+import queue
+import threading
+import weakref
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import db
+import push
+
+log = logging.getLogger(__name__)
+
+INBOX_SIZE = 100  # a session that lets this many alerts pile up is considered gone
+
+
+class Inbox:
+    """One session's subscription: a bounded queue of published events."""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=INBOX_SIZE)
+
+    def put(self, event: Dict) -> bool:
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            return False
+
+    def drain(self) -> List[Dict]:
+        """All events received since the last call, oldest first (never blocks)."""
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
+
+
+class Broadcaster:
+    """In-process pub/sub from notification writers to the sessions of each user."""
+
+    def __init__(self):
+        self._inboxes: Dict[str, "weakref.WeakSet[Inbox]"] = defaultdict(weakref.WeakSet)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: str) -> Inbox:
+        """A new inbox for ``user_id``; the caller keeps it alive (e.g. in session state)."""
+        inbox = Inbox(user_id)
+        with self._lock:
+            self._inboxes[user_id].add(inbox)
+        return inbox
+
+    def unsubscribe(self, inbox: Inbox) -> None:
+        with self._lock:
+            inboxes = self._inboxes.get(inbox.user_id)
+            if inboxes is not None:
+                inboxes.discard(inbox)
+                if not inboxes:
+                    del self._inboxes[inbox.user_id]
+
+    def publish(self, user_id: str, event: Dict) -> int:
+        """Queue ``event`` for every session of ``user_id``; returns how many received it."""
+        with self._lock:
+            inboxes = list(self._inboxes.get(user_id, ()))
+        delivered = 0
+        for inbox in inboxes:
+            if inbox.put(event):
+                delivered += 1
+            else:
+                # nobody has drained it for a long time: the session has ended
+                self.unsubscribe(inbox)
+        return delivered
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(v) for v in self._inboxes.values())
+
+
+broadcaster = Broadcaster()
+
+
+def send(title: str, desc: Optional[str], recipients: Optional[Sequence[str]] = None, time_str: str = "Just now") -> int:
+    """Store a notification for ``recipients`` (default db.DEFAULT_USER) and deliver it; returns its id."""
+    recipients = list(dict.fromkeys(recipients or (db.DEFAULT_USER,)))
+    notification_id = db.add_notification(title, desc, time_str, unread=True, recipients=recipients)
+    deliver({"notification_id": notification_id, "title": title, "desc": desc, "time": time_str, "recipients": recipients})
+    return notification_id
+
+
+def send_later(title: str, desc: Optional[str], recipients: Optional[Sequence[str]] = None, time_str: str = "Just now") -> int:
+    """Store a notification and, in the same transaction, a job that delivers it; returns its id."""
+    recipients = list(dict.fromkeys(recipients or (db.DEFAULT_USER,)))
+    job = {"title": title, "desc": desc, "time": time_str, "recipients": recipients}
+    return db.add_notification(title, desc, time_str, unread=True, recipients=recipients, jobs=[("deliver_notification", job)])
+
+
+def deliver(payload: Dict) -> None:
+    """
+    Publish a stored notification to its recipients' open sessions and push
+    it to their browsers. ``payload`` is a "deliver_notification" job's:
+    notification_id, title, desc, time and recipients. Running it twice shows
+    the alert twice at most (sessions skip ids they already have).
+    """
+    notification = {
+        "id": payload["notification_id"],
+        "title": payload["title"],
+        "desc": payload.get("desc"),
+        "time": payload.get("time", "Just now"),
+        "unread": True,
+        "timestamp": datetime.utcnow(),
+    }
+    for user_id in payload["recipients"]:
+        broadcaster.publish(user_id, {"notification": notification, "unread_count": db.get_unread_count(user_id)})
+    push_to_browsers(payload["recipients"], notification)
+
+
+def push_to_browsers(recipients: Sequence[str], notification: Dict) -> int:
+    """Web Push a notification to every subscription of the recipients; returns deliveries accepted."""
+    payload = {"title": notification["title"], "body": notification.get("desc") or "", "id": notification["id"]}
+    accepted = 0
+    for sub in db.get_push_subscriptions(recipients):
+        try:
+            status = push.send_push(sub, payload)
+        except Exception:
+            log.warning("push to %s failed", sub["endpoint"], exc_info=True)
+            continue
+        if status in push.GONE:
+            db.remove_push_subscription(sub["endpoint"])
+        elif 200 <= status < 300:
+            accepted += 1
+    return accepted
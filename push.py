@@ -0,0 +1,151 @@
+# push.py
+"""
+Web Push delivery of notifications to subscribed browsers.
+
+A subscription is the JSON a browser's ``pushManager.subscribe()`` returns
+({"endpoint": ..., "keys": {"p256dh": ..., "auth": ...}}). The PWA
+(script.js) subscribes with the key from GET /api/push-subscriptions and
+POSTs the result back, and api.py stores it with db.add_push_subscription().
+send_push() delivers one message:
+
+* with pywebpush installed and VAPID_PRIVATE_KEY set, the payload is
+  encrypted and signed (RFC 8291/8292) and sent to the browser's push
+  service, which wakes sw.js;
+* otherwise the payload is POSTed as plain JSON. Real push services reject
+  that, but LocalPushGateway below accepts it: a stand-in push service for
+  development and tests (``python push.py`` runs one).
+
+Environment:
+    VAPID_PUBLIC_KEY     base64url public half, handed to browsers by api.py
+    VAPID_PRIVATE_KEY    VAPID key (PEM or base64url) for real push services
+    VAPID_SUBJECT        contact claim, e.g. mailto:ops@example.org
+"""
+import json
+import os
+import secrets
+import threading
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+try:
+    from pywebpush import WebPushException, webpush
+except ImportError:  # encrypted delivery needs pywebpush
+    webpush = WebPushException = None
+
+PUSH_TTL = 3600  # seconds a push service may hold an undelivered message
+GONE = (404, 410)  # the subscription no longer exists
+
+
+def send_push(subscription: Dict, payload: Dict, timeout: float = 5.0) -> int:
+    """Deliver ``payload`` to one subscription; returns the push service's HTTP status."""
+    data = json.dumps(payload, default=str)
+    private_key = os.getenv("VAPID_PRIVATE_KEY")
+    if webpush is not None and private_key and (subscription.get("keys") or {}).get("p256dh"):
+        try:
+            response = webpush(
+                subscription_info=subscription,
+                data=data,
+                vapid_private_key=private_key,
+                vapid_claims={"sub": os.getenv("VAPID_SUBJECT", "mailto:admin@localhost")},
+                ttl=PUSH_TTL,
+                timeout=timeout,
+            )
+            return response.status_code
+        except WebPushException as e:
+            if e.response is not None:
+                return e.response.status_code
+            raise
+    request = urllib.request.Request(
+        subscription["endpoint"],
+        data=data.encode("utf-8"),
+        headers={"Content-Type": "application/json", "TTL": str(PUSH_TTL)},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+class LocalPushGateway:
+    """
+    In-process stand-in for a push service. POST /push/<token> queues a
+    message for that subscription; GET /push/<token> returns and clears the
+    queued messages (what a browser's push service would hand to sw.js).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._messages: Dict[str, List] = defaultdict(list)
+        self._lock = threading.Lock()
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _token(self) -> Optional[str]:
+                parts = self.path.strip("/").split("/")
+                return parts[1] if len(parts) == 2 and parts[0] == "push" else None
+
+            def do_POST(self):
+                token = self._token()
+                if token is None:
+                    self.send_error(404)
+                    return
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                with gateway._lock:
+                    gateway._messages[token].append(json.loads(body or b"null"))
+                self.send_response(201)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_GET(self):
+                token = self._token()
+                if token is None:
+                    self.send_error(404)
+                    return
+                body = json.dumps(gateway.take(token)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "LocalPushGateway":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="push-gateway", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def new_subscription(self) -> Dict:
+        """A subscription pointing at this gateway, shaped like pushManager.subscribe()'s."""
+        return {"endpoint": f"{self.url}/push/{secrets.token_urlsafe(16)}", "keys": {}}
+
+    def take(self, token: str) -> List:
+        with self._lock:
+            return self._messages.pop(token, [])
+
+
+if __name__ == "__main__":
+    gateway = LocalPushGateway(port=int(os.getenv("PUSH_GATEWAY_PORT", "8765"))).start()
+    print(f"Local push gateway on {gateway.url}")
+    print("Example subscription:", json.dumps(gateway.new_subscription()))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        gateway.stop()
@@ -0,0 +1,292 @@
+# retention.py
+"""
+Retention: archive old rows out of the hot tables, prune bookkeeping and
+compact the SQLite file.
+
+    python retention.py              # archive, prune and compact now
+    python retention.py --dry-run    # only count what would be archived/pruned
+
+Each archived table has a policy (POLICIES): rows it selects that are older
+than the table's retention period are copied into a per-month SQLite file
+under ARCHIVE_DIR (``reports-2024-05.db``, same schema as the live table)
+and then deleted from the hot table in batches. The delete is logged like
+any other, so caches and API clients drop the rows; summary and hotspot
+counters are all-time totals and keep counting them (their rebuilds read
+the archive too). Archived rows stay readable through db.get_archived().
+
+change_log entries past their retention are pruned, except the latest one
+of each table (it carries the table's version for ETags and feeds); a
+client whose cursor is older than what is left gets a reset. Finished jobs
+past theirs are deleted. compact() switches SQLite to incremental
+auto-vacuum once and then returns free pages to the filesystem.
+
+Environment:
+    ARCHIVE_DIR                   partition files (default data/archive)
+    RETENTION_REPORTS_DAYS        resolved reports older than this (default 180)
+    RETENTION_INCIDENTS_DAYS      incidents older than this (default 365)
+    RETENTION_NOTIFICATIONS_DAYS  notifications older than this (default 90)
+    RETENTION_CHANGE_LOG_DAYS     change_log entries (default 30)
+    RETENTION_JOB_DAYS            done jobs (default 7)
+A value of 0 turns that step off.
+"""
+import argparse
+import glob
+import os
+import re
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, create_engine, delete, func, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+import db
+from db import ChangeLog, Incident, Job, Notification, NotificationRecipient, Report, SessionLocal
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR") or os.path.join(db.DATA_DIR, "archive")
+BATCH_SIZE = 1000
+
+# table -> (model, env var, default days, rows eligible once older than the cutoff)
+POLICIES = {
+    "reports": (
+        Report,
+        "RETENTION_REPORTS_DAYS",
+        180,
+        lambda cutoff: and_(Report.status == "resolved", Report.timestamp < cutoff),
+    ),
+    "incidents": (Incident, "RETENTION_INCIDENTS_DAYS", 365, lambda cutoff: Incident.timestamp < cutoff),
+    "notifications": (Notification, "RETENTION_NOTIFICATIONS_DAYS", 90, lambda cutoff: Notification.timestamp < cutoff),
+}
+# rows archived with their parent: table -> [(child model, column holding the parent id)]
+CHILDREN = {"notifications": [(NotificationRecipient, "notification_id")]}
+PRUNE_DEFAULTS = {"change_log": ("RETENTION_CHANGE_LOG_DAYS", 30), "jobs": ("RETENTION_JOB_DAYS", 7)}
+
+_engines: Dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def retention_days(name: str) -> int:
+    """Days a table (or "change_log"/"jobs") keeps rows in the hot database; 0 = forever."""
+    env, default = POLICIES[name][1:3] if name in POLICIES else PRUNE_DEFAULTS[name]
+    try:
+        return int(os.getenv(env, default))
+    except ValueError:
+        return default
+
+
+def partition_path(table: str, month: str) -> str:
+    return os.path.join(ARCHIVE_DIR, f"{table}-{month}.db")
+
+
+def partitions(table: str, start: Optional[date] = None, end: Optional[date] = None) -> List[Tuple[str, str]]:
+    """(month "YYYY-MM", path) of a table's archive files, oldest first, limited to months overlapping start..end."""
+    found = []
+    for path in glob.glob(os.path.join(ARCHIVE_DIR, f"{table}-*.db")):
+        m = re.fullmatch(rf"{re.escape(table)}-(\d{{4}}-\d{{2}})\.db", os.path.basename(path))
+        if not m:
+            continue
+        month = m.group(1)
+        if start is not None and month < start.strftime("%Y-%m"):
+            continue
+        if end is not None and month > end.strftime("%Y-%m"):
+            continue
+        found.append((month, path))
+    return sorted(found)
+
+
+def _engine(table: str, path: str) -> Engine:
+    """Engine for one partition file, creating it (and any newer columns) on first use."""
+    with _engines_lock:
+        engine = _engines.get(path)
+        if engine is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            engine = create_engine(f"sqlite:///{path}", future=True, poolclass=NullPool)
+            with engine.begin() as conn:
+                for model in [POLICIES[table][0]] + [child for child, _ in CHILDREN.get(table, [])]:
+                    model.__table__.create(conn, checkfirst=True)
+                    # partitions written before a migration lack its new columns
+                    existing = {c["name"] for c in inspect(conn).get_columns(model.__tablename__)}
+                    for col in model.__table__.columns:
+                        if col.name not in existing:
+                            col_type = col.type.compile(dialect=conn.dialect)
+                            conn.execute(text(f'ALTER TABLE {model.__tablename__} ADD COLUMN "{col.name}" {col_type}'))
+            _engines[path] = engine
+        return engine
+
+
+@contextmanager
+def archive_sessions(table: str, start: Optional[date] = None, end: Optional[date] = None) -> Iterator[List[Session]]:
+    """ORM sessions on a table's archive partitions (query them with the usual models)."""
+    sessions = [Session(bind=_engine(table, path)) for _, path in partitions(table, start, end)]
+    try:
+        yield sessions
+    finally:
+        for sess in sessions:
+            sess.close()
+
+
+def archived_rows(
+    table: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    **equals,
+) -> List:
+    """
+    Archived model instances of a table with start <= timestamp < end and
+    columns equal to ``equals``, oldest partition first. See db.get_archived().
+    """
+    model = POLICIES[table][0]
+    out = []
+    with archive_sessions(table, start and start.date(), end and end.date()) as sessions:
+        for sess in sessions:
+            q = sess.query(model)
+            if start is not None:
+                q = q.filter(model.timestamp >= start)
+            if end is not None:
+                q = q.filter(model.timestamp < end)
+            for column, value in equals.items():
+                q = q.filter(getattr(model, column) == value)
+            q = q.order_by(model.id)
+            if limit is not None:
+                q = q.limit(limit - len(out))
+            out.extend(q.all())
+            if limit is not None and len(out) >= limit:
+                break
+    return out
+
+
+def _month(ts: Optional[datetime]) -> str:
+    return ts.strftime("%Y-%m") if ts else "0000-00"
+
+
+def _write_partitions(table: str, rows: List[Dict], children: Dict[str, List[Dict]]) -> None:
+    """Copy rows (and their children) into their month's partition; replaces rows already there."""
+    by_month: Dict[str, List[Dict]] = {}
+    month_of = {}
+    for row in rows:
+        month_of[row["id"]] = _month(row["timestamp"])
+        by_month.setdefault(month_of[row["id"]], []).append(row)
+    for month, month_rows in by_month.items():
+        engine = _engine(table, partition_path(table, month))
+        with engine.begin() as conn:
+            conn.execute(POLICIES[table][0].__table__.insert().prefix_with("OR REPLACE"), month_rows)
+            for child, column in CHILDREN.get(table, []):
+                child_rows = [r for r in children[child.__tablename__] if month_of[r[column]] == month]
+                if child_rows:
+                    conn.execute(child.__table__.insert().prefix_with("OR REPLACE"), child_rows)
+
+
+def archive_table(table: str, now: Optional[datetime] = None, batch_size: int = BATCH_SIZE) -> int:
+    """Move a table's rows past retention into the archive; returns how many moved."""
+    days = retention_days(table)
+    if days <= 0:
+        return 0
+    model, _, _, eligible = POLICIES[table]
+    cutoff = (now or datetime.utcnow()) - timedelta(days=days)
+    moved = 0
+    while True:
+        sess = SessionLocal()
+        try:
+            ids = [i for (i,) in sess.query(model.id).filter(eligible(cutoff)).order_by(model.id).limit(batch_size)]
+            if not ids:
+                break
+            tbl = model.__table__
+            rows = [dict(r) for r in sess.execute(select(tbl).where(tbl.c.id.in_(ids))).mappings()]
+            children = {}
+            for child, column in CHILDREN.get(table, []):
+                ct = child.__table__
+                children[ct.name] = [dict(r) for r in sess.execute(select(ct).where(ct.c[column].in_(ids))).mappings()]
+        finally:
+            sess.close()
+        # archive first: if the delete below fails, the next run copies the same rows again
+        _write_partitions(table, rows, children)
+        moved += db.remove_archived_rows(table, ids)
+    return moved
+
+
+def prune_change_log(now: Optional[datetime] = None) -> int:
+    """Delete old change_log entries, keeping each table's latest; returns how many."""
+    days = retention_days("change_log")
+    if days <= 0:
+        return 0
+    cutoff = (now or datetime.utcnow()) - timedelta(days=days)
+    latest = select(func.max(ChangeLog.seq)).group_by(ChangeLog.table_name)
+    stmt = delete(ChangeLog).where(ChangeLog.changed_at < cutoff, ChangeLog.seq.not_in(latest))
+    with db.engine.begin() as conn:
+        return conn.execute(stmt).rowcount or 0
+
+
+def prune_jobs(now: Optional[datetime] = None) -> int:
+    """Delete finished jobs last updated before the cutoff (failed ones stay for inspection)."""
+    days = retention_days("jobs")
+    if days <= 0:
+        return 0
+    cutoff = (now or datetime.utcnow()) - timedelta(days=days)
+    with db.engine.begin() as conn:
+        return conn.execute(delete(Job).where(Job.status == "done", Job.updated_at < cutoff)).rowcount or 0
+
+
+def compact(max_pages: int = 0) -> Dict:
+    """
+    Return free pages of the SQLite file to the filesystem (all of them with
+    max_pages=0). The first call on a database created without incremental
+    auto-vacuum converts it with one full VACUUM. No-op on other databases.
+    """
+    if db.engine.dialect.name != "sqlite":
+        return {}
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        converted = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2
+        if converted:
+            conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")
+        free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        conn.exec_driver_sql(f"PRAGMA incremental_vacuum({int(max_pages)})")
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        left = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+        pages = conn.exec_driver_sql("PRAGMA page_count").scalar()
+    return {"converted": converted, "freed_pages": free - left, "size_bytes": pages * page_size}
+
+
+def pending(now: Optional[datetime] = None) -> Dict[str, int]:
+    """Rows each table would archive right now."""
+    now = now or datetime.utcnow()
+    out = {}
+    sess = SessionLocal()
+    try:
+        for table, (model, _, _, eligible) in POLICIES.items():
+            days = retention_days(table)
+            out[table] = sess.query(func.count(model.id)).filter(eligible(now - timedelta(days=days))).scalar() if days > 0 else 0
+    finally:
+        sess.close()
+    return out
+
+
+def run(now: Optional[datetime] = None, tables: Sequence[str] = tuple(POLICIES), vacuum: bool = True) -> Dict:
+    """Archive every table, prune bookkeeping and compact; returns what each step did."""
+    result = {f"archived_{table}": archive_table(table, now) for table in tables}
+    result["pruned_change_log"] = prune_change_log(now)
+    result["pruned_jobs"] = prune_jobs(now)
+    if vacuum:
+        result["compact"] = compact()
+    for table in ("reports", "incidents", "notifications"):
+        if result.get(f"archived_{table}"):
+            db.refresh_cached(table)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only count the rows that would be archived")
+    parser.add_argument("--no-vacuum", action="store_true", help="skip compacting the database file")
+    args = parser.parse_args()
+    db.init_db()
+    print(pending() if args.dry_run else run(vacuum=not args.no_vacuum))
+
+
+if __name__ == "__main__":
+    main()
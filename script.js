@@ -1,4 +1,11 @@
 // CivicGuardian App JavaScript
+const API_BASE = '/api';                    // api.py
+const REPORTS_PAGE_SIZE = 50;               // newest reports kept on the device
+const REPORTS_POLL_MS = 60000;
+const OUTBOX_BATCH_SIZE = 100;              // api.MAX_BATCH
+const OUTBOX_KEY = 'civicGuardianOutbox';
+const LEGACY_REPORTS_KEY = 'civicGuardianReports';
+
 class CivicGuardianApp {
     constructor() {
         this.map = null;
@@ -6,6 +13,10 @@ class CivicGuardianApp {
         this.currentLocation = null;
         this.incidents = [];
         this.reports = [];
+        this.serverReports = [];
+        this.reportsVersion = null;
+        this.outbox = [];
+        this.flushing = null;
         this.notifications = [];
         this.currentScreen = 'home';
         this.init();
@@ -16,9 +27,16 @@ class CivicGuardianApp {
         setInterval(() => this.updateTime(), 60000);
         
         this.setupEventListeners();
-        this.loadStoredData();
+        this.loadOutbox();
+        this.loadReports();
+        setInterval(() => this.syncReports(), REPORTS_POLL_MS);
+        window.addEventListener('online', () => this.syncReports());
         this.loadSampleData();
         this.loadNotifications();
+        if (window.Notification && Notification.permission === 'granted') {
+            // already allowed: re-register, in case the server lost the subscription
+            this.subscribePush();
+        }
         
         // Initialize maps after a short delay to ensure DOM is ready
         setTimeout(() => {
@@ -264,7 +282,10 @@ class CivicGuardianApp {
         // Notification bell
         const notificationBell = document.querySelector('.nav-icons .fa-bell');
         if (notificationBell) {
-            notificationBell.addEventListener('click', () => this.showScreen('notifications'));
+            notificationBell.addEventListener('click', () => {
+                this.showScreen('notifications');
+                this.subscribePush();
+            });
         }
 
         // Map controls
@@ -519,22 +540,23 @@ class CivicGuardianApp {
         submitBtn.textContent = 'Submitting...';
         submitBtn.disabled = true;
 
-        // Simulate API call
-        setTimeout(() => {
-            const newReport = {
-                id: Date.now(),
-                type: incidentType,
-                description: description,
-                location: location || 'Current Location',
-                timestamp: new Date().toISOString(),
-                status: 'pending'
-            };
+        // Queue the report and send it; without a connection it stays queued
+        const report = {
+            localId: Date.now(),
+            client_id: this.newClientId(),
+            category: incidentType,
+            description: location ? `${description} (Location: ${location})` : description,
+            latitude: this.currentLocation ? this.currentLocation.lat : null,
+            longitude: this.currentLocation ? this.currentLocation.lng : null,
+            timestamp: new Date().toISOString()
+        };
+        this.outbox.push(report);
+        this.saveOutbox();
+        this.renderReports();
 
-            this.reports.push(newReport);
-            this.saveStoredData();
-            this.updateAdminDashboard();
-            
-            this.showMessage('Incident reported successfully!', 'success');
+        this.syncReports().then(() => {
+            const queued = this.outbox.some(item => item.client_id === report.client_id);
+            this.showMessage(queued ? 'You are offline. The report will be sent when you reconnect.' : 'Incident reported successfully!', 'success');
             this.showScreen('home');
             
             // Reset form
@@ -544,7 +566,7 @@ class CivicGuardianApp {
             // Reset button
             submitBtn.textContent = originalText;
             submitBtn.disabled = false;
-        }, 1500);
+        });
     }
 
     showMessage(message, type) {
@@ -791,24 +813,213 @@ class CivicGuardianApp {
         });
     }
 
-    loadStoredData() {
-        try {
-            const storedReports = localStorage.getItem('civicGuardianReports');
-            if (storedReports) {
-                this.reports = JSON.parse(storedReports);
+    // Reports come from the API: the newest page once, then only what changed
+    // since the version that page returned. Reports not yet sent wait in a
+    // small outbox in localStorage and go out in one batch when online.
+    toReport(row) {
+        let timestamp = row.timestamp || '';
+        if (timestamp && !/(Z|[+-]\d\d:\d\d)$/.test(timestamp)) {
+            timestamp = timestamp.replace(/(\.\d{3})\d+$/, '$1') + 'Z'; // server times are UTC
+        }
+        const hasPosition = row.latitude != null && row.longitude != null;
+        return {
+            id: row.id,
+            type: row.category,
+            description: row.description,
+            location: hasPosition ? `${Number(row.latitude).toFixed(5)}, ${Number(row.longitude).toFixed(5)}` : 'Unknown location',
+            timestamp: timestamp,
+            status: row.status || 'pending'
+        };
+    }
+
+    renderReports() {
+        const queued = this.outbox.map(item => Object.assign(this.toReport(item), { id: item.localId, queued: true }));
+        this.reports = this.serverReports.concat(queued);
+        this.updateAdminDashboard();
+    }
+
+    mergeReports(rows, deleted = []) {
+        const byId = new Map(this.serverReports.map(report => [report.id, report]));
+        deleted.forEach(id => byId.delete(id));
+        rows.forEach(row => byId.set(row.id, this.toReport(row)));
+        this.serverReports = Array.from(byId.values())
+            .sort((a, b) => new Date(a.timestamp) - new Date(b.timestamp) || a.id - b.id)
+            .slice(-REPORTS_PAGE_SIZE);
+        this.renderReports();
+    }
+
+    fetchJson(url, options) {
+        return fetch(url, options).then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
             }
+            return response.json();
+        });
+    }
+
+    loadReports(fresh = false) {
+        // the service worker may answer from its cache; the changes feed then catches up
+        return this.flushOutbox()
+            .then(() => this.fetchJson(`${API_BASE}/reports?limit=${REPORTS_PAGE_SIZE}`, fresh ? { cache: 'no-cache' } : undefined))
+            .then(data => {
+                this.serverReports = [];
+                this.reportsVersion = data.version;
+                this.mergeReports(data.rows);
+                return fresh ? null : this.syncReports();
+            })
+            .catch(error => {
+                console.log('Error loading reports:', error);
+                this.renderReports();
+            });
+    }
+
+    syncReports() {
+        if (this.reportsVersion === null) {
+            return this.loadReports();
+        }
+        return this.flushOutbox()
+            .then(() => this.fetchJson(`${API_BASE}/reports/changes?since=${this.reportsVersion}`))
+            .then(delta => {
+                if (delta.reset) {
+                    // too far behind, or a different database: list again
+                    return this.loadReports(true);
+                }
+                this.reportsVersion = delta.cursor;
+                if (delta.rows.length || delta.deleted.length) {
+                    this.mergeReports(delta.rows, delta.deleted);
+                }
+            })
+            .catch(error => console.log('Error syncing reports:', error));
+    }
+
+    subscribePush() {
+        // Web Push alerts (sw.js shows them); only when the server has a VAPID key (push.py)
+        if (!('serviceWorker' in navigator) || !('PushManager' in window) || !window.Notification) {
+            return Promise.resolve();
+        }
+        return this.fetchJson(`${API_BASE}/push-subscriptions`)
+            .then(({ public_key: publicKey }) => {
+                if (!publicKey) {
+                    return null;
+                }
+                return Notification.requestPermission().then(permission => {
+                    if (permission !== 'granted') {
+                        return null;
+                    }
+                    return navigator.serviceWorker.ready.then(registration =>
+                        registration.pushManager.getSubscription().then(existing => existing || registration.pushManager.subscribe({
+                            userVisibleOnly: true,
+                            applicationServerKey: base64UrlToBytes(publicKey)
+                        }))
+                    );
+                });
+            })
+            .then(subscription => subscription && fetch(`${API_BASE}/push-subscriptions`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(subscription)
+            }).then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+            }))
+            .catch(error => console.log('Push subscription failed:', error));
+    }
+
+    newClientId() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    }
+
+    loadOutbox() {
+        try {
+            this.outbox = JSON.parse(localStorage.getItem(OUTBOX_KEY) || '[]');
+            // reports saved by earlier versions never reached the server: queue them once
+            const legacy = JSON.parse(localStorage.getItem(LEGACY_REPORTS_KEY) || '[]');
+            legacy.filter(report => report.type && report.description).forEach(report => this.outbox.push({
+                localId: report.id,
+                client_id: `legacy-${report.id}`,
+                category: report.type,
+                description: report.location ? `${report.description} (Location: ${report.location})` : report.description,
+                timestamp: report.timestamp
+            }));
+            localStorage.removeItem(LEGACY_REPORTS_KEY);
+            this.saveOutbox();
         } catch (error) {
-            console.log('Error loading stored data:', error);
+            console.log('Error loading outbox:', error);
         }
     }
 
-    saveStoredData() {
+    saveOutbox() {
         try {
-            localStorage.setItem('civicGuardianReports', JSON.stringify(this.reports));
+            localStorage.setItem(OUTBOX_KEY, JSON.stringify(this.outbox));
         } catch (error) {
-            console.log('Error saving data:', error);
+            console.log('Error saving outbox:', error);
         }
     }
+
+    postReports(items) {
+        // resolves to the client_ids the server is done with: stored, or rejected as invalid
+        // (retrying those would fail the same way); anything else stays queued
+        return fetch(`${API_BASE}/reports`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(items.map(({ localId, ...report }) => report))
+        }).then(response => {
+            if (response.status === 400 && items.length > 1) {
+                // the request as a whole was refused: send the reports one at a time
+                return items.reduce(
+                    (done, item) => done.then(ids => this.postReports([item]).then(more => ids.concat(more))),
+                    Promise.resolve([])
+                );
+            }
+            if (response.status === 400) {
+                return response.json().then(data => {
+                    console.log(`Report ${items[0].client_id} rejected by the server:`, data.error);
+                    return [items[0].client_id];
+                });
+            }
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            return response.json().then(data => data.results.map(result => {
+                if (result.error) {
+                    console.log(`Report ${result.client_id} rejected by the server:`, result.error);
+                }
+                return result.client_id;
+            }));
+        });
+    }
+
+    flushOutbox() {
+        // one request at a time; reports carry a client_id, so a resend is never stored twice
+        if (this.flushing) {
+            return this.flushing;
+        }
+        if (!this.outbox.length || !navigator.onLine) {
+            return Promise.resolve();
+        }
+        this.flushing = this.postReports(this.outbox.slice(0, OUTBOX_BATCH_SIZE))
+            .then(handled => {
+                const done = new Set(handled);
+                this.outbox = this.outbox.filter(item => !done.has(item.client_id));
+                this.saveOutbox();
+                this.renderReports();
+            })
+            .catch(error => console.log('Reports stay queued:', error))
+            .finally(() => {
+                this.flushing = null;
+            });
+        return this.flushing;
+    }
+}
+
+// VAPID keys travel as base64url; pushManager.subscribe() wants the raw bytes
+function base64UrlToBytes(value) {
+    const base64 = (value + '='.repeat((4 - value.length % 4) % 4)).replace(/-/g, '+').replace(/_/g, '/');
+    return Uint8Array.from(atob(base64), c => c.charCodeAt(0));
 }
 
 // Initialize the app when DOM is loaded
@@ -817,5 +1028,12 @@ document.addEventListener('DOMContentLoaded', () => {
     app = new CivicGuardianApp();
 });
 
+// Register the service worker (offline shell, API caching and push)
+if ('serviceWorker' in navigator) {
+    window.addEventListener('load', () => {
+        navigator.serviceWorker.register('sw.js').catch(error => console.log('Service worker registration failed:', error));
+    });
+}
+
 // Make app globally available for onclick handlers
 window.app = app;
\ No newline at end of file
@@ -0,0 +1,98 @@
+# search.py
+"""
+Full-text indexes over report descriptions and incident descriptions.
+
+On SQLite each table gets an external-content FTS5 table (``<table>_fts``,
+rowid = the row's id) kept in sync by triggers, so the text is stored once
+and searches are ranked with bm25(). On PostgreSQL a GIN index over
+to_tsvector('simple', ...) serves the same queries.
+"""
+import re
+from typing import List, Optional
+
+from sqlalchemy import Float, Integer, func, literal_column, text
+
+# table name -> indexed text column
+FTS_TABLES = {
+    "reports": "description",
+    "incidents": "desc",
+}
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def query_words(query: str) -> List[str]:
+    """The words of a free-text query; punctuation and FTS operators are dropped."""
+    return _TOKEN.findall(query or "")
+
+
+def fts_match_query(query: str) -> Optional[str]:
+    """
+    Turn free text into a safe FTS5 MATCH expression: every word must match,
+    the last one as a prefix (search-as-you-type). None if there are no words.
+    """
+    tokens = query_words(query)
+    if not tokens:
+        return None
+    quoted = [f'"{t}"' for t in tokens]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def pg_tsquery_text(query: str) -> Optional[str]:
+    """Same semantics as fts_match_query() in to_tsquery syntax ("a & b:*")."""
+    tokens = query_words(query)
+    if not tokens:
+        return None
+    return " & ".join(tokens[:-1] + [tokens[-1] + ":*"])
+
+
+def ensure_fts_index(conn, table: str) -> None:
+    """Create <table>_fts and its sync triggers if missing (SQLite only)."""
+    col = FTS_TABLES[table]
+    fts = f"{table}_fts"
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": fts}
+    ).first()
+    conn.execute(
+        text(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("{col}", content=\'{table}\', '
+            f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+    )
+    insert_new = f'INSERT INTO {fts}(rowid, "{col}") VALUES (NEW.id, NEW."{col}");'
+    delete_old = f'INSERT INTO {fts}({fts}, rowid, "{col}") VALUES (\'delete\', OLD.id, OLD."{col}");'
+    conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert_new} END"))
+    conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete_old} END"))
+    conn.execute(
+        text(f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF "{col}" ON {table} BEGIN {delete_old} {insert_new} END')
+    )
+    if not exists:
+        # first time: index the rows that predate the triggers
+        conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+
+def fts_matches(table: str, match: str):
+    """Subquery of (rowid, score) for an FTS5 MATCH; lower score = better match."""
+    fts = f"{table}_fts"
+    return (
+        text(f"SELECT rowid, bm25({fts}) AS score FROM {fts} WHERE {fts} MATCH :match")
+        .bindparams(match=match)
+        .columns(rowid=Integer, score=Float)
+        .subquery(f"{fts}_hits")
+    )
+
+
+def ensure_pg_fts_index(conn, table: str) -> None:
+    col = FTS_TABLES[table]
+    conn.execute(
+        text(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_fts ON {table} "
+            f"USING GIN (to_tsvector('simple', coalesce(\"{col}\", '')))"
+        )
+    )
+
+
+def pg_tsvector(column):
+    """Same expression as the GIN index, so the planner can use it."""
+    return func.to_tsvector(literal_column("'simple'"), func.coalesce(column, literal_column("''")))
@@ -0,0 +1,137 @@
+# spatial.py
+"""
+Geometry helpers and the SQLite R*Tree index used for radius/bbox lookups.
+
+On SQLite each indexed table gets a ``<table>_rtree`` virtual table holding
+one zero-area box per row, kept in sync with triggers. Lookups go through the
+R*Tree to get bounding-box candidates, then haversine_km() trims them to the
+exact circle. On PostgreSQL with PostGIS the same tables get a GiST index on
+a geography expression and radius queries run as ST_DWithin in the database.
+"""
+import math
+from typing import Tuple
+
+from sqlalchemy import Column, Float, Integer, MetaData, Table, and_, func, literal_column, text
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = 111.32
+
+# table name -> (latitude column, longitude column)
+INDEXED_TABLES = {
+    "incidents": ("lat", "lng"),
+    "reports": ("latitude", "longitude"),
+}
+
+_rtree_metadata = MetaData()
+
+
+def rtree_table(table: str) -> Table:
+    """SQLAlchemy handle on <table>_rtree (not part of Base.metadata)."""
+    name = f"{table}_rtree"
+    if name in _rtree_metadata.tables:
+        return _rtree_metadata.tables[name]
+    return Table(
+        name,
+        _rtree_metadata,
+        Column("id", Integer, primary_key=True),
+        Column("min_lat", Float),
+        Column("max_lat", Float),
+        Column("min_lng", Float),
+        Column("max_lng", Float),
+    )
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bbox_around(lat: float, lng: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lng, max_lat, max_lng) enclosing a circle of radius_km."""
+    dlat = radius_km / KM_PER_DEG_LAT
+    cos_lat = math.cos(math.radians(lat))
+    dlng = 180.0 if cos_lat < 1e-6 else min(180.0, radius_km / (KM_PER_DEG_LAT * cos_lat))
+    return (max(-90.0, lat - dlat), lng - dlng, min(90.0, lat + dlat), lng + dlng)
+
+
+def bbox_condition(rtree: Table, bbox: Tuple[float, float, float, float]):
+    """R*Tree overlap condition for a (min_lat, min_lng, max_lat, max_lng) box."""
+    min_lat, min_lng, max_lat, max_lng = bbox
+    return and_(
+        rtree.c.max_lat >= min_lat,
+        rtree.c.min_lat <= max_lat,
+        rtree.c.max_lng >= min_lng,
+        rtree.c.min_lng <= max_lng,
+    )
+
+
+def ensure_rtree_index(conn, table: str) -> None:
+    """Create <table>_rtree and its sync triggers if missing (SQLite only)."""
+    lat, lng = INDEXED_TABLES[table]
+    rt = f"{table}_rtree"
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": rt}
+    ).first()
+    has_coords = f"NEW.{lat} IS NOT NULL AND NEW.{lng} IS NOT NULL AND NEW.{lat} <> '' AND NEW.{lng} <> ''"
+    insert_new = (
+        f"INSERT OR REPLACE INTO {rt} (id, min_lat, max_lat, min_lng, max_lng) "
+        f"SELECT NEW.id, CAST(NEW.{lat} AS REAL), CAST(NEW.{lat} AS REAL), "
+        f"CAST(NEW.{lng} AS REAL), CAST(NEW.{lng} AS REAL) WHERE {has_coords};"
+    )
+    conn.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS {rt} USING rtree(id, min_lat, max_lat, min_lng, max_lng)"))
+    conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {rt}_ai AFTER INSERT ON {table} BEGIN {insert_new} END"))
+    conn.execute(
+        text(
+            f"CREATE TRIGGER IF NOT EXISTS {rt}_au AFTER UPDATE OF {lat}, {lng} ON {table} BEGIN "
+            f"DELETE FROM {rt} WHERE id = OLD.id; {insert_new} END"
+        )
+    )
+    conn.execute(
+        text(f"CREATE TRIGGER IF NOT EXISTS {rt}_ad AFTER DELETE ON {table} BEGIN DELETE FROM {rt} WHERE id = OLD.id; END")
+    )
+    if not exists:
+        # first time: index the rows that predate the triggers
+        conn.execute(
+            text(
+                f"INSERT OR REPLACE INTO {rt} (id, min_lat, max_lat, min_lng, max_lng) "
+                f"SELECT id, CAST({lat} AS REAL), CAST({lat} AS REAL), CAST({lng} AS REAL), CAST({lng} AS REAL) "
+                f"FROM {table} WHERE {lat} IS NOT NULL AND {lng} IS NOT NULL AND {lat} <> '' AND {lng} <> ''"
+            )
+        )
+
+
+def _geography_sql(table: str) -> str:
+    lat, lng = INDEXED_TABLES[table]
+    return f"geography(ST_SetSRID(ST_MakePoint({lng}, {lat}), 4326))"
+
+
+def geography_expr(lat_col, lng_col):
+    """SQLAlchemy form of the indexed expression (SRID inlined so the index matches)."""
+    return func.geography(func.ST_SetSRID(func.ST_MakePoint(lng_col, lat_col), literal_column("4326")))
+
+
+def postgis_point(lat: float, lng: float):
+    return func.geography(func.ST_SetSRID(func.ST_MakePoint(float(lng), float(lat)), literal_column("4326")))
+
+
+def postgis_bbox_condition(lat_col, lng_col, bbox: Tuple[float, float, float, float]):
+    min_lat, min_lng, max_lat, max_lng = (float(v) for v in bbox)
+    envelope = func.geography(func.ST_MakeEnvelope(min_lng, min_lat, max_lng, max_lat, literal_column("4326")))
+    return geography_expr(lat_col, lng_col).op("&&")(envelope)
+
+
+def enable_postgis(conn) -> bool:
+    """Try to enable PostGIS (needs privileges); report whether it is available."""
+    try:
+        with conn.begin_nested():
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
+    except Exception:
+        pass
+    return conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'postgis'")).first() is not None
+
+
+def ensure_postgis_index(conn, table: str) -> None:
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_geog ON {table} USING GIST (({_geography_sql(table)}))"))
@@ -0,0 +1,164 @@
+# stats.py
+"""
+Dashboard metrics and group-by counts for reports and incidents.
+
+The dashboard reads the materialized ``summary_counts`` table, which db.py
+updates in the same transaction as every write, so a render costs a handful
+of primary-key lookups whatever the table size. group_counts() and
+live_dashboard_metrics() compute the same numbers straight from the base
+tables with one SQL aggregate each; rebuild_summaries() uses them to
+(re)materialize the summary table.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import and_, case, func, literal, or_
+
+import db
+from db import Incident, Report, SessionLocal, SummaryCount
+
+SOURCES = {"reports": Report, "incidents": Incident}
+
+
+def _coords(source: str):
+    model = SOURCES[source]
+    if source == "reports":
+        return model.latitude, model.longitude
+    return model.lat, model.lng
+
+
+def _today():
+    # timestamps are stored in UTC (datetime.utcnow)
+    return datetime.utcnow().date()
+
+
+def group_counts(source: str, dimension: str, sess=None) -> Dict[str, int]:
+    """Row counts of reports/incidents grouped by a summary dimension, in one query."""
+    if dimension not in db.SUMMARY_DIMENSIONS[source]:
+        raise ValueError(f"Unknown dimension for {source}: {dimension}")
+    model = SOURCES[source]
+    own_session = sess is None
+    sess = sess or SessionLocal()
+    try:
+        if dimension == "all":
+            return {"*": sess.query(func.count(model.id)).scalar() or 0}
+        if dimension == "cell":
+            lat, lng = _coords(source)
+            cols = [db.grid_index(lat, 90.0, db.SUMMARY_CELL_DEG), db.grid_index(lng, 180.0, db.SUMMARY_CELL_DEG)]
+            q = sess.query(*cols, func.count(model.id)).filter(lat.isnot(None), lng.isnot(None))
+            return {f"{cy}:{cx}": n for cy, cx, n in q.group_by(*cols)}
+        if dimension == "day":
+            col = func.date(model.timestamp)
+            q = sess.query(col, func.count(model.id)).filter(model.timestamp.isnot(None))
+            return {str(day)[:10]: n for day, n in q.group_by(col)}
+        col = getattr(model, dimension)
+        q = sess.query(col, func.count(model.id)).filter(col.isnot(None))
+        return {str(key): n for key, n in q.group_by(col)}
+    finally:
+        if own_session:
+            sess.close()
+
+
+def live_dashboard_metrics(today=None) -> Dict:
+    """Dashboard numbers computed from the reports table with a single aggregate query."""
+    today = today or _today()
+    start = datetime.combine(today, time.min)
+    sess = SessionLocal()
+    try:
+        total, today_n, pending, resolved = sess.query(
+            func.count(Report.id),
+            func.sum(case((and_(Report.timestamp >= start, Report.timestamp < start + timedelta(days=1)), 1), else_=0)),
+            func.sum(case((Report.status == "pending", 1), else_=0)),
+            func.sum(case((Report.status == "resolved", 1), else_=0)),
+        ).one()
+    finally:
+        sess.close()
+    return _metrics(total or 0, today_n or 0, pending or 0, resolved or 0)
+
+
+def _metrics(total: int, today: int, pending: int, resolved: int) -> Dict:
+    return {
+        "total": total,
+        "today": today,
+        "pending": pending,
+        "resolved": resolved,
+        "response_rate": (resolved / total * 100) if total else 0.0,
+    }
+
+
+def summary_counts(source: str, dimension: str) -> Dict[str, int]:
+    """Materialized counts for one dimension (keys with a zero count are left out)."""
+    sess = SessionLocal()
+    try:
+        rows = sess.query(SummaryCount.key, SummaryCount.n).filter(
+            SummaryCount.source == source, SummaryCount.dimension == dimension, SummaryCount.n > 0
+        )
+        return {key: n for key, n in rows}
+    finally:
+        sess.close()
+
+
+def dashboard_metrics(today=None) -> Dict:
+    """Reports total/today/pending/resolved and response rate, from the summary table."""
+    day = (today or _today()).isoformat()
+    sess = SessionLocal()
+    try:
+        rows = sess.query(SummaryCount.dimension, SummaryCount.key, SummaryCount.n).filter(
+            SummaryCount.source == "reports",
+            or_(
+                SummaryCount.dimension == "all",
+                and_(SummaryCount.dimension == "status", SummaryCount.key.in_(("pending", "resolved"))),
+                and_(SummaryCount.dimension == "day", SummaryCount.key == day),
+            ),
+        )
+        found = {(dim, key): n for dim, key, n in rows}
+    finally:
+        sess.close()
+    return _metrics(
+        found.get(("all", "*"), 0),
+        found.get(("day", day), 0),
+        found.get(("status", "pending"), 0),
+        found.get(("status", "resolved"), 0),
+    )
+
+
+def rebuild_summaries() -> int:
+    """
+    Recompute summary_counts from the base tables and their archive
+    partitions (see retention.py) in one transaction; returns rows written.
+    """
+    import retention  # imported here: retention builds on db, like this module
+
+    sess = SessionLocal()
+    try:
+        # deleting first takes the write lock, so concurrent writers wait for the rebuild
+        sess.query(SummaryCount).delete()
+        written = 0
+        for source, dimensions in db.SUMMARY_DIMENSIONS.items():
+            with retention.archive_sessions(source) as archived:
+                for dimension in dimensions:
+                    counts = Counter(group_counts(source, dimension, sess))
+                    for archive in archived:
+                        counts.update(group_counts(source, dimension, archive))
+                    for key, n in counts.items():
+                        if n:
+                            sess.add(SummaryCount(source=source, dimension=dimension, key=key, n=n))
+                            written += 1
+        sess.commit()
+        return written
+    finally:
+        sess.close()
+
+
+def ensure_summaries() -> Optional[int]:
+    """Materialize the summaries if the table has never been filled (e.g. an upgraded database)."""
+    sess = SessionLocal()
+    try:
+        filled = sess.query(literal(1)).select_from(SummaryCount).limit(1).first() is not None
+        has_rows = any(sess.query(model.id).limit(1).first() for model in SOURCES.values())
+    finally:
+        sess.close()
+    if filled or not has_rows:
+        return None
+    return rebuild_summaries()
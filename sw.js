@@ -1,9 +1,10 @@
 // Service Worker for CivicGuardian PWA
-const CACHE_NAME = 'civic-guardian-v1';
+const CACHE_NAME = 'civic-guardian-v2';
+const API_CACHE = 'civic-guardian-api-v1';
+const API_CACHE_ENTRIES = 50;
 const urlsToCache = [
     '/',
     '/index.html',
-    '/styles.css',
     '/script.js',
     'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css',
     'https://unpkg.com/leaflet@1.9.4/dist/leaflet.css',
@@ -23,6 +24,17 @@ self.addEventListener('install', event => {
 
 // Fetch event
 self.addEventListener('fetch', event => {
+    if (event.request.method !== 'GET') {
+        return; // submissions always go to the network
+    }
+    const url = new URL(event.request.url);
+    if (url.origin === self.location.origin && url.pathname.startsWith('/api/')) {
+        // change feeds are small and only valid once; listings are served stale-while-revalidate
+        if (!url.pathname.endsWith('/changes')) {
+            event.respondWith(staleWhileRevalidate(event));
+        }
+        return;
+    }
     event.respondWith(
         caches.match(event.request)
             .then(response => {
@@ -39,7 +51,7 @@ self.addEventListener('activate', event => {
         caches.keys().then(cacheNames => {
             return Promise.all(
                 cacheNames.map(cacheName => {
-                    if (cacheName !== CACHE_NAME) {
+                    if (cacheName !== CACHE_NAME && cacheName !== API_CACHE) {
                         console.log('Deleting old cache:', cacheName);
                         return caches.delete(cacheName);
                     }
@@ -48,3 +60,82 @@ self.addEventListener('activate', event => {
         })
     );
 });
+
+// API reads (see api.py): answer from the cache at once and refresh it in
+// the background. The refresh sends the cached ETag, so when nothing changed
+// the server answers 304 with no body. A page asking for fresh data
+// (fetch(..., { cache: 'no-cache' })) waits for the network instead.
+function staleWhileRevalidate(event) {
+    const request = event.request;
+    return caches.open(API_CACHE).then(cache =>
+        cache.match(request).then(cached => {
+            const headers = new Headers();
+            const etag = cached && cached.headers.get('ETag');
+            if (etag) {
+                headers.set('If-None-Match', etag);
+            }
+            const refresh = fetch(request.url, { headers, credentials: 'same-origin', cache: 'no-store' })
+                .then(response => {
+                    if (response.status === 304 && cached) {
+                        return cached;
+                    }
+                    if (response.ok) {
+                        return cache.put(request, response.clone())
+                            .then(() => trimCache(cache))
+                            .then(() => response);
+                    }
+                    return response;
+                })
+                .catch(() => cached || new Response(JSON.stringify({ error: 'offline' }), {
+                    status: 503,
+                    headers: { 'Content-Type': 'application/json' }
+                }));
+            if (cached && request.cache !== 'no-cache' && request.cache !== 'reload') {
+                event.waitUntil(refresh);
+                return cached;
+            }
+            return refresh;
+        })
+    );
+}
+
+// Keep only the most recently stored API responses (keys come oldest first)
+function trimCache(cache) {
+    return cache.keys().then(keys =>
+        Promise.all(keys.slice(0, Math.max(0, keys.length - API_CACHE_ENTRIES)).map(key => cache.delete(key)))
+    );
+}
+
+// Push event: show alerts delivered by the notification service (see push.py)
+self.addEventListener('push', event => {
+    let data = {};
+    try {
+        data = event.data ? event.data.json() : {};
+    } catch (e) {
+        data = { body: event.data ? event.data.text() : '' };
+    }
+    event.waitUntil(
+        self.registration.showNotification(data.title || 'CivicGuardian', {
+            body: data.body || '',
+            tag: data.id ? `notification-${data.id}` : undefined,
+            icon: 'CivicGuardian.png',
+            data: { url: '/' }
+        })
+    );
+});
+
+// Notification click: focus an open app window or open a new one
+self.addEventListener('notificationclick', event => {
+    event.notification.close();
+    const url = (event.notification.data && event.notification.data.url) || '/';
+    event.waitUntil(
+        clients.matchAll({ type: 'window', includeUncontrolled: true }).then(windows => {
+            for (const client of windows) {
+                if ('focus' in client) {
+                    return client.focus();
+                }
+            }
+            return clients.openWindow(url);
+        })
+    );
+});
@@ -0,0 +1,45 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# modules that bind db.SessionLocal or the models at import time
+DB_DEPENDENTS = ("stats", "hotspots", "jobs", "retention", "db_async")
+
+
+def load_db(url: str):
+    """(Re)import db against ``url`` (its engine is built at import time), plus the modules bound to it."""
+    os.environ["DATABASE_URL"] = url
+    import db
+
+    db = importlib.reload(db)
+    for name in DB_DEPENDENTS:
+        if name in sys.modules:
+            importlib.reload(sys.modules[name])
+    return db
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh SQLite database under tmp_path (also the working directory, for ./data blobs)."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("DATABASE_URL", raising=False)  # restored after the test
+    module = load_db(f"sqlite:///{tmp_path / 'reports.db'}")
+    assert module.init_db()
+    yield module
+    module.engine.dispose()
+
+
+@pytest.fixture
+def api_url(db):
+    """Base URL of api.py serving ``db`` on a free port (no job workers)."""
+    import api
+
+    server = api.serve(port=0, workers=False)
+    host, port = server.server_address[:2]
+    yield f"http://{host}:{port}"
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,141 @@
+import gzip
+import http.client
+import json
+import socket
+from urllib.parse import urlsplit
+
+import pytest
+
+
+def _request(api_url, method, path, body=None, headers=None):
+    url = urlsplit(api_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=10)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        conn.close()
+
+
+def _post_json(api_url, path, payload, headers=None):
+    status, headers, body = _request(
+        api_url, "POST", path, json.dumps(payload).encode("utf-8"), {"Content-Type": "application/json", **(headers or {})}
+    )
+    return status, json.loads(body)
+
+
+def _report(client_id, **fields):
+    return {"client_id": client_id, "category": "theft", "description": "Bike stolen", "lat": 10.0, "lng": 20.0, **fields}
+
+
+def test_unchanged_list_is_revalidated_with_304(db, api_url):
+    db.add_report("Ann", "555", "theft", "Bike stolen", 10.0, 20.0, None, None, None)
+    status, headers, body = _request(api_url, "GET", "/api/reports")
+    assert status == 200
+    etag = headers["ETag"]
+    row = json.loads(body)["rows"][0]
+    assert "fullname" not in row and "contact" not in row
+
+    status, headers, body = _request(api_url, "GET", "/api/reports", headers={"If-None-Match": etag})
+    assert (status, body, headers["ETag"]) == (304, b"", etag)
+
+    db.add_report(None, None, "hazard", "Pothole", 10.0, 20.0, None, None, None)
+    status, headers, _ = _request(api_url, "GET", "/api/reports", headers={"If-None-Match": etag})
+    assert status == 200 and headers["ETag"] != etag
+
+
+def test_static_file_is_revalidated_with_304(db, api_url):
+    status, headers, _ = _request(api_url, "GET", "/sw.js")
+    assert status == 200 and not headers["ETag"].startswith("W/")
+    status, _, _ = _request(api_url, "GET", "/sw.js", headers={"If-None-Match": headers["ETag"]})
+    assert status == 304
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["category=bogus", "status=open", "start_date=bad", "end_date=2024-13-01", "limit=-1", "limit=x", "after=nope"],
+)
+def test_bad_filters_are_400(db, api_url, query):
+    status, _, body = _request(api_url, "GET", f"/api/reports?{query}")
+    assert status == 400
+    assert "error" in json.loads(body)
+
+
+def test_batch_gets_one_result_per_report(db, api_url):
+    batch = [_report("bad", category="ufo"), _report("a"), _report("missing", description=None)]
+    status, data = _post_json(api_url, "/api/reports", batch)
+    assert status == 200
+    bad, ok, missing = data["results"]
+    assert bad["client_id"] == "bad" and "error" in bad
+    assert missing["client_id"] == "missing" and "error" in missing
+    assert ok == {"client_id": "a", "id": ok["id"], "created": True}
+    assert [r["id"] for r in db.get_reports()] == [ok["id"]]
+
+
+def test_resubmitted_client_id_is_not_stored_twice(db, api_url):
+    _, first = _post_json(api_url, "/api/reports", [_report("a"), _report("b")])
+    _, again = _post_json(api_url, "/api/reports", [_report("b"), _report("c")])
+    ids = {r["client_id"]: r["id"] for r in first["results"]}
+    assert again["results"][0] == {"client_id": "b", "id": ids["b"], "created": False}
+    assert again["results"][1]["created"] is True
+    assert len(db.get_reports()) == 3
+
+
+def test_gzip_both_ways(db, api_url):
+    body = gzip.compress(json.dumps([_report(f"c{i}", description="x" * 100) for i in range(20)]).encode("utf-8"))
+    status, data = _request_json_gzip(api_url, body)
+    assert status == 200 and all(r["created"] for r in data["results"])
+
+    status, headers, raw = _request(api_url, "GET", "/api/reports", headers={"Accept-Encoding": "gzip"})
+    assert status == 200 and headers["Content-Encoding"] == "gzip"
+    assert len(json.loads(gzip.decompress(raw))["rows"]) == 20
+
+    status, _, _ = _request(
+        api_url, "POST", "/api/reports", b"not gzip", {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    )
+    assert status == 400
+
+
+def _request_json_gzip(api_url, body):
+    status, _, raw = _request(
+        api_url, "POST", "/api/reports", body, {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    )
+    return status, json.loads(raw)
+
+
+def test_malformed_content_length_is_400(db, api_url):
+    status, _, _ = _raw_exchange(api_url, b"POST /api/reports HTTP/1.1\r\nHost: t\r\nContent-Length: ten\r\n\r\n")
+    assert status == 400
+
+
+@pytest.mark.parametrize("path", ["/api/nope", "/api/reports"])
+def test_unread_body_closes_the_connection(db, api_url, monkeypatch, path):
+    import api
+
+    monkeypatch.setattr(api, "MAX_BODY_BYTES", 10)  # /api/reports answers 413 before reading
+    smuggled = b"GET /api/reports HTTP/1.1\r\nHost: t\r\n\r\n"
+    head = f"POST {path} HTTP/1.1\r\nHost: t\r\nContent-Length: {len(smuggled)}\r\n\r\n".encode("ascii")
+    status, headers, raw = _raw_exchange(api_url, head + smuggled)
+    assert status in (404, 413)
+    assert headers.get("connection") == "close"
+    assert raw.count(b"HTTP/1.1 ") == 1  # the body was not answered as a request
+
+
+def _raw_exchange(api_url, data):
+    """Send raw bytes and read until the server closes; returns (first status, its headers, everything read)."""
+    url = urlsplit(api_url)
+    with socket.create_connection((url.hostname, url.port), timeout=2) as sock:
+        sock.sendall(data)
+        raw = b""
+        try:
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                raw += chunk
+        except socket.timeout:
+            pass
+    head = raw.split(b"\r\n\r\n", 1)[0].decode("latin-1").split("\r\n")
+    headers = dict(line.lower().split(": ", 1) for line in head[1:])
+    return int(head[0].split()[1]), headers, raw
@@ -0,0 +1,41 @@
+import pytest
+
+from blobstore import LocalBlobStore, MemoryS3Client, S3BlobStore, sha256_hex
+
+
+@pytest.fixture(params=["local", "s3"])
+def store(request, tmp_path):
+    if request.param == "local":
+        return LocalBlobStore(str(tmp_path / "blobs"))
+    return S3BlobStore(MemoryS3Client(), "photos")
+
+
+def test_round_trip(store):
+    key = store.put(b"photo bytes")
+    assert key == sha256_hex(b"photo bytes")
+    assert store.exists(key)
+    assert store.get(key) == b"photo bytes"
+
+
+def test_same_bytes_stored_once(store):
+    assert store.put(b"same") == store.put(b"same")
+    if isinstance(store, S3BlobStore):
+        assert len(store.client.objects) == 1
+
+
+def test_missing_and_delete(store):
+    missing = sha256_hex(b"never stored")
+    assert store.get(missing) is None
+    assert not store.exists(missing)
+    assert not store.delete(missing)
+
+    key = store.put(b"to delete")
+    assert store.delete(key)
+    assert store.get(key) is None
+    assert not store.exists(key)
+
+
+def test_s3_keys_use_prefix():
+    client = MemoryS3Client()
+    key = S3BlobStore(client, "photos", prefix="p/").put(b"x")
+    assert ("photos", f"p/{key}") in client.objects
@@ -0,0 +1,30 @@
+import inspect
+
+
+def test_every_public_read_has_a_coroutine(db):
+    import db_async
+
+    reads = [
+        name
+        for name, fn in vars(db).items()
+        if inspect.isfunction(fn) and fn.__module__ == "db" and name.startswith(("get_", "query_", "search_", "count_", "read_"))
+    ]
+    assert reads
+    missing = [name for name in reads if not inspect.iscoroutinefunction(getattr(db_async, name, None))]
+    assert missing == []
+
+
+def test_async_reads_match_sync(db):
+    import db_async
+
+    first = db.add_report(None, None, "theft", "Bike stolen near the bakery", 10.0, 20.0, None, None, None)
+    cursor = db.get_reports_since(None)["cursor"]
+    db.add_incident(10.0, 20.0, "theft", "Wallet", "now", "")
+    second = db.add_report(None, None, "hazard", "Pothole", 10.001, 20.0, None, None, None)
+    db.delete_report(first)
+
+    assert db_async.run(db_async.get_reports_since(cursor)) == db.get_reports_since(cursor)
+    assert db_async.run(db_async.read_changes_since("reports", cursor)) == db.read_changes_since("reports", cursor)
+    assert db_async.run(db_async.query_reports(limit=10)) == db.query_reports(limit=10)
+    assert db_async.run(db_async.get_incidents_within(10.0, 20.0, 1.0)) == db.get_incidents_within(10.0, 20.0, 1.0)
+    assert [r["id"] for r in db_async.run(db_async.get_reports())] == [second]
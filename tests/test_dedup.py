@@ -0,0 +1,44 @@
+import threading
+
+
+def test_concurrent_burst_opens_one_incident(db):
+    import jobs
+
+    ids = [
+        db.add_report(None, None, "accident", "Car crash on main street near the bridge", 10.0 + i * 1e-5, 120.0, None, None, None)
+        for i in range(6)
+    ]
+    barrier = threading.Barrier(len(ids))
+
+    def derive(report_id):
+        barrier.wait()
+        jobs._derive_incident({"report_id": report_id})
+
+    threads = [threading.Thread(target=derive, args=(rid,)) for rid in ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    sess = db.SessionLocal()
+    try:
+        incident_ids = {i for (i,) in sess.query(db.Report.incident_id).filter(db.Report.id.in_(ids))}
+        assert len(incident_ids) == 1 and None not in incident_ids
+        assert sess.query(db.Incident).count() == 1
+    finally:
+        sess.close()
+
+
+def test_unrelated_reports_get_their_own_incidents(db):
+    import jobs
+
+    a = db.add_report(None, None, "accident", "Car crash on main street", 10.0, 120.0, None, None, None)
+    b = db.add_report(None, None, "theft", "Bicycle stolen outside the library", 10.0, 120.0, None, None, None)
+    for rid in (a, b):
+        jobs._derive_incident({"report_id": rid})
+    jobs._derive_incident({"report_id": a})  # a retried job keeps the incident
+    sess = db.SessionLocal()
+    try:
+        assert sess.query(db.Incident).count() == 2
+    finally:
+        sess.close()
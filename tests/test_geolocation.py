@@ -0,0 +1,74 @@
+import pytest
+
+import geolocation
+from geolocation import GeolocationService, StaticProvider
+
+DEFAULT = (0.0, 0.0)
+PUBLIC_IP = "8.8.8.8"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(geolocation.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_cache_hit(clock):
+    provider = StaticProvider((51.5, -0.1))
+    service = GeolocationService(provider, DEFAULT, ttl=60)
+    assert service.locate(PUBLIC_IP) == (51.5, -0.1)
+    clock[0] += 59
+    assert service.locate(PUBLIC_IP) == (51.5, -0.1)
+    assert provider.calls == 1
+
+
+def test_cache_expiry(clock):
+    provider = StaticProvider((51.5, -0.1))
+    service = GeolocationService(provider, DEFAULT, ttl=60)
+    service.locate(PUBLIC_IP)
+    clock[0] += 61
+    service.locate(PUBLIC_IP)
+    assert provider.calls == 2
+
+
+def test_failure_falls_back_and_expires_sooner(clock):
+    provider = StaticProvider(None)
+    service = GeolocationService(provider, DEFAULT, ttl=3600, failure_ttl=10)
+    assert service.locate(PUBLIC_IP) == DEFAULT
+    clock[0] += 5
+    service.locate(PUBLIC_IP)
+    assert provider.calls == 1
+    clock[0] += 6
+    service.locate(PUBLIC_IP)
+    assert provider.calls == 2
+
+
+def test_private_clients_share_one_entry(clock):
+    provider = StaticProvider((1.0, 2.0))
+    service = GeolocationService(provider, DEFAULT)
+    service.locate("127.0.0.1")
+    service.locate("192.168.1.20")
+    service.locate(None)
+    assert provider.calls == 1
+
+
+def test_cache_is_bounded(clock):
+    provider = StaticProvider((1.0, 2.0))
+    service = GeolocationService(provider, DEFAULT, ttl=60, max_entries=3)
+    for i in range(5):
+        service.locate(f"8.8.8.{i}")
+    assert len(service._cache) == 3
+    assert "8.8.8.0" not in service._cache and "8.8.8.4" in service._cache
+
+
+def test_expired_entries_evicted_first(clock):
+    provider = StaticProvider((1.0, 2.0))
+    service = GeolocationService(provider, DEFAULT, ttl=60, failure_ttl=1, max_entries=2)
+    service.locate("8.8.8.1")
+    provider.latlng = None
+    service.locate("8.8.8.2")  # failure, expires after 1s
+    clock[0] += 2
+    provider.latlng = (1.0, 2.0)
+    service.locate("8.8.8.3")
+    assert list(service._cache) == ["8.8.8.1", "8.8.8.3"]
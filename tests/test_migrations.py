@@ -0,0 +1,144 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, String, Text, create_engine, inspect, text
+from sqlalchemy.orm import declarative_base
+
+from conftest import load_db
+
+# the schema as the first release of db.py created it: text coordinates,
+# dates and flags, no schema_migrations table
+Legacy = declarative_base()
+
+
+class LegacyIncident(Legacy):
+    __tablename__ = "incidents"
+    id = Column(Integer, primary_key=True)
+    lat = Column(String)
+    lng = Column(String)
+    type = Column(String, nullable=False)
+    desc = Column(Text)
+    time = Column(String)
+    distance = Column(String)
+    timestamp = Column(DateTime)
+
+
+class LegacyReport(Legacy):
+    __tablename__ = "reports"
+    id = Column(Integer, primary_key=True)
+    fullname = Column(String)
+    contact = Column(String)
+    category = Column(String, nullable=False)
+    description = Column(Text, nullable=False)
+    latitude = Column(String)
+    longitude = Column(String)
+    date = Column(String)
+    photo_name = Column(String)
+    photo_blob = Column(LargeBinary)
+    timestamp = Column(DateTime)
+    status = Column(String, default="pending")
+
+
+class LegacyNotification(Legacy):
+    __tablename__ = "notifications"
+    id = Column(Integer, primary_key=True)
+    title = Column(String, nullable=False)
+    desc = Column(Text)
+    time = Column(String)
+    unread = Column(String, default="true")
+    timestamp = Column(DateTime)
+
+
+@pytest.fixture
+def legacy_url(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    engine = create_engine(url)
+    Legacy.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO incidents (id, lat, lng, type, \"desc\", time, timestamp) VALUES "
+                "(1, '40.7128', '-74.006', 'theft', 'Wallet', 'Just now', '2024-05-01 10:00:00'), "
+                "(2, '', '', 'fire', 'No location', 'Just now', '2024-05-02 10:00:00')"
+            )
+        )
+        conn.execute(
+            text(
+                "INSERT INTO reports (id, fullname, category, description, latitude, longitude, date, timestamp, status) "
+                "VALUES (1, 'Ann', 'theft', 'Bike stolen', '40.1', '-73.9', '2024-05-01', '2024-05-01 09:00:00', 'pending')"
+            )
+        )
+        conn.execute(
+            text(
+                "INSERT INTO notifications (id, title, \"desc\", time, unread, timestamp) VALUES "
+                "(1, 'Welcome', NULL, 'now', 'true', '2024-05-01 08:00:00'), "
+                "(2, 'Old news', NULL, 'now', 'false', '2024-05-01 08:00:00')"
+            )
+        )
+    engine.dispose()
+    return url
+
+
+def test_baseline_database_migrates_through_every_step(legacy_url):
+    import migrations
+
+    db = load_db(legacy_url)
+    try:
+        assert db.init_db()
+        with db.engine.connect() as conn:
+            assert migrations.applied_versions(conn) == {v for v, _, _ in migrations.MIGRATIONS}
+            insp = inspect(conn)
+            columns = {c["name"]: str(c["type"]).upper() for c in insp.get_columns("reports")}
+            indexes = {i["name"] for i in insp.get_indexes("reports")}
+        assert {"client_id", "incident_id", "duplicate_of", "photo_dhash", "photo_sha256"} <= set(columns)
+        assert columns["latitude"] in ("FLOAT", "REAL") and columns["date"] == "DATE"
+        assert {"ux_reports_client_id", "ix_reports_incident_id", "ix_reports_status_timestamp"} <= indexes
+
+        (report,) = db.get_reports()
+        assert (report["latitude"], report["longitude"], report["date"]) == (40.1, -73.9, date(2024, 5, 1))
+        incidents = {i["id"]: i for i in db.get_incidents()}
+        assert (incidents[1]["lat"], incidents[1]["lng"]) == (40.7128, -74.006)
+        assert (incidents[2]["lat"], incidents[2]["lng"]) == (None, None)
+        # legacy notifications are addressed to the default user, with their read state
+        assert [n["unread"] for n in db.get_user_notifications(db.DEFAULT_USER)] == [False, True]
+        assert db.get_unread_count(db.DEFAULT_USER) == 1
+        # the migrated tables work with the current code
+        assert [r["id"] for r in db.get_incidents_within(40.7128, -74.006, 1.0)] == [1]
+        assert db.submit_reports([{"client_id": "x", "category": "theft", "description": "d"}])[0]["created"]
+
+        assert migrations.run_migrations(db.engine, db.Base.metadata) == []
+    finally:
+        db.engine.dispose()
+
+
+def test_later_steps_add_only_their_own_columns(legacy_url):
+    import migrations
+
+    db = load_db(legacy_url)
+    try:
+        assert db.init_db()
+        # roll the database back to how version 4 left it
+        with db.engine.begin() as conn:
+            for index in ("ux_reports_client_id", "ix_reports_incident_id"):
+                conn.execute(text(f"DROP INDEX {index}"))
+            for column in ("client_id", "incident_id", "duplicate_of", "photo_dhash"):
+                conn.execute(text(f"ALTER TABLE reports DROP COLUMN {column}"))
+            conn.execute(text("DELETE FROM schema_migrations WHERE version > 4"))
+
+        steps = {v: fn for v, _, fn in migrations.MIGRATIONS}
+        with db.engine.begin() as conn:
+            steps[5](conn, db.Base.metadata)
+            columns = {c["name"] for c in inspect(conn).get_columns("reports")}
+            indexes = {i["name"] for i in inspect(conn).get_indexes("reports")}
+        assert "client_id" in columns and "ux_reports_client_id" in indexes
+        assert not {"incident_id", "duplicate_of", "photo_dhash"} & columns
+        assert "ix_reports_incident_id" not in indexes
+
+        assert migrations.run_migrations(db.engine, db.Base.metadata) == [5, 6]
+        with db.engine.connect() as conn:
+            columns = {c["name"] for c in inspect(conn).get_columns("reports")}
+        assert {"incident_id", "duplicate_of", "photo_dhash"} <= columns
+    finally:
+        db.engine.dispose()
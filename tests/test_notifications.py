@@ -0,0 +1,130 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+
+def _post(url, payload):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode("utf-8"), headers={"Content-Type": "application/json"}, method="POST"
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def test_subscription_posted_to_the_api_is_stored(db, api_url, monkeypatch):
+    monkeypatch.setenv("VAPID_PUBLIC_KEY", "BPubKey")
+    with urllib.request.urlopen(f"{api_url}/api/push-subscriptions") as response:
+        assert json.loads(response.read()) == {"public_key": "BPubKey"}
+
+    sub = {"endpoint": "https://push.example/abc", "keys": {"p256dh": "k", "auth": "a"}, "expirationTime": None}
+    assert _post(f"{api_url}/api/push-subscriptions", sub) == {"endpoint": sub["endpoint"]}
+    assert db.get_push_subscriptions([db.DEFAULT_USER]) == [
+        {"user_id": db.DEFAULT_USER, "endpoint": sub["endpoint"], "keys": sub["keys"]}
+    ]
+
+
+@pytest.mark.parametrize("sub", [{"endpoint": "http://10.0.0.1/hook"}, {"keys": {}}, ["https://push.example/x"]])
+def test_invalid_subscription_is_rejected(db, api_url, sub):
+    with pytest.raises(urllib.error.HTTPError) as e:
+        _post(f"{api_url}/api/push-subscriptions", sub)
+    assert e.value.code == 400
+    assert db.get_push_subscriptions([db.DEFAULT_USER]) == []
+
+
+def test_push_reaches_subscribed_browsers_and_drops_gone_ones(db):
+    import notifications
+    import push
+
+    gateway = push.LocalPushGateway().start()
+    try:
+        sub = gateway.new_subscription()
+        db.add_push_subscription("alice", sub)
+        db.add_push_subscription("alice", {"endpoint": f"{gateway.url}/gone", "keys": {}})  # the gateway 404s it
+        notification_id = notifications.send("Fire nearby", "Main St", recipients=["alice"])
+        token = sub["endpoint"].rsplit("/", 1)[1]
+        assert gateway.take(token) == [{"title": "Fire nearby", "body": "Main St", "id": notification_id}]
+        assert [s["endpoint"] for s in db.get_push_subscriptions(["alice"])] == [sub["endpoint"]]
+    finally:
+        gateway.stop()
+
+
+def test_unread_counters_are_per_user(db):
+    first = db.add_notification("Road closed", "Elm St", "now", recipients=["alice", "bob"])
+    db.add_notification("Power cut", None, "now", recipients=["alice"])
+    assert (db.get_unread_count("alice"), db.get_unread_count("bob"), db.get_unread_count("carol")) == (2, 1, 0)
+
+    assert db.mark_notification_read("alice", first)
+    assert not db.mark_notification_read("alice", first)  # already read
+    assert not db.mark_notification_read("carol", first)  # not hers
+    assert (db.get_unread_count("alice"), db.get_unread_count("bob")) == (1, 1)
+    assert [n["unread"] for n in db.get_user_notifications("alice")] == [True, False]
+    assert [n["unread"] for n in db.get_user_notifications("bob")] == [True]
+
+
+def test_mark_all_read_only_touches_that_user(db):
+    db.add_notification("Road closed", "Elm St", "now", recipients=["alice", "bob"])
+    db.add_notification("Power cut", None, "now", recipients=["alice"])
+    db.mark_all_notifications_read("alice")
+    assert (db.get_unread_count("alice"), db.get_unread_count("bob")) == (0, 1)
+    assert not any(n["unread"] for n in db.get_user_notifications("alice"))
+    assert all(n["unread"] for n in db.get_user_notifications("bob"))
+
+
+def test_broadcast_reaches_only_the_recipients_sessions(db):
+    import notifications
+
+    alice_tabs = [notifications.broadcaster.subscribe("alice") for _ in range(2)]
+    bob = notifications.broadcaster.subscribe("bob")
+    try:
+        notification_id = notifications.send("Fire nearby", "Main St", recipients=["alice"])
+        for inbox in alice_tabs:
+            (event,) = inbox.drain()
+            assert event["notification"]["id"] == notification_id
+            assert event["unread_count"] == 1
+        assert bob.drain() == []
+    finally:
+        for inbox in (*alice_tabs, bob):
+            notifications.broadcaster.unsubscribe(inbox)
+
+
+def test_inbox_of_an_ended_session_is_dropped(db):
+    import gc
+
+    import notifications
+
+    broadcaster = notifications.Broadcaster()
+    inbox = broadcaster.subscribe("alice")
+    assert broadcaster.subscriber_count() == 1
+    del inbox  # the session state holding it is gone
+    gc.collect()
+    assert broadcaster.subscriber_count() == 0
+    assert broadcaster.publish("alice", {"notification": {}}) == 0
+
+
+def test_failed_delivery_is_retried_without_storing_twice(db, monkeypatch):
+    import jobs
+    import notifications
+
+    inbox = notifications.broadcaster.subscribe("alice")
+    calls = []
+
+    def flaky_push(recipients, notification):
+        calls.append(notification["id"])
+        if len(calls) == 1:
+            raise ConnectionError("push service down")
+        return 0
+
+    monkeypatch.setattr(notifications, "push_to_browsers", flaky_push)
+    monkeypatch.setattr(jobs, "RETRY_BASE_SECONDS", 0)
+    try:
+        db.enqueue_job("notify", {"title": "Fire nearby", "desc": "Main St", "recipients": ["alice"]})
+        jobs.run_pending()
+        assert len(calls) == 2 and calls[0] == calls[1]  # the delivery job ran again
+        assert db.get_unread_count("alice") == 1
+        assert len(db.get_user_notifications("alice")) == 1
+        assert jobs.queue_stats() == {"done": 2}
+        assert {e["notification"]["id"] for e in inbox.drain()} == {calls[0]}
+    finally:
+        notifications.broadcaster.unsubscribe(inbox)
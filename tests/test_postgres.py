@@ -0,0 +1,87 @@
+"""
+PostgreSQL/PostGIS paths of db.py. Skipped unless TEST_POSTGRES_URL points
+at a throwaway database (its tables are dropped and recreated), e.g.
+
+    TEST_POSTGRES_URL=postgresql://postgres@localhost/civicguardian_test python -m pytest tests/test_postgres.py
+"""
+import os
+import threading
+
+import pytest
+
+from conftest import load_db
+
+PG_URL = os.getenv("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(
+    not (PG_URL or "").startswith("postgresql"), reason="TEST_POSTGRES_URL is not set to a PostgreSQL database"
+)
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    old_cwd, old_url = os.getcwd(), os.environ.get("DATABASE_URL")
+    os.chdir(tmp_path_factory.mktemp("pg"))  # db.py keeps blobs under ./data
+    module = load_db(PG_URL)
+    module.Base.metadata.drop_all(module.engine)
+    assert module.init_db()
+    yield module
+    module.engine.dispose()
+    os.chdir(old_cwd)
+    if old_url is None:
+        os.environ.pop("DATABASE_URL", None)
+    else:
+        os.environ["DATABASE_URL"] = old_url
+
+
+def test_change_feed_sees_every_concurrent_write(db):
+    # a cursor reader polling while writers commit must never skip a seq
+    writers, per_writer = 4, 25
+    written, seen, done = [], set(), threading.Event()
+    lock = threading.Lock()
+
+    def write(n):
+        for i in range(per_writer):
+            new_id = db.add_incident(40.0 + n / 100, -74.0 + i / 1000, "theft", f"w{n}-{i}", "now", "")
+            with lock:
+                written.append(new_id)
+
+    def read():
+        cursor = db.change_version("incidents")[0]
+        while True:
+            finished = done.is_set()
+            out = db.read_changes_since("incidents", cursor, limit=10 ** 6)
+            assert not out["reset"]
+            seen.update(r["id"] for r in out["rows"])
+            cursor = out["cursor"]
+            if finished:
+                return
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    done.set()
+    reader.join()
+    assert set(written) <= seen
+
+
+def test_incidents_within_matches_haversine(db):
+    for i in range(20):
+        db.add_incident(51.5 + i * 0.002, -0.12 + i * 0.002, "fire", f"r{i}", "now", "")
+    got = db.get_incidents_within(51.51, -0.11, 1.0)
+    expected = [
+        i["id"]
+        for i in db.get_incidents()
+        if db.spatial.haversine_km(51.51, -0.11, float(i["lat"]), float(i["lng"])) <= 1.0
+    ]
+    assert sorted(r["id"] for r in got) == sorted(expected)
+    assert [r["distance_km"] for r in got] == sorted(r["distance_km"] for r in got)
+
+
+def test_full_text_search(db):
+    rid = db.add_report(None, None, "vandalism", "Broken streetlight near the bakery", None, None, None, None, None)
+    assert rid in {r["id"] for r in db.search_reports("streetlight bak")}
@@ -0,0 +1,74 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, update
+
+
+@pytest.fixture
+def retention(db):
+    import retention
+
+    return retention
+
+
+def _reports(db):
+    """Two resolved reports and a pending one, plus a notification, all backdated a year."""
+    ids = [db.add_report(None, None, "theft", f"r{i}", 10.0, 20.0, None, None, None) for i in range(3)]
+    for rid in ids[:2]:
+        db.update_report_status(rid, "resolved")
+    db.add_notification("Road closed", None, "now", recipients=["alice"])
+    a_year_ago = datetime.utcnow() - timedelta(days=365)
+    with db.engine.begin() as conn:
+        conn.execute(update(db.Report).values(timestamp=a_year_ago))
+        conn.execute(update(db.Notification).values(timestamp=a_year_ago))
+        conn.execute(update(db.ChangeLog).values(changed_at=a_year_ago))
+    return ids
+
+
+def _change_log_counts(db):
+    sess = db.SessionLocal()
+    try:
+        return dict(sess.query(db.ChangeLog.table_name, func.count(db.ChangeLog.seq)).group_by(db.ChangeLog.table_name))
+    finally:
+        sess.close()
+
+
+def test_old_resolved_reports_move_to_the_archive(db, retention, monkeypatch):
+    monkeypatch.setenv("RETENTION_NOTIFICATIONS_DAYS", "0")  # keep this test to reports
+    resolved_a, resolved_b, pending = _reports(db)
+
+    assert retention.pending()["reports"] == 2
+    result = retention.run(vacuum=False)
+    assert result["archived_reports"] == 2
+    assert retention.archive_table("reports") == 0  # nothing left to move
+
+    assert [r["id"] for r in db.get_reports()] == [pending]
+    assert [r["id"] for r in db.get_cached("reports")] == [pending]
+    archived = db.get_archived("reports")
+    assert [(r["id"], r["status"]) for r in archived] == [(resolved_a, "resolved"), (resolved_b, "resolved")]
+    assert db.get_archived("reports", category="vandalism") == []
+    assert len(retention.partitions("reports")) == 1
+
+
+def test_prune_keeps_each_tables_latest_change(db, retention):
+    _reports(db)
+    versions = {t: db.change_version(t)[0] for t in ("reports", "notifications")}
+    before = _change_log_counts(db)
+
+    assert retention.prune_change_log() == sum(before.values()) - len(before)
+    assert _change_log_counts(db) == {"reports": 1, "notifications": 1}
+    assert {t: db.change_version(t)[0] for t in versions} == versions
+
+
+def test_dry_run_changes_nothing(db, retention, monkeypatch, capsys):
+    _reports(db)
+    before = (db.get_reports(), _change_log_counts(db), db.get_user_notifications("alice"))
+
+    monkeypatch.setattr(sys, "argv", ["retention.py", "--dry-run"])
+    retention.main()
+
+    assert "'reports': 2" in capsys.readouterr().out
+    assert (db.get_reports(), _change_log_counts(db), db.get_user_notifications("alice")) == before
+    assert not os.path.exists(retention.ARCHIVE_DIR)
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+
+def _add(db, desc="Bike stolen"):
+    return db.add_report(None, None, "theft", desc, 10.0, 20.0, None, None, None)
+
+
+def test_first_sync_is_a_reset_with_every_row(db):
+    ids = [_add(db, f"r{i}") for i in range(3)]
+    out = db.get_changes_since("reports", None)
+    assert out["reset"] and out["deleted"] == []
+    assert [r["id"] for r in out["rows"]] == ids
+    assert out["cursor"] == db.change_version("reports")[0]
+
+
+def test_delta_has_inserts_updates_and_deletes(db):
+    kept, updated, deleted = _add(db, "kept"), _add(db, "updated"), _add(db, "deleted")
+    cursor = db.get_changes_since("reports", None)["cursor"]
+
+    new = _add(db, "new")
+    db.update_report_status(updated, "resolved")
+    db.delete_report(deleted)
+    gone = _add(db, "added then deleted")
+    db.delete_report(gone)
+
+    for out in (db.get_changes_since("reports", cursor), db.read_changes_since("reports", cursor)):
+        assert not out["reset"]
+        assert {r["id"]: r["status"] for r in out["rows"]} == {updated: "resolved", new: "pending"}
+        assert out["deleted"] == sorted([deleted, gone])
+        assert out["cursor"] == db.change_version("reports")[0]
+    assert [r["id"] for r in db.get_cached("reports")] == [kept, updated, new]
+
+    # nothing changed since: an empty delta at the same cursor
+    last = db.get_changes_since("reports", cursor)["cursor"]
+    assert db.get_changes_since("reports", last) == {"cursor": last, "reset": False, "rows": [], "deleted": []}
+
+
+def test_rows_are_narrowed_to_the_requested_columns(db):
+    db.add_report("Ann", "555", "theft", "Bike stolen", 10.0, 20.0, None, None, None)
+    (row,) = db.read_changes_since("reports", 0, columns=db.REPORT_PUBLIC_COLUMNS)["rows"]
+    assert set(row) == set(db.REPORT_PUBLIC_COLUMNS)
+
+
+def test_more_changes_than_limit_is_a_reset(db):
+    cursor = db.change_version("reports")[0]
+    for i in range(3):
+        _add(db, f"r{i}")
+    assert db.read_changes_since("reports", cursor, limit=3)["reset"] is False
+    out = db.read_changes_since("reports", cursor, limit=2)
+    assert out == {"cursor": db.change_version("reports")[0], "reset": True, "rows": [], "deleted": []}
+
+
+def test_cursor_older_than_the_pruned_log_is_a_reset(db):
+    import retention
+
+    first = _add(db, "first")
+    old_cursor = db.get_changes_since("reports", None)["cursor"]
+    second, third = _add(db, "second"), _add(db, "third")
+    db.delete_report(second)
+    fresh_cursor = db.change_version("reports")[0]
+    fourth = _add(db, "fourth")
+
+    # everything but each table's latest entry (fourth's insert) is past retention
+    assert retention.prune_change_log(now=datetime.utcnow() + timedelta(days=365)) > 0
+
+    # the shared cache last synced at old_cursor: it reloads instead of missing the delete
+    assert [r["id"] for r in db.get_cached("reports")] == [first, third, fourth]
+    for out in (db.get_changes_since("reports", old_cursor), db.read_changes_since("reports", old_cursor)):
+        assert out["reset"] and out["deleted"] == []
+    assert [r["id"] for r in db.get_changes_since("reports", old_cursor)["rows"]] == [first, third, fourth]
+    # a cursor right before the surviving entry still gets a delta
+    out = db.get_changes_since("reports", fresh_cursor)
+    assert (out["reset"], [r["id"] for r in out["rows"]], out["deleted"]) == (False, [fourth], [])
+
+
+def test_cursor_from_another_database_is_a_reset(db):
+    _add(db)
+    out = db.get_changes_since("reports", db.change_version("reports")[0] + 100)
+    assert out["reset"] and len(out["rows"]) == 1